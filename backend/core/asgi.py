@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DJANGO_ASGI', '1')
 
+# ALSO SERVES THE LONG-LIVED EVENT STREAMS (api/changes/stream/),
+# WHICH THE WSGI APP REFUSES RATHER THAN TIE UP A WORKER, AND
+# THE HOT READS THROUGH THE ASYNC ORM (system.async_views)
 application = get_asgi_application()
+
+# QUEUES THE PERIODIC TRASH SWEEP, THE JOB POOL RUNS IT
+from system.jobs import start_scheduler  # noqa: E402
+start_scheduler()
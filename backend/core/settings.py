@@ -2,6 +2,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from . utils import split_env
 
 load_dotenv()
@@ -57,6 +58,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# SET BY core.asgi: THE HOT READS GO TO system.async_views AND
+# WHITENOISE IS LEFT OUT, IT'S SYNC-ONLY AND WOULD PUSH EVERY
+# REQUEST BACK INTO A THREAD (THE API SERVES NO STATIC FILES)
+ASGI = os.getenv("DJANGO_ASGI") == "1"
+if ASGI:
+    MIDDLEWARE.remove("whitenoise.middleware.WhiteNoiseMiddleware")
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -96,6 +104,20 @@ else:
     }
 
 
+# per-process memory by default, point CACHE_BACKEND/CACHE_LOCATION
+# at a shared cache (redis, memcached) when running several processes
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", "file-system"),
+    }
+}
+if CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000))}
+CACHE_IS_SHARED = not CACHE_BACKEND.endswith(("LocMemCache", "DummyCache"))
+
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -128,4 +150,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
\ No newline at end of file
+STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# ============================= LISTINGS ================================ #
+# seconds a cached directory listing page is kept, 0 disables the cache;
+# every process invalidates it, so it needs a shared CACHE_BACKEND
+# and is off by default on the per-process ones
+LISTING_CACHE_TIMEOUT = int(os.getenv("LISTING_CACHE_TIMEOUT", 300 if CACHE_IS_SHARED else 0))
+if LISTING_CACHE_TIMEOUT > 0 and not CACHE_IS_SHARED:
+    raise ImproperlyConfigured("LISTING_CACHE_TIMEOUT needs a CACHE_BACKEND shared by every process (redis, memcached, database).")
+
+# ============================= JOBS ================================ #
+# threads running background jobs inside the web process,
+# with 0 they are left to the `run_jobs` worker command
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+
+# nodes handled per transaction by a job
+JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 1000))
+
+# seconds without progress after which a running job counts as
+# abandoned by a crashed worker and is run again, keep it well
+# above the time one chunk takes
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", 600))
+
+
+# ============================= TRASH ================================ #
+# trash entries older than this many days are purged, 0 keeps them
+TRASH_RETENTION_DAYS = int(os.getenv("TRASH_RETENTION_DAYS", 30))
+
+# bytes of files the trash may hold before the oldest
+# entries are purged to make room, 0 for no limit
+TRASH_MAX_BYTES = int(os.getenv("TRASH_MAX_BYTES", 0))
+
+# seconds between two retention sweeps, 0 disables the scheduler
+TRASH_SWEEP_INTERVAL = int(os.getenv("TRASH_SWEEP_INTERVAL", 3600))
+
+# nodes purged per transaction by a sweep
+TRASH_SWEEP_BATCH = int(os.getenv("TRASH_SWEEP_BATCH", 200))
+
+
+# ============================= REVISIONS ================================ #
+# every Nth revision of a file is a full snapshot, the ones in between deltas
+REVISION_SNAPSHOT_EVERY = int(os.getenv("REVISION_SNAPSHOT_EVERY", 10))
+
+# bodies larger than this are always kept as snapshots
+REVISION_DELTA_MAX_BYTES = int(os.getenv("REVISION_DELTA_MAX_BYTES", 1024 * 1024))
+
+# history kept per file, the oldest revisions go first
+REVISIONS_MAX_PER_FILE = int(os.getenv("REVISIONS_MAX_PER_FILE", 50))
+REVISIONS_MAX_BYTES = int(os.getenv("REVISIONS_MAX_BYTES", 64 * 1024 * 1024))
+
+
+# ============================= STORAGE ================================ #
+# file body chunks are compressed on write, 0 stores them raw
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "1") == "1"
+
+# chunks shorter than this are stored raw
+STORAGE_COMPRESS_MIN_BYTES = int(os.getenv("STORAGE_COMPRESS_MIN_BYTES", 512))
+
+# chunks at least this long use lzma (smaller, slower) instead of zlib, 0 for zlib only
+STORAGE_LZMA_MIN_BYTES = int(os.getenv("STORAGE_LZMA_MIN_BYTES", 0))
+
+
+# ============================= SEARCH ================================ #
+# bytes at the head of a file body the full-text index keeps,
+# terms past them aren't found by content search
+SEARCH_INDEX_MAX_BYTES = int(os.getenv("SEARCH_INDEX_MAX_BYTES", 1024 * 1024))
+
+
+# ============================= CHANGES ================================ #
+# change log entries older than this many days are dropped by the sweep, 0 keeps them
+CHANGES_RETENTION_DAYS = int(os.getenv("CHANGES_RETENTION_DAYS", 7))
+
+# seconds between two reads of the log by an event stream
+CHANGES_STREAM_POLL = float(os.getenv("CHANGES_STREAM_POLL", 1))
+
+# seconds of silence after which a stream sends a keep-alive comment
+CHANGES_STREAM_HEARTBEAT = int(os.getenv("CHANGES_STREAM_HEARTBEAT", 15))
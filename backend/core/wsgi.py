@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# QUEUES THE PERIODIC TRASH SWEEP, THE JOB POOL RUNS IT
+from system.jobs import start_scheduler  # noqa: E402
+start_scheduler()
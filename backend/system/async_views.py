@@ -0,0 +1,178 @@
+"""
+Async read path for the ASGI deployment.
+
+The hot reads (directory listings, directory and file details,
+search) as coroutines on Django's async ORM and cache API, so an
+ASGI worker serves many of them at once instead of one per thread.
+They mirror the GET handlers of the DRF views in system.views and
+share their query builders and serializers; any other method on
+the same URL is handed to the DRF view in a thread. system.urls
+routes these only when settings.ASGI is set (core.asgi sets it),
+under WSGI every request keeps going to the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from . models import Node
+from . import listings, storage
+from . serializers import AncestorSerializer, NodeListSerializer, NodeSerializer
+from . utils import akeyset_paginate, make_etag, node_etag, normalize_path, not_modified, parse_limit
+from . views import LISTING_SORTS, SEARCH_SORTS, listing_queryset, search_queryset
+from . views import AmbiguousPath, DirectoryView, DirectoryDetailView, FileView, SearchView
+
+
+# async GET (and HEAD) on the url of `view`, the other
+# methods still go through the DRF view, in a thread
+def reads(view):
+    sync_view = sync_to_async(view.as_view())
+
+    def decorator(handler):
+        async def dispatch(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return await sync_view(request, *args, **kwargs)
+            try:
+                return await handler(request, *args, **kwargs)
+            except Http404 as e:
+                # SAME BODY AS DRF'S NOT FOUND
+                return JsonResponse({"detail": str(e)}, status=status.HTTP_404_NOT_FOUND)
+            except AmbiguousPath as e:
+                return JsonResponse({"detail": str(e.detail)}, status=e.status_code)
+        return csrf_exempt(dispatch)
+    return decorator
+
+
+# views.node_at_path() on the async ORM
+async def node_at_path(full_path, node_type):
+    matches = [row async for row in Node.objects.at_path(full_path).filter(node_type=node_type)[:2]]
+    if not matches:
+        raise Http404("No Node matches the given query.")
+    if len(matches) > 1:
+        raise AmbiguousPath()
+    return matches[0]
+
+
+def not_modified_response(etag):
+    res = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    res["ETag"] = etag
+    return res
+
+
+def denied():
+    return JsonResponse({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+
+# views.with_ancestors() on the async ORM
+async def with_ancestors(request, node, etag):
+    if request.GET.get("ancestors") not in ("1", "true", "True"):
+        return None, etag
+    qs = Node.objects.chain(node).only(*AncestorSerializer.Meta.fields)
+    crumbs = AncestorSerializer([row async for row in qs], many=True).data
+    return crumbs, make_etag(etag, [(c["id"], c["name"], c["permissions"]) for c in crumbs])
+
+
+# detail payload of a file or directory, the body read
+# here so the serializer doesn't touch the database
+async def detail(request, node):
+    if not (node.permissions & Node.Permissions.READ):
+        return denied()
+
+    crumbs, etag = await with_ancestors(request, node, node_etag(node))
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+
+    content = await storage.aread_content(node)
+    payload = {"ok": True, "data": NodeSerializer(node, context={"content": content}).data}
+    if crumbs is not None:
+        payload["ancestors"] = crumbs
+    res = JsonResponse(payload)
+    res["ETag"] = etag
+    return res
+
+
+@reads(DirectoryView)
+async def directory_list(request):
+    # FILTER PARAMS
+    parent_id = request.GET.get("parent_id")
+    parent_id = None if parent_id == 'undefined' else parent_id
+    order = request.GET.get("order", "desc")
+    cursor = request.GET.get("cursor")
+    limit = parse_limit(request.GET.get("limit"))
+    sort_field = LISTING_SORTS.get(request.GET.get("sort", "name"), "name")
+
+    parent = None
+    if dir_path := normalize_path(request.GET.get("path")):
+        parent = await node_at_path(dir_path, Node.NodeTypes.DIRECTORY)
+        parent_id = parent.id
+    elif parent_id not in (None, ""):
+        parent = await aget_object_or_404(Node, id=parent_id, node_type=Node.NodeTypes.DIRECTORY, is_trashed=False)
+    if parent and not (parent.permissions & Node.Permissions.READ):
+        return denied()
+
+    # SAME CACHE AND TAGS AS THE SYNC VIEW
+    cache_params = (sort_field, order == "desc", cursor, limit)
+    page, version = await listings.aget(parent.id if parent else None, cache_params)
+    etag = listings.etag(parent.id if parent else None, version, cache_params) if version else None
+    if etag and not_modified(request, etag):
+        return not_modified_response(etag)
+    hit = page is not None
+
+    if not hit:
+        try:
+            rows, next_cursor = await akeyset_paginate(listing_queryset(parent_id), sort_field, order == "desc", cursor, limit)
+        except ValueError as e:
+            return JsonResponse({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        page = {'data': NodeListSerializer(rows, many=True).data, 'next_cursor': next_cursor}
+        await listings.aput(parent.id if parent else None, version, cache_params, page)
+
+        if etag is None:
+            etag = make_etag(page)
+            if not_modified(request, etag):
+                return not_modified_response(etag)
+
+    res = JsonResponse({'ok': True, **page})
+    res["X-Cache"] = "HIT" if hit else "MISS"
+    res["ETag"] = etag
+    return res
+
+
+@reads(DirectoryDetailView)
+async def directory_detail(request, pk):
+    directory = await aget_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.DIRECTORY)
+    return await detail(request, directory)
+
+
+@reads(FileView)
+async def file_detail(request, pk=None):
+    if pk is not None:
+        file = await aget_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+    else:
+        full_path = normalize_path(request.GET.get("path")) or ""
+        file = await node_at_path(full_path, Node.NodeTypes.FILE)
+    return await detail(request, file)
+
+
+@reads(SearchView)
+async def search_list(request):
+    # PARAMS GET
+    q = (request.GET.get("q") or "").strip()
+    if not q:
+        return JsonResponse({"ok": True, "data": [], "next_cursor": None})
+    parent_id = request.GET.get("parent_id")
+    qs = search_queryset(
+        q,
+        (request.GET.get("in") or "both").lower(),
+        request.GET.get("include_trash") in ("1", "true", "True"),
+        request.GET.get("type"),
+        None if parent_id == 'undefined' else parent_id,
+    )
+
+    sort_field = SEARCH_SORTS.get(request.GET.get("order", "rank"), "rank")
+    descending = request.GET.get("direction", "asc") == "desc"
+    try:
+        rows, next_cursor = await akeyset_paginate(qs, sort_field, descending, request.GET.get("cursor"), parse_limit(request.GET.get("limit")))
+    except ValueError as e:
+        return JsonResponse({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return JsonResponse({"ok": True, "data": NodeListSerializer(rows, many=True).data, "next_cursor": next_cursor})
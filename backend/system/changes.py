@@ -0,0 +1,96 @@
+"""
+Change log clients sync from instead of polling listings.
+
+Every write to the tree records what it touched through record(),
+inside the transaction of the write, and clients ask for the
+entries after the last `seq` they saw. Sequence numbers come from
+a counter row updated in that transaction: a second writer waits
+on it until the first commits, so a number is only handed out
+once every lower one is visible (or rolled back with its
+counter update), unlike ids, which MVCC databases assign at
+insert time and commit in any order. A directory trashed, restored,
+moved, renamed or copied is one entry flagged `subtree` rather
+than one per descendant; purges record every node, they are the
+only way rows disappear. Entries older than CHANGES_RETENTION_DAYS
+are dropped by the retention sweep, a client whose cursor is older
+than what is left has to reload its listings.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from . models import Change, ChangeSequence, Node, prefix_range
+from . import purging
+
+MAX_LIMIT = 1000
+
+
+# one entry per node, `subtree` for the directories among them,
+# `old_paths` maps the ids that moved to their previous path
+def record(kind, nodes, subtree=False, old_paths=None):
+    nodes, old_paths = list(nodes), old_paths or {}
+    if not nodes:
+        return
+    with transaction.atomic():
+        first = _allocate(len(nodes))
+        Change.objects.bulk_create([
+            Change(
+                kind=kind,
+                node_id=node.id,
+                node_type=node.node_type,
+                parent_id=node.parent_id,
+                path=node.path,
+                old_path=old_paths.get(node.id, ""),
+                seq=first + i,
+                subtree=subtree and node.node_type == Node.NodeTypes.DIRECTORY,
+            )
+            for i, node in enumerate(nodes)
+        ], batch_size=500)
+
+
+# first of `count` sequence numbers, the counter row
+# stays locked until the caller's transaction ends
+def _allocate(count):
+    if not ChangeSequence.objects.filter(id=1).update(last=F("last") + count):
+        ChangeSequence.objects.create(id=1, last=count)
+    return ChangeSequence.objects.values_list("last", flat=True).get(id=1) - count + 1
+
+
+def latest():
+    return Change.objects.order_by("-seq").values_list("seq", flat=True).first() or 0
+
+
+# False when entries after `cursor` were already
+# dropped, the client missed changes then
+def is_available(cursor):
+    oldest = Change.objects.order_by("seq").values_list("seq", flat=True).first()
+    return oldest is None or cursor >= oldest - 1
+
+
+# entries after `cursor`, oldest first, with `under` only the ones
+# inside that directory or applying to a directory above it
+def entries(cursor, under=None):
+    qs = Change.objects.filter(seq__gt=cursor)
+    if under is not None:
+        qs = qs.filter(
+            prefix_range("path", under.path)
+            | prefix_range("old_path", under.path)
+            | Q(node_id__in=under.ancestor_ids, subtree=True)
+        )
+    return qs.order_by("seq")
+
+
+# a page of them
+def after(cursor, limit=100, under=None):
+    return list(entries(cursor, under)[:limit])
+
+
+# drops the entries past the retention, the last
+# one always stays so old cursors are still detected
+def prune():
+    if not settings.CHANGES_RETENTION_DAYS:
+        return 0
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    expired = Change.objects.filter(created_at__lt=cutoff, seq__lt=latest())
+    return purging.raw_delete(expired)
@@ -0,0 +1,115 @@
+"""
+Server-side copy of a node and its live subtree.
+
+The subtree is read once, directory totals are summed in memory
+and the clones are inserted level by level with bulk_create, each
+level pointing at the ids the level above just got. Bodies are
+shared with the source through blob refcounts and the search index
+rows are duplicated in SQL, so no file content is ever read.
+"""
+import uuid
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+from . models import Node, prefix_range
+from . import search, storage
+
+BATCH_SIZE = 500
+
+COPIED_FIELDS = ("id", "parent_id", "name", "node_type", "blob_id", "content_hash", "permissions", "size", "depth")
+
+
+# live subtree of the source, parents before children,
+# nodes left under a trashed directory are not copied
+def live_subtree(src):
+    rows = Node.objects.subtree(src).filter(is_trashed=False).order_by("depth", "id").values(*COPIED_FIELDS)
+    kept = {}
+    for row in rows.iterator(chunk_size=2000):
+        if row["id"] == src.id or row["parent_id"] in kept:
+            kept[row["id"]] = row
+    return kept
+
+
+# totals of every directory of the copied rows,
+# summed bottom-up in one pass
+def subtree_totals(rows, root_id):
+    totals = {pk: [0, 0, 0] for pk, row in rows.items() if row["node_type"] == Node.NodeTypes.DIRECTORY}
+    for row in reversed(list(rows.values())):
+        if row["id"] == root_id:
+            continue
+        if row["node_type"] == Node.NodeTypes.FILE:
+            own = (row["size"], 1, 0)
+        else:
+            size, files, dirs = totals[row["id"]]
+            own = (size, files, dirs + 1)
+        for i, value in enumerate(own):
+            totals[row["parent_id"]][i] += value
+    return totals
+
+
+# copies src with its live subtree under dest (None for
+# the root) as `name`, returns the copy and the node count
+def copy_subtree(src, dest, name):
+    rows = live_subtree(src)
+    totals = subtree_totals(rows, src.id)
+
+    levels = defaultdict(list)
+    for row in rows.values():
+        levels[row["depth"]].append(row)
+
+    # PLACEHOLDER PATHS LET BACKENDS THAT DON'T RETURN IDS FROM
+    # BULK INSERTS FIND THE ROWS, REAL PATHS ARE SET RIGHT AFTER
+    token = uuid.uuid4().hex
+    clones = {}
+    for depth in sorted(levels):
+        level = []
+        for row in levels[depth]:
+            is_root = row["id"] == src.id
+            size, file_count, dir_count = totals.get(row["id"], (row["size"], 0, 0))
+            parent = dest if is_root else clones[row["parent_id"]]
+            full_path = Node.build_full_path(parent, name if is_root else row["name"])
+            level.append(Node(
+                name=name if is_root else row["name"],
+                node_type=row["node_type"],
+                parent=parent,
+                blob_id=row["blob_id"],
+                content_hash=row["content_hash"],
+                permissions=row["permissions"],
+                size=size,
+                file_count=file_count,
+                dir_count=dir_count,
+                depth=(parent.depth + 1) if parent else 0,
+                path=f"{token}:{row['id']}",
+                full_path=full_path,
+                path_hash=Node.hash_path(full_path),
+            ))
+
+        Node.objects.bulk_create(level, batch_size=BATCH_SIZE)
+        if not connection.features.can_return_rows_from_bulk_insert:
+            ids = dict(Node.objects.filter(prefix_range("path", f"{token}:")).values_list("path", "id"))
+            for clone in level:
+                clone.id = ids[clone.path]
+
+        # ONE UPDATE PER PARENT, ITS CHILDREN SHARE THE PATH PREFIX
+        children = defaultdict(list)
+        for row, clone in zip(levels[depth], level):
+            clone.path = Node.build_path(clone.parent, clone.id)
+            Node.check_path_length(len(clone.path))
+            clones[row["id"]] = clone
+            children[clone.parent].append(clone.id)
+        for parent, ids in children.items():
+            base = parent.path if parent else "/"
+            for start in range(0, len(ids), BATCH_SIZE):
+                Node.objects.filter(id__in=ids[start:start + BATCH_SIZE]).update(
+                    path=Concat(Value(base), Cast("id", output_field=CharField()), Value("/"), output_field=CharField()),
+                )
+
+    root = clones[src.id]
+    storage.acquire([row["blob_id"] for row in rows.values() if row["blob_id"]])
+    search.copy_entries({clone.id: source_id for source_id, clone in clones.items()})
+    if name != src.name:
+        search.index_node(root, storage.read_content(root, limit=settings.SEARCH_INDEX_MAX_BYTES))
+    Node.objects.add_totals(root.ancestor_ids, root.totals)
+    return root, len(clones)
@@ -0,0 +1,158 @@
+"""
+Partial updates of file bodies.
+
+A client editing a big file sends what changed instead of the
+whole body: byte-range replacements, or a unified diff that is
+turned into them by streaming the current body line by line, both
+against the content_hash it started from. The new body is then
+spliced from the ranges of the old blob and the new bytes as it
+is written, so neither the request nor the server ever holds the
+whole file, and stored like any other through storage.BlobWriter.
+"""
+import re
+from . import storage
+
+MAX_EDITS = 1000
+
+HUNK_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+# [{"start", "end", "text"}, ...] in byte offsets as sorted
+# (start, end, bytes) triples, inserts at the same offset
+# keep their order, overlapping ranges are refused
+def parse_ranges(raw, size):
+    if not isinstance(raw, list) or len(raw) > MAX_EDITS:
+        raise ValueError(f"edits must be a list of at most {MAX_EDITS} items.")
+
+    edits = []
+    for item in raw:
+        try:
+            start = int(item["start"])
+            end = int(item.get("end", start))
+            text = item.get("text") or ""
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise ValueError('Each edit needs integer "start" / "end" byte offsets and a "text".')
+        if not 0 <= start <= end <= size:
+            raise ValueError(f"Edit {start}-{end} is outside the file ({size} bytes).")
+        edits.append((start, end, str(text).encode("utf-8")))
+
+    edits.sort(key=lambda edit: edit[:2])
+    for prev, edit in zip(edits, edits[1:]):
+        if edit[0] < prev[1]:
+            raise ValueError("Edits overlap.")
+    return edits
+
+
+# hunks of a unified diff as (first old line, old lines,
+# new lines), 0-based, lines keeping their "\n"
+def _hunks(diff):
+    hunks = []
+    lines = diff.split("\n")
+    i = 0
+    while i < len(lines):
+        match = HUNK_RE.match(lines[i])
+        i += 1
+        if not match:
+            continue  # FILE HEADERS AND ANYTHING BETWEEN HUNKS
+
+        start = int(match[1])
+        old_left = int(match[2]) if match[2] is not None else 1
+        new_left = int(match[4]) if match[4] is not None else 1
+        old, new, last = [], [], None
+        while old_left or new_left or (i < len(lines) and lines[i].startswith("\\")):
+            if i >= len(lines):
+                raise ValueError("The diff ends in the middle of a hunk.")
+            line = lines[i]
+            i += 1
+            tag, text = (line[:1] or " "), line[1:] + "\n"
+
+            if tag == "\\":
+                # "\ No newline at end of file" APPLIES TO THE LINE BEFORE
+                for side in ((old,) if last == "-" else (new,) if last == "+" else (old, new)):
+                    side[-1] = side[-1][:-1]
+                continue
+            if tag in " -":
+                old.append(text)
+                old_left -= 1
+            if tag in " +":
+                new.append(text)
+                new_left -= 1
+            if tag not in " -+" or old_left < 0 or new_left < 0:
+                raise ValueError(f"Malformed hunk line: {line[:80]!r}")
+            last = tag
+
+        # AN EMPTY OLD SIDE INSERTS AFTER LINE `start`
+        hunks.append((start if not old else start - 1, old, new))
+
+    if not hunks:
+        raise ValueError("The diff has no hunks.")
+    return hunks
+
+
+# lines of the blob with their "\n",
+# the last one possibly without
+def _lines(blob_id, size):
+    pending = b""
+    for data in storage.iter_blob(blob_id, 0, size):
+        pending += data
+        *complete, pending = pending.split(b"\n")
+        for line in complete:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+# unified diff against the current body as byte-range
+# edits, every removed and context line must match
+def parse_diff(diff, node):
+    if not isinstance(diff, str):
+        raise ValueError("diff must be a unified diff string.")
+
+    hunks = _hunks(diff)
+    if len(hunks) > MAX_EDITS:
+        raise ValueError(f"At most {MAX_EDITS} hunks per diff.")
+
+    lines = _lines(node.blob_id, node.size) if node.blob_id else iter(())
+    index = offset = 0
+    edits = []
+    for first, old, new in hunks:
+        if first < index:
+            raise ValueError("Hunks overlap or are out of order.")
+        while index < first:
+            line = next(lines, None)
+            if line is None:
+                raise ValueError(f"Hunk at line {first + 1} starts past the end of the file.")
+            offset += len(line)
+            index += 1
+
+        start = offset
+        for expected in old:
+            line = next(lines, None)
+            if line != expected.encode("utf-8"):
+                raise ValueError(f"Hunk does not apply at line {index + 1}.")
+            offset += len(line)
+            index += 1
+        edits.append((start, offset, "".join(new).encode("utf-8")))
+    return edits
+
+
+# new body: ranges of the old blob between
+# the edits, the edit bytes in their place
+def splice(blob_id, size, edits):
+    pos = 0
+    for start, end, data in edits:
+        if blob_id:
+            yield from storage.iter_blob(blob_id, pos, start)
+        yield data
+        pos = end
+    if blob_id:
+        yield from storage.iter_blob(blob_id, pos, size)
+
+
+# stores the edited body of the file as a blob,
+# the caller owns the reference like with write_content
+def apply(node, edits):
+    writer = storage.BlobWriter()
+    for data in splice(node.blob_id, node.size, edits):
+        writer.write(data)
+    return writer.close()
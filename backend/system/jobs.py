@@ -0,0 +1,248 @@
+"""
+Background jobs for tree operations too big for one request.
+
+Jobs live in the Job table, there is no broker: a small thread pool
+in the web process picks them up once the submitting transaction
+commits, and the `run_jobs` command drains whatever is left pending
+(JOB_WORKERS=0 leaves everything to it). A job is claimed with a
+conditional UPDATE, so a pool thread and a worker process never run
+the same one, and it processes the subtree in JOB_CHUNK_SIZE chunks,
+each in its own transaction, reporting progress as it goes. Every
+progress report is a heartbeat: a job still RUNNING after
+JOB_STALE_AFTER seconds without one lost its worker, and the next
+run_pending() puts it back in the queue; handlers pick up from
+whatever the dead worker left.
+Purges go through system.purging.
+
+The trash retention sweep is a job too: a scheduler thread started
+by the web process (and every `run_jobs` poll) queues one whenever
+the last is older than TRASH_SWEEP_INTERVAL.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+from . models import Change, Job, Node
+from . import changes, listings, purging, retention
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_scheduler = None
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix="jobs")
+    return _executor
+
+
+# records the job and hands it to the pool
+# once the surrounding transaction commits
+def submit(kind, node, **params):
+    job = Job.objects.create(kind=kind, node_id=(node.id if node else None), params=params)
+    if settings.JOB_WORKERS:
+        transaction.on_commit(lambda: _pool().submit(run, job.id))
+    return job
+
+
+# runs the job unless somebody else claimed it already,
+# the outcome is stored on the job row
+def run(job_id):
+    now = timezone.now()
+    claimed = Job.objects.filter(id=job_id, state=Job.States.PENDING).update(
+        state=Job.States.RUNNING, started_at=now, heartbeat_at=now
+    )
+    if not claimed:
+        return
+
+    job = Job.objects.get(id=job_id)
+    try:
+        result = HANDLERS[job.kind](job)
+        Job.objects.filter(id=job.id).update(state=Job.States.DONE, result=result, finished_at=timezone.now())
+    except Exception as e:
+        logger.exception("Job %s failed", job.id)
+        Job.objects.filter(id=job.id).update(state=Job.States.FAILED, error=str(e), finished_at=timezone.now())
+    finally:
+        # POOL THREADS OUTLIVE THE JOB, THEIR CONNECTIONS SHOULDN'T
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+# running jobs whose worker stopped reporting progress
+# back to PENDING, returns how many there were
+def reclaim_stale():
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER)
+    stale = Job.objects.filter(state=Job.States.RUNNING, heartbeat_at__lt=cutoff)
+    reclaimed = stale.update(state=Job.States.PENDING)
+    if reclaimed:
+        logger.warning("Reclaimed %s stale job(s)", reclaimed)
+    return reclaimed
+
+
+# runs the pending jobs oldest first, in this thread,
+# returns the ids of the jobs it went through
+def run_pending(limit=100):
+    reclaim_stale()
+    pending = list(Job.objects.filter(state=Job.States.PENDING).order_by("id").values_list("id", flat=True)[:limit])
+    for job_id in pending:
+        run(job_id)
+    return pending
+
+
+def _progress(job, total=None, done=None):
+    values = {k: v for k, v in (("total", total), ("done", done)) if v is not None}
+    Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now(), **values)
+
+
+# ids of the next chunk of the queryset
+def _chunk(qs):
+    return list(qs.values_list("id", flat=True)[:settings.JOB_CHUNK_SIZE])
+
+
+# soft delete of a directory, the directory first so
+# it leaves the listings at once, then its live subtree
+def trash_subtree(job):
+    node = Node.objects.get(id=job.node_id)
+    subtree = Node.objects.subtree(node).filter(is_trashed=False)
+    now = timezone.now()
+    _progress(job, total=subtree.count())
+
+    with transaction.atomic():
+        done = Node.objects.filter(id=node.id, is_trashed=False).update(is_trashed=True, trashed_at=now)
+        if done:
+            Node.objects.add_totals(node.ancestor_ids, node.totals, sign=-1)
+            listings.touch([node])
+            changes.record(Change.Kinds.TRASH, [node], subtree=True)
+
+    while ids := _chunk(subtree):
+        with transaction.atomic():
+            done += Node.objects.filter(id__in=ids).update(is_trashed=True, trashed_at=now)
+        _progress(job, done=done)
+
+    return {"trashed_count": done}
+
+
+# restore of a directory under params["parent_id"], the
+# directory first so a taken name fails before any work
+def restore_subtree(job):
+    node = Node.objects.get(id=job.node_id)
+    _progress(job, total=Node.objects.subtree(node).filter(is_trashed=True).count())
+
+    old_path = node.path
+    try:
+        with transaction.atomic():
+            node.parent_id = job.params.get("parent_id")
+            node.is_trashed = False
+            node.trashed_at = None
+            node.save()
+    except IntegrityError:
+        raise ValueError("An item with this name already exists at destination.")
+    done = 1
+    _progress(job, done=done)
+
+    # READ UNDER THE PATH THE SAVE MAY HAVE JUST MOVED IT TO
+    subtree = Node.objects.subtree(node).filter(is_trashed=True)
+
+    while ids := _chunk(subtree):
+        with transaction.atomic():
+            done += Node.objects.filter(id__in=ids).update(is_trashed=False, trashed_at=None)
+        _progress(job, done=done)
+
+    # TOTALS ONLY ONCE THE WHOLE SUBTREE IS BACK
+    with transaction.atomic():
+        Node.objects.recompute_totals(node)
+        node.refresh_from_db(fields=Node.TOTAL_FIELDS)
+        Node.objects.add_totals(node.ancestor_ids, node.totals)
+        listings.touch([node], subtree=True)
+        changes.record(Change.Kinds.RESTORE, [node], subtree=True, old_paths={node.id: old_path} if node.path != old_path else None)
+
+    return {"restored_count": done}
+
+
+# permanent delete of a trashed directory, stopped
+# if it leaves the trash before the next chunk
+def purge_subtree(job):
+    node = Node.objects.filter(id=job.node_id, is_trashed=True).first()
+    if node is None:
+        raise ValueError("The item is no longer in the trash.")
+    subtree = Node.objects.subtree(node).filter(is_trashed=True)
+    _progress(job, total=subtree.count())
+
+    done = 0
+    for done in purging.purge(subtree, settings.JOB_CHUNK_SIZE):
+        _progress(job, done=done)
+        if Node.objects.filter(id=node.id, is_trashed=False).exists():
+            raise ValueError(f"The item was restored after {done} node(s) were purged.")
+
+    return {"purged_count": done}
+
+
+# purge of the trash entries older than params["cutoff"],
+# the total counts every node trashed before it
+def empty_trash(job):
+    cutoff = datetime.fromisoformat(job.params["cutoff"])
+    _progress(job, total=Node.objects.filter(is_trashed=True, trashed_at__lt=cutoff).count())
+
+    purged = skipped = 0
+    for purged, skipped in purging.empty_trash(cutoff, settings.JOB_CHUNK_SIZE):
+        _progress(job, done=purged)
+
+    return {"purged_count": purged, "skipped_count": skipped}
+
+
+# one retention sweep, the metrics of the run are the result
+def sweep_trash(job):
+    return retention.sweep(progress=lambda done: _progress(job, done=done))
+
+
+# queues a sweep unless one was queued within the
+# interval, returns the new job if there is one
+def schedule_sweep():
+    interval = settings.TRASH_SWEEP_INTERVAL
+    if not interval:
+        return None
+    since = timezone.now() - timedelta(seconds=interval)
+    with transaction.atomic():
+        if Job.objects.filter(kind=Job.Kinds.SWEEP, created_at__gt=since).exists():
+            return None
+        return submit(Job.Kinds.SWEEP, None)
+
+
+def _schedule_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            schedule_sweep()
+        except Exception:
+            logger.exception("Scheduling the trash sweep failed")
+        finally:
+            connections.close_all()
+
+
+# starts the thread queueing sweeps, once per process
+def start_scheduler():
+    global _scheduler
+    interval = settings.TRASH_SWEEP_INTERVAL
+    with _executor_lock:
+        if _scheduler is None and interval:
+            # POLL MORE OFTEN THAN THE INTERVAL, ANOTHER PROCESS MAY HAVE QUEUED ONE
+            _scheduler = threading.Thread(target=_schedule_loop, args=(min(interval, 60),), name="sweep-scheduler", daemon=True)
+            _scheduler.start()
+
+
+HANDLERS = {
+    Job.Kinds.TRASH: trash_subtree,
+    Job.Kinds.RESTORE: restore_subtree,
+    Job.Kinds.PURGE: purge_subtree,
+    Job.Kinds.EMPTY_TRASH: empty_trash,
+    Job.Kinds.SWEEP: sweep_trash,
+}
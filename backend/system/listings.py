@@ -0,0 +1,141 @@
+"""
+Cache of directory listings.
+
+Pages of DirectoryView.get are kept in Django's cache under the
+current version of their directory, a random token per directory
+(the root included). Any write that changes what a listing shows
+replaces the token, so pages cached under the old one are never
+served again and simply expire. A node shows up in its parent's
+listing and its totals in the listing of every ancestor's parent,
+so a change to a node bumps the root and all of its ancestors.
+
+Tokens are replaced right away and once more when the transaction
+commits: a page computed from the old rows between the two can't
+outlive the commit. Trashed nodes never appear in a listing, so
+purges and trash sweeps leave the cache alone.
+
+Web workers and the `run_jobs` worker all replace tokens, so the
+cache must be one every process shares (redis, memcached, database,
+files): on the per-process backends the listing cache stays off,
+and core.settings refuses to start when it is turned on there.
+"""
+import hashlib
+import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from . models import Node
+from . utils import make_etag
+
+PREFIX = "listing"
+
+HITS_KEY = f"{PREFIX}:hits"
+MISSES_KEY = f"{PREFIX}:misses"
+
+
+# backends whose entries live in (or never leave) one process
+PER_PROCESS_BACKENDS = ("LocMemCache", "DummyCache")
+
+
+# every process that writes (web workers, the `run_jobs`
+# worker) has to see the version tokens the others replace
+def is_shared():
+    return not settings.CACHES["default"]["BACKEND"].endswith(PER_PROCESS_BACKENDS)
+
+
+def is_enabled():
+    return settings.LISTING_CACHE_TIMEOUT > 0 and is_shared()
+
+
+def _version_key(parent_id):
+    return f"{PREFIX}:v:{parent_id or 'root'}"
+
+
+def _page_key(parent_id, version, params):
+    digest = hashlib.sha1(repr(params).encode("utf-8")).hexdigest()
+    return f"{PREFIX}:{parent_id or 'root'}:{version}:{digest}"
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+# current version token of the listing, created
+# on first use (or after the cache dropped it)
+def version(parent_id):
+    key = _version_key(parent_id)
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        token = cache.get(key)
+    return token
+
+
+# cached page of the listing for these params, or None,
+# together with the version to store a fresh one under
+def get(parent_id, params):
+    if not is_enabled():
+        return None, None
+    token = version(parent_id)
+    page = cache.get(_page_key(parent_id, token, params))
+    _count(HITS_KEY if page is not None else MISSES_KEY)
+    return page, token
+
+
+# entity tag of the page, valid as long as the version
+def etag(parent_id, token, params):
+    return make_etag(parent_id, token, params)
+
+
+def put(parent_id, token, params, page):
+    if is_enabled() and token is not None:
+        cache.set(_page_key(parent_id, token, params), page, settings.LISTING_CACHE_TIMEOUT)
+
+
+# get() and put() for the ASGI listing view, one hop to a
+# thread each; the async API of Django's cache backends does the
+# same per call, so going through it would cost three for a get
+aget = sync_to_async(get)
+aput = sync_to_async(put)
+
+
+def _bump(parent_ids):
+    cache.set_many({_version_key(pk): uuid.uuid4().hex for pk in parent_ids}, timeout=None)
+
+
+# invalidates the listings of these directories
+# and of the root, whose totals cover everything
+def invalidate(parent_ids):
+    if not is_enabled():
+        return
+    parent_ids = {None, *parent_ids}
+    _bump(parent_ids)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(parent_ids))
+
+
+# invalidates every listing showing the nodes or their
+# totals, with `subtree` also the listings inside them
+def touch(nodes, subtree=False):
+    if not is_enabled():
+        return
+    parent_ids = set()
+    for node in nodes:
+        parent_ids.update(node.ancestor_ids)
+        if subtree and node.node_type == Node.NodeTypes.DIRECTORY:
+            parent_ids.update(Node.objects.subtree(node).filter(node_type=Node.NodeTypes.DIRECTORY).values_list("id", flat=True))
+    invalidate(parent_ids)
+
+
+# hits and misses since the counters were
+# created, shared by every process of the cache
+def stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = counts.get(HITS_KEY, 0), counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None}
@@ -0,0 +1,102 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from system.models import Node
+
+
+class Command(BaseCommand):
+    """
+        Seeds a synthetic tree and times the hot listing and
+        duplicate-check queries with and without the Node indexes.
+        Everything runs in one transaction that is rolled back,
+        so only backends with transactional DDL are supported.
+    """
+    help = "Benchmark listing / duplicate-check latency with and without the Node indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--nodes", type=int, default=1_000_000, help="Total number of nodes to seed.")
+        parser.add_argument("--dirs", type=int, default=1000, help="Number of directories sharing the nodes.")
+        parser.add_argument("--hot", type=int, default=100_000, help="Children of the one big directory being listed.")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per query, the median is reported.")
+
+    def handle(self, *args, **opts):
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(f"{connection.vendor} can't roll back DDL, run the benchmark on SQLite or PostgreSQL.")
+
+        with transaction.atomic():
+            hot_dir = self.seed(opts["nodes"], opts["dirs"], opts["hot"])
+            queries = self.queries(hot_dir)
+
+            indexed = {name: self.measure(fn, opts["repeat"]) for name, fn in queries.items()}
+            self.drop_indexes()
+            plain = {name: self.measure(fn, opts["repeat"]) for name, fn in queries.items()}
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{'query':<28}{'no indexes':>14}{'indexed':>14}{'speedup':>10}")
+        for name in queries:
+            self.stdout.write(f"{name:<28}{plain[name]:>12.2f}ms{indexed[name]:>12.2f}ms{plain[name] / indexed[name]:>9.1f}x")
+
+    # one level of directories under a root, one of them
+    # holding `hot` children, the rest spread evenly,
+    # a tenth of the files trashed
+    def seed(self, total, dir_count, hot):
+        root = Node.objects.create(name="bench", node_type=Node.NodeTypes.DIRECTORY)
+        dirs = Node.objects.bulk_create(
+            [Node(name=f"dir-{i}", node_type=Node.NodeTypes.DIRECTORY, parent=root) for i in range(dir_count)],
+            batch_size=1000,
+        )
+
+        hot_dir, *others = dirs
+        seeded = dir_count + self.seed_files(hot_dir, hot)
+        per_dir = max(0, (total - seeded) // max(1, len(others)))
+        for d in others:
+            seeded += self.seed_files(d, per_dir)
+
+        self.stdout.write(f"seeded {seeded} nodes, {hot} in the listed directory")
+        return hot_dir
+
+    def seed_files(self, parent, count):
+        now = timezone.now()
+        for start in range(0, count, 5000):
+            Node.objects.bulk_create(
+                [
+                    Node(
+                        name=f"file-{i}.txt", node_type=Node.NodeTypes.FILE, parent=parent, size=(i * 7919) % 100_000,
+                        is_trashed=(i % 10 == 0), trashed_at=(now if i % 10 == 0 else None),
+                    )
+                    for i in range(start, min(count, start + 5000))
+                ],
+                batch_size=1000,
+            )
+        return count
+
+    def queries(self, hot_dir):
+        listing = Node.objects.filter(parent_id=hot_dir.id, is_trashed=False)
+        return {
+            "list by name": lambda: list(listing.order_by("name", "id")[:100]),
+            "list by size": lambda: list(listing.order_by("-size", "-id")[:100]),
+            "list by mtime": lambda: list(listing.order_by("-modified_at", "-id")[:100]),
+            "duplicate check": lambda: Node.objects.filter(
+                parent_id=hot_dir.id, name="new-file.txt", node_type=Node.NodeTypes.FILE, is_trashed=False
+            ).exists(),
+            "trash by trashed_at": lambda: list(Node.objects.filter(is_trashed=True).order_by("-trashed_at", "-id")[:100]),
+        }
+
+    def measure(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    # the partial unique constraint is an index
+    # as well on the backends that support it
+    def drop_indexes(self):
+        names = [index.name for index in Node._meta.indexes] + [c.name for c in Node._meta.constraints]
+        with connection.cursor() as cur:
+            for name in names:
+                cur.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
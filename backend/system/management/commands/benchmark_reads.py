@@ -0,0 +1,146 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from urllib.parse import urlencode, urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Connection:
+    """
+        Minimal keep-alive HTTP/1.1 client, enough to drive
+        the API without pulling in a client library.
+    """
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, target, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if payload is not None:
+            head += "Content-Type: application/json\r\n"
+        self.writer.write(head.encode() + b"\r\n" + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            data = b""
+            while size := int((await self.reader.readline()).strip(), 16):
+                data += await self.reader.readexactly(size + 2)
+            await self.reader.readline()
+        else:
+            data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection") == "close":
+            self.close()
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    """
+        Load test of the hot read endpoints against a running
+        server, to compare the WSGI deployment (gunicorn core.wsgi)
+        with the ASGI one (uvicorn core.asgi) on the same database.
+        Seeds a directory of files through the API, then keeps
+        `concurrency` connections busy with a mix of listings,
+        directory and file details and searches.
+    """
+    help = "Benchmark requests/sec and latency of the read endpoints of a running server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base url of the server.")
+        parser.add_argument("--concurrency", type=int, default=100, help="Connections sending requests at once.")
+        parser.add_argument("--requests", type=int, default=5000, help="Total number of requests.")
+        parser.add_argument("--files", type=int, default=200, help="Files seeded in the listed directory.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed of the request mix.")
+
+    def handle(self, *args, **opts):
+        url = urlsplit(opts["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("--url must be a plain http:// url.")
+        self.host, self.port = url.hostname, url.port or 80
+        asyncio.run(self.run(opts))
+
+    async def run(self, opts):
+        targets = await self.seed(opts["files"])
+        rng = random.Random(opts["seed"])
+        plan = [rng.choice(targets) for _ in range(opts["requests"])]
+
+        # WARM UP, ONE PASS OVER EVERY TARGET
+        conn = Connection(self.host, self.port)
+        for target in targets:
+            await conn.request("GET", target)
+        conn.close()
+
+        queue = iter(plan)
+        timings, errors = [], 0
+
+        async def worker():
+            nonlocal errors
+            conn = Connection(self.host, self.port)
+            for target in queue:
+                start = time.perf_counter()
+                try:
+                    status, _ = await conn.request("GET", target)
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                    status = None
+                    conn.close()
+                timings.append((time.perf_counter() - start) * 1000)
+                errors += status != 200
+            conn.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(opts["concurrency"])))
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        def pct(p):
+            return timings[min(len(timings) - 1, int(len(timings) * p))]
+        self.stdout.write(
+            f"{len(timings)} requests, {opts['concurrency']} connections, {errors} errors\n"
+            f"{len(timings) / elapsed:.1f} req/s, mean {statistics.mean(timings):.1f}ms, "
+            f"p50 {pct(0.5):.1f}ms, p99 {pct(0.99):.1f}ms, max {timings[-1]:.1f}ms"
+        )
+
+    # a directory of `count` files under a fresh name,
+    # returns the urls of the request mix
+    async def seed(self, count):
+        conn = Connection(self.host, self.port)
+        name = f"bench-reads-{int(time.time())}"
+        status, data = await conn.request("POST", "/api/dirs/", {"name": name, "node_type": "DIRECTORY"})
+        if status != 201:
+            raise CommandError(f"Seeding failed ({status}): {data[:200]!r}")
+        parent = json.loads(data)["data"]["id"]
+
+        file_ids = []
+        for i in range(count):
+            payload = {"name": f"report-{i}.txt", "parent_id": parent, "content": f"quarterly report {i}\n" * 20}
+            status, data = await conn.request("POST", "/api/files/", payload)
+            if status != 201:
+                raise CommandError(f"Seeding failed ({status}): {data[:200]!r}")
+            file_ids.append(json.loads(data)["data"]["id"])
+        conn.close()
+        self.stdout.write(f"seeded {count} files in /{name}")
+
+        return [
+            f"/api/dirs/?{urlencode({'parent_id': parent, 'sort': 'name'})}",
+            f"/api/dirs/?{urlencode({'parent_id': parent, 'sort': 'size', 'limit': 50})}",
+            f"/api/dirs-detail/{parent}/?ancestors=1",
+            f"/api/search/?{urlencode({'q': 'report', 'parent_id': parent, 'limit': 20})}",
+            *(f"/api/files/{pk}/" for pk in file_ids[:20]),
+        ]
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from system import storage
+from system.models import Blob, BlobChunk
+
+
+class Command(BaseCommand):
+    """
+        Compresses the chunks stored raw before compression
+        existed (or while it was off), a batch per transaction,
+        keeping each blob's stored_size in step. Bodies and
+        digests don't change, only how the chunks are stored.
+    """
+    help = "Compress the raw chunks of stored file bodies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=100, help="Chunks per transaction.")
+
+    def handle(self, *args, **opts):
+        last_id = packed = saved = 0
+        raw = BlobChunk.objects.filter(codec=BlobChunk.Codecs.RAW).order_by("id")
+        while batch := list(raw.filter(id__gt=last_id).values_list("id", "blob_id", "data")[:opts["batch"]]):
+            with transaction.atomic():
+                for chunk_id, blob_id, data in batch:
+                    last_id = chunk_id
+                    data = bytes(data)
+                    codec, stored = storage.encode(data)
+                    if codec == BlobChunk.Codecs.RAW:
+                        continue
+                    BlobChunk.objects.filter(id=chunk_id).update(codec=codec, data=stored)
+                    Blob.objects.filter(id=blob_id).update(stored_size=F("stored_size") - (len(data) - len(stored)))
+                    packed += 1
+                    saved += len(data) - len(stored)
+            self.stdout.write(f"compressed {packed} chunks, {saved} bytes saved so far")
+
+        self.stdout.write(self.style.SUCCESS(f"compressed {packed} chunks, {saved} bytes saved"))
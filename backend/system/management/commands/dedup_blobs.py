@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from system import storage
+from system.models import Blob, Node
+
+
+class Command(BaseCommand):
+    """
+        Reports how much space content-addressed storage saves
+        and reclaims blobs no file references anymore. Refcounts
+        are recomputed from the nodes first so drifted counts
+        are repaired before anything is deleted.
+    """
+    help = "Report the dedup ratio of file bodies and reclaim orphaned blobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report, change nothing.")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            files = Node.objects.exclude(blob=None).aggregate(count=Count("id"), bytes=Sum("size"))
+            blobs = Blob.objects.aggregate(count=Count("id"), bytes=Sum("size"), stored=Sum("stored_size"))
+            logical, unique, stored = files["bytes"] or 0, blobs["bytes"] or 0, blobs["stored"] or 0
+
+            self.stdout.write(f"files:          {files['count']}")
+            self.stdout.write(f"unique bodies:  {blobs['count']}")
+            self.stdout.write(f"logical bytes:  {logical}")
+            self.stdout.write(f"unique bytes:   {unique}")
+            self.stdout.write(f"stored bytes:   {stored}")
+            self.stdout.write(f"dedup ratio:    {logical / unique if unique else 1:.2f}x")
+            self.stdout.write(f"compression:    {unique / stored if stored else 1:.2f}x")
+
+            fixed = storage.recount()
+            orphans = storage.orphans().aggregate(count=Count("id"), bytes=Sum("size"))
+            self.stdout.write(f"refcounts off:  {fixed}")
+            self.stdout.write(f"orphaned blobs: {orphans['count']} ({orphans['bytes'] or 0} bytes)")
+
+            if opts["dry_run"]:
+                transaction.set_rollback(True)
+                return
+
+            storage.orphans().delete()
+            self.stdout.write(self.style.SUCCESS(f"reclaimed {orphans['count']} blobs"))
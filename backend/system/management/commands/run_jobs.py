@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from system import jobs
+from system.models import Job
+
+
+class Command(BaseCommand):
+    """
+        Local worker for background jobs: runs the pending
+        ones oldest first and polls for new ones. Safe next
+        to the in-process pool, each job is claimed once.
+        Also queues the trash retention sweep when it is due.
+    """
+    help = "Run pending background jobs (trash, restore, purge of big directories)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+
+    def handle(self, *args, **opts):
+        while True:
+            jobs.schedule_sweep()
+            pending = jobs.run_pending()
+            for job in Job.objects.filter(id__in=pending).order_by("id"):
+                self.stdout.write(f"job {job.id} {job.kind} of node {job.node_id}: {job.state}")
+
+            if opts["once"] and not pending:
+                return
+            if not pending:
+                time.sleep(opts["interval"])
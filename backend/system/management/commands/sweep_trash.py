@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from system import retention
+
+
+class Command(BaseCommand):
+    """
+        Applies the trash retention policy right away, in the
+        foreground: expired entries first, then the oldest ones
+        while the trash is over TRASH_MAX_BYTES. Prints the
+        metrics of the run, the same a SWEEP job records.
+    """
+    help = "Purge trash entries past TRASH_RETENTION_DAYS or over TRASH_MAX_BYTES."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=None, help="Nodes purged per transaction (default TRASH_SWEEP_BATCH).")
+
+    def handle(self, *args, **opts):
+        metrics = retention.sweep(chunk_size=opts["batch"])
+        for key, value in metrics.items():
+            self.stdout.write(f"{key + ':':<17} {value}")
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+def backfill_tree_paths(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+
+    parents = dict(Node.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def path_of(node_id):
+        if node_id not in paths:
+            parent_id = parents[node_id]
+            prefix = path_of(parent_id) if parent_id else "/"
+            paths[node_id] = f"{prefix}{node_id}/"
+        return paths[node_id]
+
+    batch = []
+    for node_id in parents:
+        path = path_of(node_id)
+        batch.append(Node(id=node_id, path=path, depth=path.count("/") - 2))
+        if len(batch) >= 1000:
+            Node.objects.bulk_update(batch, ["path", "depth"])
+            batch = []
+    Node.objects.bulk_update(batch, ["path", "depth"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=512),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE system_node_fts USING fts5(name, content, tokenize='unicode61', prefix='2 3')"
+        )
+    elif vendor == "mysql":
+        schema_editor.execute(
+            "CREATE TABLE system_node_fts ("
+            " rowid BIGINT NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, content LONGTEXT NOT NULL,"
+            " FULLTEXT INDEX system_node_fts_name (name), FULLTEXT INDEX system_node_fts_content (content),"
+            " FULLTEXT INDEX system_node_fts_both (name, content)"
+            ") ENGINE=InnoDB"
+        )
+    else:
+        return
+
+    Node = apps.get_model("system", "Node")
+    rows = Node.objects.values_list("id", "name", "content").iterator(chunk_size=1000)
+    with schema_editor.connection.cursor() as cur:
+        batch = []
+        for node_id, name, content in rows:
+            batch.append((node_id, name, content or ""))
+            if len(batch) >= 1000:
+                cur.executemany("INSERT INTO system_node_fts (rowid, name, content) VALUES (%s, %s, %s)", batch)
+                batch = []
+        if batch:
+            cur.executemany("INSERT INTO system_node_fts (rowid, name, content) VALUES (%s, %s, %s)", batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "mysql"):
+        schema_editor.execute("DROP TABLE system_node_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0002_node_tree_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('node', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='system.node')),
+                ('name', models.TextField()),
+                ('content', models.TextField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'system_node_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
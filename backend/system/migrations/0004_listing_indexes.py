@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:35
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_live_duplicates(apps, schema_editor):
+    """
+    Racing requests could create two live nodes with the same name
+    in one folder. Keep the oldest and suffix the others with their
+    id so the unique constraint can be created.
+    """
+    Node = apps.get_model("system", "Node")
+    groups = (
+        Node.objects.filter(is_trashed=False)
+        .values("parent_id", "name", "node_type")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for group in groups:
+        group.pop("n")
+        for node in Node.objects.filter(is_trashed=False, **group).order_by("id")[1:]:
+            node.name = f"{node.name[:230]} ({node.id})"
+            node.save(update_fields=["name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['parent', 'name', 'id'], name='node_list_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['parent', 'size', 'id'], name='node_list_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['parent', 'modified_at', 'id'], name='node_list_mtime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['parent', 'node_type', 'id'], name='node_list_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(condition=models.Q(('is_trashed', True)), fields=['trashed_at', 'id'], name='node_trash_idx'),
+        ),
+        migrations.RunPython(rename_live_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='node',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_trashed', False), ('parent__isnull', False)), fields=('parent', 'name', 'node_type'), name='node_unique_live_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='node',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_trashed', False), ('parent__isnull', True)), fields=('name', 'node_type'), name='node_unique_live_root_name'),
+        ),
+    ]
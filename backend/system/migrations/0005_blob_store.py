@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:48
+
+import hashlib
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_content_to_blobs(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+    Blob = apps.get_model("system", "Blob")
+
+    files = Node.objects.filter(node_type="FILE").only("id", "content").iterator(chunk_size=500)
+    for node in files:
+        data = (node.content or "").encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        blob = Blob.objects.create(digest=digest, size=len(data), data=data)
+        Node.objects.filter(id=node.id).update(blob=blob, content_hash=digest, size=len(data))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0004_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='node',
+            name='size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='nodes', to='system.blob'),
+        ),
+        migrations.RunPython(move_content_to_blobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='node',
+            name='content',
+        ),
+    ]
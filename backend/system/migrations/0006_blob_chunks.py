@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHUNK_SIZE = 256 * 1024
+
+
+def split_blobs_into_chunks(apps, schema_editor):
+    Blob = apps.get_model("system", "Blob")
+    BlobChunk = apps.get_model("system", "BlobChunk")
+
+    for blob in Blob.objects.only("id", "data").iterator(chunk_size=100):
+        data = bytes(blob.data or b"")
+        BlobChunk.objects.bulk_create([
+            BlobChunk(blob_id=blob.id, seq=seq, data=data[offset:offset + CHUNK_SIZE])
+            for seq, offset in enumerate(range(0, len(data), CHUNK_SIZE))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0005_blob_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='system.blob')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('blob', 'seq'), name='blob_chunk_seq_unique')],
+            },
+        ),
+        migrations.RunPython(split_blobs_into_chunks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='blob',
+            name='data',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:52
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_blobs(apps, schema_editor):
+    Blob = apps.get_model("system", "Blob")
+    Node = apps.get_model("system", "Node")
+
+    duplicated = Blob.objects.values("digest").annotate(n=Count("id"), keep=Min("id")).filter(n__gt=1)
+    for row in duplicated.iterator():
+        others = Blob.objects.filter(digest=row["digest"]).exclude(id=row["keep"])
+        Node.objects.filter(blob__in=others).update(blob_id=row["keep"])
+        others.delete()
+
+    for blob in Blob.objects.annotate(n=Count("nodes")).iterator():
+        Blob.objects.filter(id=blob.id).update(refcount=blob.n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0006_blob_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='refcount',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(merge_duplicate_blobs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='blob',
+            name='digest',
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+    ]
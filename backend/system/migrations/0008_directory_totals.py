@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:54
+
+from collections import defaultdict
+from django.db import migrations, models
+
+
+def compute_directory_totals(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+
+    # ONE PASS OVER THE LIVE NODES, EACH ONE COUNTED IN ALL OF ITS ANCESTORS
+    totals = defaultdict(lambda: [0, 0, 0])
+    live = Node.objects.filter(is_trashed=False).values_list("path", "node_type", "size").iterator(chunk_size=2000)
+    for path, node_type, size in live:
+        for ancestor_id in path.strip("/").split("/")[:-1]:
+            row = totals[int(ancestor_id)]
+            if node_type == "FILE":
+                row[0] += size
+                row[1] += 1
+            else:
+                row[2] += 1
+
+    dirs = Node.objects.filter(node_type="DIRECTORY").only("id").iterator(chunk_size=2000)
+    updated = []
+    for node in dirs:
+        node.size, node.file_count, node.dir_count = totals.get(node.id, (0, 0, 0))
+        updated.append(node)
+        if len(updated) == 500:
+            Node.objects.bulk_update(updated, ["size", "file_count", "dir_count"])
+            updated = []
+    Node.objects.bulk_update(updated, ["size", "file_count", "dir_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0007_blob_dedup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='dir_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='file_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(compute_directory_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0009_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('TRASH', 'Trash'), ('RESTORE', 'Restore'), ('PURGE', 'Purge'), ('EMPTY', 'Empty trash')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='node_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
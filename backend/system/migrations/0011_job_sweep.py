@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0010_job_empty_trash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('TRASH', 'Trash'), ('RESTORE', 'Restore'), ('PURGE', 'Purge'), ('EMPTY', 'Empty trash'), ('SWEEP', 'Trash sweep')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0011_job_sweep'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('delta', models.BinaryField(blank=True, null=True)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField(default=0)),
+                ('stored_size', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='revisions', to='system.blob')),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='system.node')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('node', 'number'), name='file_revision_number_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:17
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Length
+
+
+# EXISTING CHUNKS STAY RAW, WHAT THEY TAKE IS THEIR LENGTH
+def compute_stored_sizes(apps, schema_editor):
+    Blob = apps.get_model("system", "Blob")
+    BlobChunk = apps.get_model("system", "BlobChunk")
+    stored = (
+        BlobChunk.objects.filter(blob=OuterRef("pk")).order_by().values("blob")
+        .annotate(total=Sum(Length("data"))).values("total")
+    )
+    Blob.objects.update(stored_size=Coalesce(Subquery(stored), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0012_file_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='stored_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blobchunk',
+            name='codec',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Raw'), (1, 'zlib'), (2, 'lzma')], default=0),
+        ),
+        migrations.RunPython(compute_stored_sizes, migrations.RunPython.noop),
+    ]
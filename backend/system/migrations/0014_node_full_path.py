@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:41
+
+import hashlib
+from django.db import migrations, models
+
+
+def backfill_full_paths(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+
+    rows = {pk: (parent_id, name) for pk, parent_id, name in Node.objects.values_list("id", "parent_id", "name")}
+    full_paths = {}
+
+    def full_path_of(node_id):
+        if node_id not in full_paths:
+            parent_id, name = rows[node_id]
+            prefix = full_path_of(parent_id) if parent_id else ""
+            full_paths[node_id] = f"{prefix}/{name}"
+        return full_paths[node_id]
+
+    batch = []
+    for node_id in rows:
+        full_path = full_path_of(node_id)
+        batch.append(Node(id=node_id, full_path=full_path, path_hash=hashlib.md5(full_path.encode("utf-8")).hexdigest()))
+        if len(batch) >= 1000:
+            Node.objects.bulk_update(batch, ["full_path", "path_hash"])
+            batch = []
+    Node.objects.bulk_update(batch, ["full_path", "path_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0013_chunk_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='full_path',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='path_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.RunPython(backfill_full_paths, migrations.RunPython.noop),
+    ]
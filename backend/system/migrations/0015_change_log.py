@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0014_node_full_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('CREATE', 'Create'), ('UPDATE', 'Update'), ('MOVE', 'Move'), ('TRASH', 'Trash'), ('RESTORE', 'Restore'), ('PURGE', 'Purge'), ('PERMS', 'Permissions')], max_length=10)),
+                ('node_id', models.BigIntegerField()),
+                ('node_type', models.CharField(choices=[('FILE', 'File'), ('DIRECTORY', 'Directory')], max_length=10)),
+                ('parent_id', models.BigIntegerField(blank=True, null=True)),
+                ('path', models.CharField(max_length=512)),
+                ('old_path', models.CharField(blank=True, default='', max_length=512)),
+                ('subtree', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
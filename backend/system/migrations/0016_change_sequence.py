@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:40
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_existing_changes(apps, schema_editor):
+    Change = apps.get_model("system", "Change")
+    ChangeSequence = apps.get_model("system", "ChangeSequence")
+    Change.objects.update(seq=F("id"))
+    ChangeSequence.objects.create(id=1, last=Change.objects.aggregate(last=Max("id"))["last"] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0015_change_log'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='change',
+            name='seq',
+            field=models.BigIntegerField(unique=True),
+        ),
+    ]
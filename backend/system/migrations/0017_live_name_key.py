@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:01
+
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+# the trash queries go through trashed_at IS NOT NULL,
+# trashed rows written without it get their mtime
+def backfill_trashed_at(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+    Node.objects.filter(is_trashed=True, trashed_at__isnull=True).update(trashed_at=F("modified_at"))
+
+
+# MySQL never enforced the partial constraints this replaces,
+# live duplicates have to be renamed before the key can be unique
+def check_duplicate_names(apps, schema_editor):
+    Node = apps.get_model("system", "Node")
+    duplicates = list(
+        Node.objects.filter(live_name__isnull=False).values("live_name").annotate(n=Count("id")).filter(n__gt=1)[:20]
+    )
+    if duplicates:
+        keys = ", ".join(row["live_name"] for row in duplicates)
+        raise RuntimeError(f"Live nodes share a name in the same directory, rename or trash them first: {keys}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0016_change_sequence'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='node',
+            name='node_unique_live_name',
+        ),
+        migrations.RemoveConstraint(
+            model_name='node',
+            name='node_unique_live_root_name',
+        ),
+        migrations.RemoveIndex(
+            model_name='node',
+            name='node_trash_idx',
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='live_name',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(is_trashed=False, then=django.db.models.functions.text.Concat(django.db.models.functions.comparison.Cast('parent', models.CharField()), models.Value('/'), 'node_type', models.Value('/'), 'name')), default=None), output_field=models.CharField(max_length=300, null=True)),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['trashed_at', 'id'], name='node_trash_idx'),
+        ),
+        migrations.RunPython(backfill_trashed_at, migrations.RunPython.noop),
+        migrations.RunPython(check_duplicate_names, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='node',
+            constraint=models.UniqueConstraint(fields=('live_name',), name='node_unique_live_name'),
+        ),
+    ]
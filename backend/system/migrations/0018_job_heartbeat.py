@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:07
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+# jobs left RUNNING before the heartbeat existed
+# count from their start, so they can be reclaimed
+def backfill_heartbeat(apps, schema_editor):
+    Job = apps.get_model("system", "Job")
+    Job.objects.filter(state="RUNNING").update(heartbeat_at=F("started_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system', '0017_live_name_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeat, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,168 @@
+import hashlib
+from collections import defaultdict
 from django.db import models
+from django.db.models import DEFERRED, Case, F, Max, Q, Value, When
+from django.db.models.functions import MD5, Cast, Concat, Length, Substr
+
+
+# values of `field` starting with `prefix`, as a range any index on
+# the column can seek: startswith is a LIKE, case-insensitive on
+# SQLite so its BINARY index is skipped. Paths are plain ASCII,
+# so byte order is prefix order ("0" comes right after "/")
+def prefix_range(field, prefix):
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)})
+
+
+class PathTooLong(ValueError):
+    """
+    A node would get a materialized path longer than the
+    column holds, raised before the path is written so the
+    surrounding transaction rolls the operation back.
+    """
+
+
+class NodeQuerySet(models.QuerySet):
+
+    # every node under given one
+    # including the node itself
+    def subtree(self, node):
+        return self.filter(prefix_range("path", node.path))
+
+    # every node above given one
+    # from the root down to its parent
+    def ancestors(self, node):
+        return self.filter(id__in=node.ancestor_ids)
+
+    # live node at a full path like "/projects/acme/config.yaml",
+    # one lookup on the indexed hash of the path
+    def at_path(self, full_path):
+        return self.filter(path_hash=Node.hash_path(full_path), full_path=full_path, is_trashed=False)
+
+    # the same as a breadcrumb, root first, read by primary
+    # key in one query however deep the node is
+    def chain(self, node):
+        return self.ancestors(node).order_by("depth")
+
+    # nodes having every bit of the mask set,
+    # checked by the database with a bitwise AND
+    def with_permissions(self, mask):
+        return self.alias(granted=F("permissions").bitand(mask)).filter(granted=mask)
+
+    def readable(self):
+        return self.with_permissions(self.model.Permissions.READ)
+
+    # nodes missing at least one bit of the mask
+    def lacking_permissions(self, mask):
+        return self.alias(granted=F("permissions").bitand(mask)).exclude(granted=mask)
+
+    # every node under any of the given ones, one range
+    # per node so callers pass them in small batches
+    def subtrees(self, nodes):
+        match = Q(pk__in=[])
+        for node in nodes:
+            match |= prefix_range("path", node.path)
+        return self.filter(match)
+
+    # adds (or with sign=-1 takes away) the totals
+    # of a node to every directory in `ids` at once
+    def add_totals(self, ids, totals, sign=1):
+        size, files, dirs = totals
+        if not ids or not (size or files or dirs):
+            return 0
+        return self.filter(id__in=ids).update(
+            size=F("size") + sign * size,
+            file_count=F("file_count") + sign * files,
+            dir_count=F("dir_count") + sign * dirs,
+        )
+
+    # add_totals for many nodes at once: (ids, totals, sign)
+    # changes are summed per directory and written with
+    # one UPDATE per distinct delta
+    def add_totals_many(self, changes):
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for ids, totals, sign in changes:
+            for pk in ids:
+                for i, value in enumerate(totals):
+                    deltas[pk][i] += sign * value
+
+        by_delta = defaultdict(list)
+        for pk, delta in deltas.items():
+            by_delta[tuple(delta)].append(pk)
+        for delta, ids in by_delta.items():
+            for start in range(0, len(ids), 500):
+                self.add_totals(ids[start:start + 500], delta)
+
+    # moves the contribution of a node from the ancestors
+    # and totals it had to the ones it has now
+    def shift_totals(self, old_ids, old_totals, new_ids, new_totals):
+        if old_ids == new_ids:
+            delta = tuple(new - old for new, old in zip(new_totals, old_totals))
+            return self.add_totals(new_ids, delta)
+        self.add_totals(old_ids, old_totals, sign=-1)
+        self.add_totals(new_ids, new_totals)
+
+    # recounts the totals of every directory of the
+    # subtree (node included) from the live nodes under it,
+    # one pass over the subtree like migration 0008
+    def recompute_totals(self, node):
+        totals = defaultdict(lambda: [0, 0, 0])
+        live = self.model.objects.subtree(node).filter(is_trashed=False).exclude(id=node.id).values_list("path", "node_type", "size")
+        for path, node_type, size in live.iterator(chunk_size=2000):
+            # ANCESTORS INSIDE THE SUBTREE ONLY, THE NODE FIRST
+            for ancestor_id in path.strip("/").split("/")[node.depth:-1]:
+                row = totals[int(ancestor_id)]
+                if node_type == self.model.NodeTypes.FILE:
+                    row[0] += size
+                    row[1] += 1
+                else:
+                    row[2] += 1
+
+        dirs = self.model.objects.subtree(node).filter(node_type=self.model.NodeTypes.DIRECTORY).values_list("id", flat=True)
+        fixed = [self.model(id=pk, **dict(zip(self.model.TOTAL_FIELDS, totals.get(pk, (0, 0, 0))))) for pk in dirs.iterator(chunk_size=2000)]
+        self.bulk_update(fixed, self.model.TOTAL_FIELDS, batch_size=500)
+
+
+class Blob(models.Model):
+    """
+    Body of a file, kept apart from the Node row so metadata
+    queries and permission checks never read it. The bytes are
+    split in fixed-size BlobChunk rows so bodies are streamed in
+    and out with bounded memory. Written and read through
+    system.storage only.
+
+    Blobs are content-addressed: one row per sha256 digest, shared
+    by every node with the same body and counted in `refcount`.
+    The digest stays NULL while a blob is still being written.
+    `size` is the length of the body, `stored_size` what its
+    chunks take once compressed.
+    """
+    digest = models.CharField(max_length=64, unique=True, null=True)
+    size = models.BigIntegerField(default=0)
+    stored_size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+
+
+class BlobChunk(models.Model):
+    """
+    CHUNK_SIZE bytes of a body (the last chunk shorter), stored
+    as is or compressed with `codec`; the offset of a chunk in
+    the body is always seq * CHUNK_SIZE of uncompressed bytes.
+    """
+    class Codecs(models.IntegerChoices):
+        RAW = 0, "Raw"
+        ZLIB = 1, "zlib"
+        LZMA = 2, "lzma"
+
+    blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name="chunks")
+    seq = models.PositiveIntegerField()
+    codec = models.PositiveSmallIntegerField(choices=Codecs, default=Codecs.RAW)
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["blob", "seq"], name="blob_chunk_seq_unique"),
+        ]
+
 
 class Node(models.Model):
 
@@ -28,13 +192,340 @@ class Node(models.Model):
     name = models.CharField(max_length=255)
     node_type = models.CharField(max_length=10, choices=NodeTypes)
     parent = models.ForeignKey("self", null=True, blank=True, on_delete=models.CASCADE, related_name='children')
-    content = models.TextField(blank=True, null=True)
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name="nodes")
+    content_hash = models.CharField(max_length=64, blank=True, default="")
     permissions = models.IntegerField(default=Permissions.READ | Permissions.WRITE | Permissions.DELETE)
-    size = models.IntegerField(default=0)
+    size = models.BigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
     is_trashed = models.BooleanField(default=False)
     trashed_at = models.DateTimeField(null=True, blank=True)
 
+    """
+    Materialized path of the node: ids from the root down to
+    the node itself, like "/1/5/12/". Every descendant of a node
+    shares its path as prefix, so subtree and ancestor lookups
+    are a single indexed query instead of a walk level by level.
+    Both fields are maintained by save() only, which refuses
+    a create or move past PATH_MAX_LENGTH with PathTooLong.
+    """
+    PATH_MAX_LENGTH = 512
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, default="", db_index=True)
+    depth = models.PositiveIntegerField(default=0)
+
+    """
+    The same path by names, like "/projects/acme/config.yaml",
+    rewritten for the whole subtree on a rename or move. Paths
+    have no length limit so the lookups go through `path_hash`,
+    the MD5 of the full path computed by the database itself
+    when a subtree is rewritten. A directory and a file of the
+    same name share their full path.
+    """
+    full_path = models.TextField(blank=True, default="")
+    path_hash = models.CharField(max_length=32, blank=True, default="", db_index=True)
+
+    TREE_FIELDS = ("path", "depth", "full_path", "path_hash")
+
+    """
+    Totals of a directory's live subtree: `size` is the sum of
+    the file sizes, `file_count`/`dir_count` the number of files
+    and directories under it. Views keep them current by pushing
+    deltas to the ancestors (see NodeQuerySet.add_totals), a
+    trashed directory keeps the totals it had until it is restored
+    and recounted. For files `size` is the body length.
+    """
+    file_count = models.PositiveIntegerField(default=0)
+    dir_count = models.PositiveIntegerField(default=0)
+
+    TOTAL_FIELDS = ("size", "file_count", "dir_count")
+
+    """
+    Key of the live name, "<parent id>/<type>/<name>" ("" for the
+    root's parent), NULL once the node is trashed. A column the
+    database computes itself, so the unique index on it guards
+    live names on every backend: MySQL has no partial indexes
+    to put a condition on is_trashed.
+    """
+    live_name = models.GeneratedField(
+        expression=Case(
+            When(is_trashed=False, then=Concat(Cast("parent", models.CharField()), Value("/"), "node_type", Value("/"), "name")),
+            default=None,
+        ),
+        output_field=models.CharField(max_length=300, null=True),
+        db_persist=True,
+    )
+
+    objects = NodeQuerySet.as_manager()
+
+    """
+    Indexes follow the actual query shapes: listings filter on
+    the parent and walk one of the sort keys with id as tie-break,
+    skipping the few trashed rows on the way (Django renders
+    is_trashed=False as NOT is_trashed, which can't seek an index),
+    the trash walks trashed_at, which only trashed rows have (its
+    queries add trashed_at IS NOT NULL for a range the index seeks,
+    a bare is_trashed can't). No index is partial, MySQL skips them. The unique constraint on `live_name` is the
+    race-free guard for live names, root nodes included.
+    """
+    class Meta:
+        indexes = [
+            models.Index(fields=["parent", "name", "id"], name="node_list_name_idx"),
+            models.Index(fields=["parent", "size", "id"], name="node_list_size_idx"),
+            models.Index(fields=["parent", "modified_at", "id"], name="node_list_mtime_idx"),
+            models.Index(fields=["parent", "node_type", "id"], name="node_list_type_idx"),
+            models.Index(fields=["trashed_at", "id"], name="node_trash_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["live_name"], name="node_unique_live_name"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.node_type})"
+
+    @staticmethod
+    def build_path(parent, pk):
+        return f"{parent.path if parent else '/'}{pk}/"
+
+    @staticmethod
+    def build_full_path(parent, name):
+        return f"{parent.full_path if parent else ''}/{name}"
+
+    @staticmethod
+    def check_path_length(length):
+        if length > Node.PATH_MAX_LENGTH:
+            raise PathTooLong("The folder tree is too deep here, items can't be nested any further.")
+
+    @staticmethod
+    def hash_path(full_path):
+        return hashlib.md5(full_path.encode("utf-8")).hexdigest()
+
+    @property
+    def ancestor_ids(self):
+        return [int(x) for x in self.path.strip("/").split("/")[:-1]]
+
+    # what the node adds to the totals
+    # of every directory above it
+    @property
+    def totals(self):
+        if self.node_type == Node.NodeTypes.FILE:
+            return (self.size, 1, 0)
+        return (self.size, self.file_count, self.dir_count + 1)
+
+    def is_inside(self, other):
+        return self.path.startswith(other.path)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get("parent_id", DEFERRED)
+        instance._loaded_name = instance.__dict__.get("name", DEFERRED)
+        return instance
+
+    def save(self, *args, **kwargs):
+        creating = self._state.adding
+        moving = kwargs.get("update_fields") is None or "parent" in kwargs["update_fields"]
+        renaming = kwargs.get("update_fields") is None or "name" in kwargs["update_fields"]
+
+        # TREE FIELDS AND DIRECTORY TOTALS ARE NEVER WRITTEN BACK FROM
+        # MEMORY SO A STALE INSTANCE CAN'T UNDO A MOVE OR A DELTA
+        if not creating and kwargs.get("update_fields") is None:
+            deferred = self.get_deferred_fields()
+            skipped = self.TREE_FIELDS + (self.TOTAL_FIELDS if self.node_type == Node.NodeTypes.DIRECTORY else ())
+            kwargs["update_fields"] = [
+                f.attname for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in deferred and f.name not in skipped
+            ]
+
+        loaded_parent_id = getattr(self, "_loaded_parent_id", DEFERRED)
+        loaded_name = getattr(self, "_loaded_name", DEFERRED)
+        if creating:
+            self.full_path = Node.build_full_path(self.parent, self.name)
+            self.path_hash = Node.hash_path(self.full_path)
+        super().save(*args, **kwargs)
+
+        moved = moving and loaded_parent_id is not DEFERRED and loaded_parent_id != self.parent_id
+        renamed = renaming and loaded_name is not DEFERRED and loaded_name != self.name
+        if creating:
+            self.path = Node.build_path(self.parent, self.pk)
+            self.depth = len(self.ancestor_ids)
+            Node.check_path_length(len(self.path))
+            Node.objects.filter(id=self.pk).update(path=self.path, depth=self.depth)
+        elif moved or renamed:
+            self._relocate()
+
+        self._loaded_parent_id = self.parent_id
+        self._loaded_name = self.name
+
+    # rewrites path prefixes of the whole subtree
+    # after the node changed its parent or name
+    def _relocate(self):
+        old_path, old_full_path = self.path, self.full_path
+        new_path = Node.build_path(self.parent, self.pk)
+        new_full_path = Node.build_full_path(self.parent, self.name)
+        new_depth = new_path.count("/") - 2
+
+        # THE DEEPEST PATH OF THE SUBTREE GROWS AS MUCH AS THE NODE'S
+        subtree = Node.objects.filter(prefix_range("path", old_path))
+        if len(new_path) > len(old_path):
+            deepest = subtree.aggregate(longest=Max(Length("path")))["longest"] or len(old_path)
+            Node.check_path_length(deepest + len(new_path) - len(old_path))
+
+        full_path = Concat(Value(new_full_path), Substr("full_path", len(old_full_path) + 1), output_field=models.TextField())
+        subtree.update(
+            path=Concat(Value(new_path), Substr("path", len(old_path) + 1), output_field=models.CharField()),
+            depth=F("depth") + (new_depth - self.depth),
+            full_path=full_path,
+            path_hash=MD5(full_path),
+        )
+        self.path, self.full_path = new_path, new_full_path
+        self.path_hash = Node.hash_path(new_full_path)
+        self.depth = new_depth
+
+
+class Job(models.Model):
+    """
+    Long-running tree operation (trash, restore or purge of a big
+    directory, emptying the trash) processed in the background by
+    system.jobs, in chunks of their own transactions. `done` out
+    of `total` nodes is the progress reported to the client.
+    `heartbeat_at` moves with the progress, a RUNNING job whose
+    heartbeat is older than JOB_STALE_AFTER lost its worker and
+    goes back to PENDING.
+
+    The node is kept as a plain id: a purge deletes it while
+    the job row has to stay around to report the result.
+    """
+    class Kinds(models.TextChoices):
+        TRASH = "TRASH", "Trash"
+        RESTORE = "RESTORE", "Restore"
+        PURGE = "PURGE", "Purge"
+        EMPTY_TRASH = "EMPTY", "Empty trash"
+        SWEEP = "SWEEP", "Trash sweep"
+
+    class States(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        RUNNING = "RUNNING", "Running"
+        DONE = "DONE", "Done"
+        FAILED = "FAILED", "Failed"
+
+    kind = models.CharField(max_length=10, choices=Kinds)
+    node_id = models.BigIntegerField(null=True, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+    state = models.CharField(max_length=10, choices=States, default=States.PENDING)
+    total = models.PositiveIntegerField(default=0)
+    done = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "id"], name="job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of {self.node_id} ({self.state})"
+
+
+class FileRevision(models.Model):
+    """
+    One version of a file body, numbered from 1 per file.
+
+    A snapshot holds a reference to the blob of that body (shared,
+    like any other, never copied); the revisions in between store
+    only a zlib-compressed delta from the previous one, so a body
+    is rebuilt from the closest snapshot before it. Written and
+    read through system.revisions only. `stored_size` is what the
+    revision costs: the delta length or the snapshot blob size.
+    """
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name="revisions")
+    number = models.PositiveIntegerField()
+    blob = models.ForeignKey(Blob, null=True, blank=True, on_delete=models.PROTECT, related_name="revisions")
+    delta = models.BinaryField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64)
+    size = models.BigIntegerField(default=0)
+    stored_size = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["node", "number"], name="file_revision_number_unique"),
+        ]
+
+    @property
+    def is_snapshot(self):
+        return self.blob_id is not None
+
+    def __str__(self):
+        return f"{self.node_id} r{self.number}"
+
+
+class SearchEntry(models.Model):
+    """
+    Full-text index row of a node, keyed by the node id.
+
+    The table is not managed by Django: on SQLite it is an FTS5
+    virtual table, on MySQL a plain table with FULLTEXT indexes
+    (see migration 0003). It is written by system.search only and
+    exists here so listings can join it and order by `rank`.
+    """
+    node = models.OneToOneField(Node, primary_key=True, db_column="rowid", db_constraint=False,
+                                on_delete=models.DO_NOTHING, related_name="search_entry")
+    name = models.TextField()
+    content = models.TextField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = "system_node_fts"
+
+class Change(models.Model):
+    """
+    Entry of the change log clients sync from: `seq` is the
+    cursor, every write to the tree appends one row per node it
+    touched in the same transaction, so a change shows up when
+    it commits. Ids are handed out at insert time and can commit
+    out of order; `seq` comes from ChangeSequence, whose row stays
+    locked until the writing transaction ends, so numbers become
+    visible in order and a cursor never skips one. `subtree` marks directory changes that apply
+    to everything under the node (trash, restore, move, rename,
+    copy), `path` is the materialized path after the change and
+    `old_path` the one before a move. Like Job the node is a
+    plain id, purged nodes keep their entries.
+    """
+    class Kinds(models.TextChoices):
+        CREATE = "CREATE", "Create"
+        UPDATE = "UPDATE", "Update"
+        MOVE = "MOVE", "Move"
+        TRASH = "TRASH", "Trash"
+        RESTORE = "RESTORE", "Restore"
+        PURGE = "PURGE", "Purge"
+        PERMISSIONS = "PERMS", "Permissions"
+
+    kind = models.CharField(max_length=10, choices=Kinds)
+    node_id = models.BigIntegerField()
+    node_type = models.CharField(max_length=10, choices=Node.NodeTypes)
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    path = models.CharField(max_length=512)
+    old_path = models.CharField(max_length=512, blank=True, default="")
+    seq = models.BigIntegerField(unique=True)
+    subtree = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.kind} of {self.node_id}"
+
+
+class ChangeSequence(models.Model):
+    """
+    Single row holding the last Change.seq handed out. Bumped
+    inside the writing transaction (see changes.record), the row
+    lock serializes writers of the log until they commit.
+    """
+    last = models.BigIntegerField(default=0)
+
     def __str__(self):
-        return f"{self.name} ({self.node_type})"
\ No newline at end of file
+        return f"change sequence at {self.last}"
@@ -0,0 +1,100 @@
+"""
+Permanent deletion of trashed nodes.
+
+Django's delete() collects every row reachable through CASCADE
+in memory and deletes them with one IN (...) per model, which on a
+big tree means the whole subtree in Python and more parameters than
+SQLite accepts. Purges here walk the nodes deepest first (descending
+path order, served straight from the path index) and remove bounded
+chunks with raw DELETEs: children are always gone before their
+parent, so there is nothing left for a cascade to do. Every purged
+node gets its entry in the change log.
+"""
+from django.db import transaction
+from django.db.models import Q
+from . models import Change, Node
+from . import changes, revisions, search, storage
+
+CHUNK_SIZE = 1000
+
+
+# one DELETE for the rows of the queryset, returns the count.
+# Skipping delete()'s collector is safe because callers clear
+# whatever points at the rows first (children before parents,
+# revisions and index rows before their node; nothing references
+# revisions or change entries), blob references are released by
+# hand, and no pre/post_delete receivers exist in the project.
+# _raw_delete is private Django API, it is called from here only
+def raw_delete(qs):
+    return qs._raw_delete(qs.db)
+
+
+# deletes every node of the queryset, which must hold whole
+# subtrees, chunk by chunk in their own transactions,
+# yields the running count after each chunk
+def purge(qs, chunk_size=CHUNK_SIZE):
+    qs = qs.order_by("-path").only("id", "blob_id", "node_type", "parent_id", "path")
+    done = 0
+    while rows := list(qs[:chunk_size]):
+        with transaction.atomic():
+            chunk = Node.objects.filter(id__in=[node.id for node in rows])
+            search.unindex(chunk)
+            revisions.drop(chunk)
+            raw_delete(chunk)
+            storage.release([node.blob_id for node in rows])
+            changes.record(Change.Kinds.PURGE, rows)
+        done += len(rows)
+        yield done
+
+
+# runs a purge to the end, returns the count
+def purge_all(qs, chunk_size=CHUNK_SIZE):
+    done = 0
+    for done in purge(qs, chunk_size):
+        pass
+    return done
+
+
+# top-level items of the trash, the way the
+# trash shows them: trashed nodes whose parent isn't
+def trash_entries():
+    return Node.objects.filter(is_trashed=True, trashed_at__isnull=False).filter(Q(parent__isnull=True) | Q(parent__is_trashed=False))
+
+
+# an entry goes only if nothing under it is
+# live again and all of it grants DELETE
+def is_purgeable(node):
+    subtree = Node.objects.subtree(node)
+    return not (subtree.filter(is_trashed=False).exists() or subtree.lacking_permissions(Node.Permissions.DELETE).exists())
+
+
+# trash entries put there before `cutoff` purged with
+# their subtree, the ones that can't go are skipped;
+# yields (purged, skipped) after each chunk
+def empty_trash(cutoff, chunk_size=CHUNK_SIZE):
+    entries = trash_entries().filter(trashed_at__lt=cutoff)
+    purged = skipped = 0
+
+    # FILES ARE THEIR OWN SUBTREE, A WHOLE CHUNK AT A TIME
+    files = entries.filter(node_type=Node.NodeTypes.FILE)
+    skipped += files.lacking_permissions(Node.Permissions.DELETE).count()
+    deletable = files.with_permissions(Node.Permissions.DELETE)
+    while ids := list(deletable.values_list("id", flat=True)[:chunk_size]):
+        purged += purge_all(Node.objects.filter(id__in=ids), chunk_size)
+        yield purged, skipped
+
+    # DIRECTORIES ONE BY ONE, IN KEYSET ORDER SO SKIPPED ONES AREN'T SEEN TWICE
+    last_id = 0
+    dirs = entries.filter(node_type=Node.NodeTypes.DIRECTORY).order_by("id")
+    while batch := list(dirs.filter(id__gt=last_id)[:100]):
+        for node in batch:
+            last_id = node.id
+            if not is_purgeable(node):
+                skipped += 1
+                continue
+            done = 0
+            for done in purge(Node.objects.subtree(node), chunk_size):
+                yield purged + done, skipped
+            purged += done
+
+    yield purged, skipped
@@ -0,0 +1,94 @@
+"""
+Trash retention policy.
+
+A sweep purges the trash entries older than TRASH_RETENTION_DAYS
+and then, while the trashed files still weigh more than
+TRASH_MAX_BYTES, the oldest remaining entries. Everything goes
+through system.purging in TRASH_SWEEP_BATCH chunks, so a sweep
+never holds a long transaction. Sweeps run as SWEEP jobs, queued
+every TRASH_SWEEP_INTERVAL seconds by system.jobs, or on demand
+with the `sweep_trash` command. The same pass drops the change log
+entries older than CHANGES_RETENTION_DAYS.
+"""
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from . models import Blob, Node
+from . import changes, purging
+
+logger = logging.getLogger(__name__)
+
+
+# bytes of the files currently in the trash
+def trash_bytes():
+    return Node.objects.filter(is_trashed=True, node_type=Node.NodeTypes.FILE).aggregate(total=Sum("size"))["total"] or 0
+
+
+# bytes actually stored for file bodies
+def stored_bytes():
+    return Blob.objects.aggregate(total=Sum("stored_size"))["total"] or 0
+
+
+# oldest entries first until the trash fits in `limit`,
+# yields (purged, skipped) after each chunk
+def _cap_trash(limit, chunk_size):
+    over = trash_bytes() - limit
+    purged = skipped = 0
+    last = None
+
+    entries = purging.trash_entries().order_by("trashed_at", "id")
+    while over > 0:
+        page = entries if last is None else entries.filter(trashed_at__gte=last.trashed_at).exclude(trashed_at=last.trashed_at, id__lte=last.id)
+        batch = list(page[:100])
+        if not batch:
+            break
+        for entry in batch:
+            last = entry
+            if over <= 0:
+                break
+            if not purging.is_purgeable(entry):
+                skipped += 1
+                continue
+            done = 0
+            for done in purging.purge(Node.objects.subtree(entry), chunk_size):
+                yield purged + done, skipped
+            purged += done
+            over -= entry.size
+
+    yield purged, skipped
+
+
+# one pass of the policy, `progress` gets the running number
+# of purged nodes, returns the metrics of the run
+def sweep(progress=None, chunk_size=None):
+    chunk_size = chunk_size or settings.TRASH_SWEEP_BATCH
+    progress = progress or (lambda done: None)
+    started = time.monotonic()
+    trash_before, stored_before = trash_bytes(), stored_bytes()
+
+    expired = capped = skipped = 0
+    if settings.TRASH_RETENTION_DAYS:
+        cutoff = timezone.now() - timedelta(days=settings.TRASH_RETENTION_DAYS)
+        for expired, skipped in purging.empty_trash(cutoff, chunk_size):
+            progress(expired)
+
+    cap_skipped = 0
+    if settings.TRASH_MAX_BYTES:
+        for capped, cap_skipped in _cap_trash(settings.TRASH_MAX_BYTES, chunk_size):
+            progress(expired + capped)
+
+    metrics = {
+        "rows": expired + capped,
+        "expired_rows": expired,
+        "capped_rows": capped,
+        "skipped_entries": skipped + cap_skipped,
+        "bytes": trash_before - trash_bytes(),
+        "stored_bytes": stored_before - stored_bytes(),
+        "pruned_changes": changes.prune(),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info("Trash sweep: %s", metrics)
+    return metrics
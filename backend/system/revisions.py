@@ -0,0 +1,201 @@
+"""
+Version history of file bodies.
+
+Every content write records a FileRevision. Most revisions store
+only a delta from the previous body: the lines kept are copied by
+byte range, the rest inserted, and the script is zlib-compressed.
+Every REVISION_SNAPSHOT_EVERY revisions, and whenever a delta
+wouldn't pay off (bodies over REVISION_DELTA_MAX_BYTES, binary
+rewrites), the revision is a snapshot holding a reference to the
+body's blob instead, which bounds the deltas replayed to rebuild
+any version.
+
+History per file is capped by REVISIONS_MAX_PER_FILE and
+REVISIONS_MAX_BYTES of stored revisions, the oldest go first. When
+the oldest kept revision is a delta it is turned into a snapshot
+before the ones it depends on are dropped.
+"""
+import difflib
+import struct
+import zlib
+from django.conf import settings
+from . models import Blob, FileRevision
+from . import purging, storage
+
+COPY = b"C"
+INSERT = b"I"
+
+
+# length of the common prefix, compared block by block
+def _common_prefix(a, b, limit, block=4096):
+    n = 0
+    while n + block <= limit and a[n:n + block] == b[n:n + block]:
+        n += block
+    while n < limit and a[n] == b[n]:
+        n += 1
+    return n
+
+
+# copy/insert script turning `old` into `new`, lines
+# are matched so it stays small for text edits
+def make_delta(old, new):
+    # COMMON HEAD AND TAIL FIRST, MOST EDITS ARE LOCAL
+    limit = min(len(old), len(new))
+    head = old.rfind(b"\n", 0, _common_prefix(old, new, limit)) + 1
+    tail = _common_prefix(old[::-1], new[::-1], limit - head)
+
+    ops = [(COPY, 0, head)] if head else []
+    old_mid, new_mid = old[head:len(old) - tail], new[head:len(new) - tail]
+    old_lines, new_lines = old_mid.splitlines(keepends=True), new_mid.splitlines(keepends=True)
+    old_offsets = [head]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append((COPY, old_offsets[i1], old_offsets[i2] - old_offsets[i1]))
+        elif j2 > j1:
+            ops.append((INSERT, b"".join(new_lines[j1:j2])))
+    if tail:
+        ops.append((COPY, len(old) - tail, tail))
+
+    parts = []
+    for op in ops:
+        if op[0] == COPY:
+            parts.append(COPY + struct.pack(">QQ", op[1], op[2]))
+        else:
+            parts.append(INSERT + struct.pack(">Q", len(op[1])) + op[1])
+    return zlib.compress(b"".join(parts))
+
+
+def apply_delta(old, delta):
+    script = zlib.decompress(delta)
+    out = []
+    pos = 0
+    while pos < len(script):
+        op = script[pos:pos + 1]
+        if op == COPY:
+            start, length = struct.unpack_from(">QQ", script, pos + 1)
+            out.append(old[start:start + length])
+            pos += 17
+        else:
+            (length,) = struct.unpack_from(">Q", script, pos + 1)
+            out.append(script[pos + 9:pos + 9 + length])
+            pos += 9 + length
+    return b"".join(out)
+
+
+def _read(blob_id):
+    return b"".join(storage.iter_blob(blob_id)) if blob_id else b""
+
+
+def _snapshot(node, number, blob_id, content_hash, size):
+    storage.acquire([blob_id])
+    return FileRevision.objects.create(
+        node=node, number=number, blob_id=blob_id, content_hash=content_hash, size=size, stored_size=size,
+    )
+
+
+# records the body the file now has, `old_blob_id` being the
+# one it replaces; files without history get it as revision 1
+def record(node, old_blob_id=None):
+    old = Blob.objects.filter(id=old_blob_id).first() if old_blob_id else None
+    last = node.revisions.defer("delta").order_by("-number").first()
+    if last is None and old is not None:
+        last = _snapshot(node, 1, old.id, old.digest, old.size)
+    number = last.number + 1 if last else 1
+
+    # A DELTA NEEDS THE PREVIOUS REVISION TO BE THE REPLACED BODY
+    delta = None
+    chained = old is not None and last.content_hash == old.digest and (number - 1) % settings.REVISION_SNAPSHOT_EVERY
+    if chained and max(old.size, node.size) <= settings.REVISION_DELTA_MAX_BYTES:
+        delta = make_delta(_read(old.id), _read(node.blob_id))
+        if len(delta) > node.size // 2:
+            delta = None
+
+    if delta is None:
+        revision = _snapshot(node, number, node.blob_id, node.content_hash, node.size)
+    else:
+        revision = FileRevision.objects.create(
+            node=node, number=number, delta=delta, content_hash=node.content_hash, size=node.size, stored_size=len(delta),
+        )
+    prune(node)
+    return revision
+
+
+# body of the revision, replayed from
+# the closest snapshot at or before it
+def read(revision):
+    if revision.is_snapshot:
+        return _read(revision.blob_id)
+    chain = list(
+        FileRevision.objects.filter(node_id=revision.node_id, number__lte=revision.number)
+        .filter(number__gte=_snapshot_before(revision).number)
+        .order_by("number")
+    )
+    data = _read(chain[0].blob_id)
+    for step in chain[1:]:
+        data = apply_delta(data, step.delta)
+    return data
+
+
+# read() a chunk at a time for responses: snapshots stream
+# from their blob, a delta's body is under REVISION_DELTA_MAX_BYTES
+def iter_read(revision):
+    if revision.is_snapshot:
+        yield from storage.iter_blob(revision.blob_id, 0, revision.size)
+        return
+    data = read(revision)
+    for pos in range(0, len(data), storage.CHUNK_SIZE):
+        yield data[pos:pos + storage.CHUNK_SIZE]
+
+
+def _snapshot_before(revision):
+    return (
+        FileRevision.objects.filter(node_id=revision.node_id, number__lte=revision.number, blob__isnull=False)
+        .defer("delta").order_by("-number").first()
+    )
+
+
+# blob with the body of the revision, one reference
+# owned by the caller like storage.write_content
+def to_blob(revision):
+    if revision.is_snapshot:
+        storage.acquire([revision.blob_id])
+        return revision.blob
+    return storage.write_stream([read(revision)])
+
+
+# drops the oldest revisions over the caps,
+# the latest one always stays
+def prune(node):
+    revisions = list(node.revisions.defer("delta").order_by("-number"))
+    kept, stored = 0, 0
+    for revision in revisions:
+        if kept and (kept >= settings.REVISIONS_MAX_PER_FILE or stored + revision.stored_size > settings.REVISIONS_MAX_BYTES):
+            break
+        kept += 1
+        stored += revision.stored_size
+    dropped = revisions[kept:]
+    if not dropped:
+        return 0
+
+    # THE OLDEST KEPT ONE CAN'T DEPEND ON WHAT GOES
+    oldest = revisions[kept - 1]
+    if not oldest.is_snapshot:
+        blob = storage.write_stream([read(oldest)])
+        FileRevision.objects.filter(id=oldest.id).update(blob=blob, delta=None, stored_size=blob.size)
+
+    purging.raw_delete(FileRevision.objects.filter(id__in=[r.id for r in dropped]))
+    storage.release([r.blob_id for r in dropped])
+    return len(dropped)
+
+
+# revisions of the nodes in the queryset deleted and their
+# snapshots released, must run before the nodes go
+def drop(nodes):
+    revisions = FileRevision.objects.filter(node__in=nodes)
+    blob_ids = list(revisions.filter(blob__isnull=False).values_list("blob_id", flat=True))
+    purging.raw_delete(revisions)
+    storage.release(blob_ids)
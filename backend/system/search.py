@@ -0,0 +1,110 @@
+"""
+Full-text index over node names and file content.
+
+SQLite keeps it in an FTS5 virtual table and MySQL in a table with
+FULLTEXT indexes, both joined to system_node so every other filter
+(type, parent, trash, permissions) runs inside the same query.
+Other backends have no index and fall back to a LIKE scan of names.
+Only the first SEARCH_INDEX_MAX_BYTES of a body are indexed.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from . models import Node, SearchEntry
+
+
+TABLE = SearchEntry._meta.db_table
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+
+# the body cut to SEARCH_INDEX_MAX_BYTES of UTF-8,
+# never in the middle of a character
+def indexed_text(content):
+    content = content or ""
+    limit = settings.SEARCH_INDEX_MAX_BYTES
+    if len(content) * 4 <= limit:
+        return content
+    return content.encode("utf-8")[:limit].decode("utf-8", errors="ignore")
+
+
+def is_indexed():
+    return connection.vendor in ("sqlite", "mysql")
+
+
+# write name and content of a node into the index,
+# called after every create/rename/content change
+def index_node(node, content=None):
+    if not is_indexed():
+        return
+    row = [node.id, node.name, indexed_text(content)]
+    with connection.cursor() as cur:
+        if connection.vendor == "sqlite":
+            cur.execute(f"DELETE FROM {TABLE} WHERE rowid = %s", [node.id])
+            cur.execute(f"INSERT INTO {TABLE} (rowid, name, content) VALUES (%s, %s, %s)", row)
+        else:
+            cur.execute(f"REPLACE INTO {TABLE} (rowid, name, content) VALUES (%s, %s, %s)", row)
+
+
+# duplicates the index rows of the `copies`
+# (new id -> source id) without reading bodies
+def copy_entries(copies):
+    if not is_indexed():
+        return
+    pairs = list(copies.items())
+    with connection.cursor() as cur:
+        for start in range(0, len(pairs), 500):
+            batch = pairs[start:start + 500]
+            cases = " ".join("WHEN %s THEN %s" for _ in batch)
+            params = [v for new_id, old_id in batch for v in (old_id, new_id)] + [old_id for _, old_id in batch]
+            cur.execute(
+                f"INSERT INTO {TABLE} (rowid, name, content) "
+                f"SELECT CASE rowid {cases} END, name, content FROM {TABLE} "
+                f"WHERE rowid IN ({', '.join(['%s'] * len(batch))})",
+                params,
+            )
+
+
+# drop index rows of every node in the queryset,
+# must run before the nodes themselves are deleted
+def unindex(qs):
+    if not is_indexed():
+        return
+    sql, params = qs.values("id").query.sql_with_params()
+    with connection.cursor() as cur:
+        cur.execute(f"DELETE FROM {TABLE} WHERE rowid IN ({sql})", params)
+
+
+def build_query(q, scope):
+    tokens = TOKEN_RE.findall(q)
+    if connection.vendor == "sqlite":
+        expr = " ".join(f'"{t}"*' for t in tokens)
+        columns = {"name": "{name}", "content": "{content}"}.get(scope)
+        return f"{columns} : ({expr})" if columns else expr
+    return " ".join(f"+{t}*" for t in tokens)
+
+
+# narrows node queryset to the nodes matching `q`
+# and annotates each of them with `rank` (lower is better)
+def search(qs, q, scope):
+    if not TOKEN_RE.search(q):
+        return qs.none()
+
+    if connection.vendor == "sqlite":
+        match = RawSQL(f'"{TABLE}" MATCH %s', [build_query(q, scope)], output_field=BooleanField())
+        return qs.filter(search_entry__isnull=False).filter(match).annotate(rank=F("search_entry__rank"))
+
+    if connection.vendor == "mysql":
+        columns = {"name": "name", "content": "content"}.get(scope, "name, content")
+        against = f"MATCH({columns}) AGAINST (%s IN BOOLEAN MODE)"
+        query = build_query(q, scope)
+        qs = qs.filter(id__in=RawSQL(f"SELECT rowid FROM {TABLE} WHERE {against}", [query]))
+        return qs.annotate(rank=RawSQL(f"(SELECT -{against} FROM {TABLE} WHERE rowid = {Node._meta.db_table}.id)", [query], output_field=FloatField()))
+
+    # BODIES ARE STORED AS BYTES, WITHOUT AN INDEX ONLY NAMES ARE SEARCHABLE
+    if scope == "content":
+        return qs.none()
+    return qs.filter(name__icontains=q).annotate(rank=Value(0.0, output_field=FloatField()))
@@ -1,9 +1,105 @@
 from rest_framework import serializers
-from .models import Node
+from .models import Change, FileRevision, Job, Node
+from . import storage
+from . utils import invalid_name
 
 class NodeSerializer(serializers.ModelSerializer):
+    # BODY IS READ FROM THE BLOB STORE,
+    # VIEWS WRITE IT THROUGH storage
+    content = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Node
+        fields = [ "id", "name", "node_type", "parent", "size", "file_count", "dir_count", "permissions", "created_at", 
+                  "modified_at", "is_trashed", "trashed_at", "content_hash", "full_path", "content" ]
+        read_only_fields = ["id", "size", "file_count", "dir_count", "created_at", "modified_at", "trashed_at", "content_hash", "full_path"]
+        # NAME UNIQUENESS IS CHECKED BY THE VIEWS AND ENFORCED BY THE DB CONSTRAINTS,
+        # DRF'S GENERATED VALIDATOR CAN'T HANDLE PARTIAL UPDATES OF THEM
+        validators = []
+
+    # NAMES ARE ONE SEGMENT OF THE FULL PATH
+    def validate_name(self, name):
+        if message := invalid_name(name):
+            raise serializers.ValidationError(message)
+        return name
+
+    # ASYNC VIEWS READ THE BODY THEMSELVES AND PASS IT IN
+    def get_content(self, node):
+        if "content" in self.context:
+            return self.context["content"]
+        return storage.read_content(node)
+
+
+class NodeListSerializer(serializers.ModelSerializer):
+    """
+        Lightweight representation used by listings.
+        Never touches file content, so a queryset narrowed
+        with .only(*fields) is serialized without extra queries.
+    """
     class Meta:
         model = Node
-        fields = [ "id", "name", "node_type", "parent", "size", "permissions", "created_at", 
-                  "modified_at", "is_trashed", "trashed_at", "content" ]
-        read_only_fields = ["id", "size", "created_at", "modified_at", "trashed_at"]
\ No newline at end of file
+        fields = [ "id", "name", "node_type", "parent", "size", "file_count", "dir_count", "permissions", "created_at",
+                  "modified_at", "is_trashed", "trashed_at" ]
+        read_only_fields = fields
+
+
+class TreeNodeSerializer(NodeListSerializer):
+    """
+        Directory of the lazy tree, `children` being
+        None for the levels that weren't loaded.
+    """
+    has_children = serializers.BooleanField(read_only=True)
+    children = serializers.SerializerMethodField()
+
+    class Meta(NodeListSerializer.Meta):
+        fields = [ *NodeListSerializer.Meta.fields, "has_children", "children" ]
+        read_only_fields = fields
+
+    def get_children(self, node):
+        if node.subdirs is None:
+            return None
+        return TreeNodeSerializer(node.subdirs, many=True).data
+
+
+class AncestorSerializer(serializers.ModelSerializer):
+    """
+        One step of a breadcrumb, from the root
+        down to the node it was asked for.
+    """
+    class Meta:
+        model = Node
+        fields = [ "id", "name", "node_type", "parent", "permissions" ]
+        read_only_fields = fields
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+        State and progress of a background job.
+    """
+    class Meta:
+        model = Job
+        fields = [ "id", "kind", "node_id", "state", "total", "done", "result", "error",
+                  "created_at", "started_at", "finished_at" ]
+        read_only_fields = fields
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """
+        Entry of the change log, `seq` being the cursor.
+    """
+    class Meta:
+        model = Change
+        fields = [ "id", "seq", "kind", "node_id", "node_type", "parent_id", "path", "old_path", "subtree", "created_at" ]
+        read_only_fields = fields
+
+
+class FileRevisionSerializer(serializers.ModelSerializer):
+    """
+        One entry of a file's history, without the body.
+    """
+    is_snapshot = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = FileRevision
+        fields = [ "number", "content_hash", "size", "stored_size", "is_snapshot", "created_at" ]
+        read_only_fields = fields
@@ -0,0 +1,250 @@
+"""
+Storage of file bodies.
+
+Bodies live in the Blob table, apart from the Node rows, so that
+listings, permission checks and moves never read them. Each body
+is split into CHUNK_SIZE BlobChunk rows: writers hash and store
+chunks as they arrive and readers fetch only the chunks covering
+the requested range, so memory per request stays bounded.
+Content is stored UTF-8 encoded and `size` is its length in bytes.
+
+Chunks are compressed on the way in, zlib by default and lzma for
+chunks of at least STORAGE_LZMA_MIN_BYTES, chunks shorter than
+STORAGE_COMPRESS_MIN_BYTES or that don't shrink are kept raw.
+Readers decompress chunk by chunk, offsets stay logical.
+
+Blobs are deduplicated by sha256 digest and reference counted.
+Every function handing out a blob hands out one reference owned
+by the caller, which goes back through `release` once no node
+points at the blob anymore. Sharing a body between nodes (copies,
+restores) is then a matter of `acquire`, never of copying bytes.
+"""
+import hashlib
+import lzma
+import zlib
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from . models import Blob, BlobChunk, Node
+
+CHUNK_SIZE = 256 * 1024
+
+# chunks fetched per query while streaming
+CHUNKS_PER_FETCH = 4
+
+Codecs = BlobChunk.Codecs
+
+
+# (codec, stored bytes) for a chunk, raw
+# when compression wouldn't pay off
+def encode(data):
+    if not settings.STORAGE_COMPRESSION or len(data) < settings.STORAGE_COMPRESS_MIN_BYTES:
+        return Codecs.RAW, data
+    if settings.STORAGE_LZMA_MIN_BYTES and len(data) >= settings.STORAGE_LZMA_MIN_BYTES:
+        codec, packed = Codecs.LZMA, lzma.compress(data)
+    else:
+        codec, packed = Codecs.ZLIB, zlib.compress(data)
+    return (codec, packed) if len(packed) < len(data) else (Codecs.RAW, data)
+
+
+def decode(codec, data):
+    if codec == Codecs.ZLIB:
+        return zlib.decompress(data)
+    if codec == Codecs.LZMA:
+        return lzma.decompress(data)
+    return bytes(data)
+
+
+class BlobWriter:
+    """
+        Incremental blob writer, size and digest are
+        computed on the fly while chunks are flushed.
+        When the digest turns out to be known already
+        the chunks just written are dropped and the
+        existing blob is returned instead.
+    """
+
+    def __init__(self):
+        self.blob = Blob.objects.create(digest=None, size=0)
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.stored_size = 0
+        self.seq = 0
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        self.buffer += data
+        while len(self.buffer) >= CHUNK_SIZE:
+            self._flush(bytes(self.buffer[:CHUNK_SIZE]))
+            del self.buffer[:CHUNK_SIZE]
+
+    def close(self):
+        if self.buffer:
+            self._flush(bytes(self.buffer))
+            self.buffer = bytearray()
+        digest = self.hash.hexdigest()
+        existing = Blob.objects.filter(digest=digest).first()
+        if existing is None:
+            self.blob.digest = digest
+            self.blob.size = self.size
+            self.blob.stored_size = self.stored_size
+            try:
+                with transaction.atomic():
+                    self.blob.save(update_fields=["digest", "size", "stored_size"])
+                acquire([self.blob.id])
+                self.blob.refcount += 1
+                return self.blob
+            except IntegrityError:
+                # SAME BODY COMMITTED BY A CONCURRENT WRITER
+                existing = Blob.objects.get(digest=digest)
+
+        self.blob.delete()
+        acquire([existing.id])
+        existing.refcount += 1
+        return existing
+
+    def _flush(self, data):
+        codec, stored = encode(data)
+        BlobChunk.objects.create(blob=self.blob, seq=self.seq, codec=codec, data=stored)
+        self.stored_size += len(stored)
+        self.seq += 1
+
+
+# stores the stream of byte
+# strings as a new blob
+def write_stream(parts):
+    writer = BlobWriter()
+    for data in parts:
+        writer.write(data)
+    return writer.close()
+
+
+# stores the text, reusing the blob of
+# an identical body when there is one
+def write_content(text):
+    data = (text or "").encode("utf-8")
+    existing = Blob.objects.filter(digest=hashlib.sha256(data).hexdigest()).first()
+    if existing is None:
+        return write_stream([data])
+    acquire([existing.id])
+    existing.refcount += 1
+    return existing
+
+
+# querysets of the (seq, codec, data) chunks
+# covering [start, end), a few chunks each
+def _batches(blob_id, start, end):
+    first, last = start // CHUNK_SIZE, (end - 1) // CHUNK_SIZE
+    for batch_start in range(first, last + 1, CHUNKS_PER_FETCH):
+        batch_end = min(last, batch_start + CHUNKS_PER_FETCH - 1)
+        yield (
+            BlobChunk.objects.filter(blob_id=blob_id, seq__gte=batch_start, seq__lte=batch_end)
+            .order_by("seq")
+            .values_list("seq", "codec", "data")
+        )
+
+
+def _slice(seq, codec, data, start, end):
+    offset = seq * CHUNK_SIZE
+    return decode(codec, data)[max(0, start - offset):end - offset]
+
+
+# yields the bytes of the blob in [start, end),
+# a few chunks at a time
+def iter_blob(blob_id, start=0, end=None):
+    if end is None:
+        end = Blob.objects.values_list("size", flat=True).get(id=blob_id)
+    if start >= end:
+        return
+
+    for chunks in _batches(blob_id, start, end):
+        for seq, codec, data in chunks:
+            yield _slice(seq, codec, data, start, end)
+
+
+# body of a file as text,
+# directories have none
+def read_content(node, limit=None):
+    if node.node_type != Node.NodeTypes.FILE:
+        return None
+    if node.blob_id is None:
+        return ""
+    end = node.size if limit is None else min(node.size, limit)
+    return b"".join(iter_blob(node.blob_id, 0, end)).decode("utf-8", errors="replace")
+
+
+# same through the async ORM, for the ASGI read views
+async def aread_content(node, limit=None):
+    if node.node_type != Node.NodeTypes.FILE:
+        return None
+    if node.blob_id is None:
+        return ""
+    end = node.size if limit is None else min(node.size, limit)
+    parts = []
+    for chunks in _batches(node.blob_id, 0, end):
+        parts += [_slice(seq, codec, data, 0, end) async for seq, codec, data in chunks]
+    return b"".join(parts).decode("utf-8", errors="replace")
+
+
+# one query per distinct count, so a
+# whole subtree costs a handful of updates
+def _adjust(blob_ids, sign):
+    by_count = defaultdict(list)
+    for blob_id, count in Counter(b for b in blob_ids if b is not None).items():
+        by_count[count].append(blob_id)
+    for count, ids in by_count.items():
+        for start in range(0, len(ids), 500):
+            Blob.objects.filter(id__in=ids[start:start + 500]).update(refcount=F("refcount") + sign * count)
+    return [blob_id for ids in by_count.values() for blob_id in ids]
+
+
+# takes one reference per occurrence of the id,
+# for nodes starting to share an existing body
+def acquire(blob_ids):
+    _adjust(blob_ids, 1)
+
+
+# drops one reference per occurrence of the id
+# and frees the blobs nobody references anymore
+def release(blob_ids):
+    touched = _adjust(blob_ids, -1)
+    for start in range(0, len(touched), 500):
+        Blob.objects.filter(id__in=touched[start:start + 500], refcount=0).delete()
+
+
+# resets every refcount to the number of nodes and revisions
+# actually pointing at the blob, returns how many had drifted
+def recount():
+    actual = Count("nodes", distinct=True) + Count("revisions", distinct=True)
+    drifted = Blob.objects.annotate(actual=actual).exclude(refcount=F("actual")).values_list("id", "actual")
+    fixed = [Blob(id=blob_id, refcount=actual) for blob_id, actual in drifted]
+    Blob.objects.bulk_update(fixed, ["refcount"], batch_size=500)
+    return len(fixed)
+
+
+# logical vs stored bytes: what files hold, what their
+# distinct bodies hold and what the chunks of those take
+def stats():
+    files = Node.objects.filter(node_type=Node.NodeTypes.FILE).aggregate(count=Count("id"), bytes=Sum("size"))
+    blobs = Blob.objects.aggregate(count=Count("id"), bytes=Sum("size"), stored=Sum("stored_size"))
+    chunks = dict(BlobChunk.objects.order_by().values_list("codec").annotate(n=Count("id")))
+    logical, unique, stored = files["bytes"] or 0, blobs["bytes"] or 0, blobs["stored"] or 0
+    return {
+        "files": files["count"],
+        "blobs": blobs["count"],
+        "logical_bytes": logical,
+        "unique_bytes": unique,
+        "stored_bytes": stored,
+        "dedup_ratio": round(logical / unique, 2) if unique else None,
+        "compression_ratio": round(unique / stored, 2) if stored else None,
+        "chunks": {codec.label: chunks.get(codec.value, 0) for codec in Codecs},
+    }
+
+
+# blobs no node or revision points at, left
+# behind by drifted counts or interrupted writes
+def orphans():
+    return Blob.objects.filter(nodes__isnull=True, revisions__isnull=True)
@@ -1,3 +1,981 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from . models import Blob, BlobChunk, Change, Job, Node
+from . import async_views, jobs, purging, search, storage
+from . utils import keyset_paginate
 
-# Create your tests here.
+
+class ListingQueryCountTests(APITestCase):
+    """
+        Listings must cost the same number of queries
+        no matter how many rows they return.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def make_children(self, parent, count, start=0):
+        for i in range(start, start + count):
+            Node.objects.create(name=f"dir-{i}", node_type=Node.NodeTypes.DIRECTORY, parent=parent)
+            Node.objects.create(name=f"file-{i}.txt", node_type=Node.NodeTypes.FILE, parent=parent, size=100)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries), res.json()["data"]
+
+    def test_directory_listing(self):
+        small = Node.objects.create(name="small", node_type=Node.NodeTypes.DIRECTORY)
+        big = Node.objects.create(name="big", node_type=Node.NodeTypes.DIRECTORY)
+        self.make_children(small, 2)
+        self.make_children(big, 25)
+
+        small_queries, small_data = self.count_queries(f"/api/dirs/?parent_id={small.id}")
+        big_queries, big_data = self.count_queries(f"/api/dirs/?parent_id={big.id}")
+
+        self.assertEqual(len(big_data), 50)
+        self.assertEqual(small_queries, big_queries)
+        self.assertTrue(all("content" not in row for row in big_data))
+
+    def test_trash_search_and_all_directories(self):
+        root = Node.objects.create(name="root", node_type=Node.NodeTypes.DIRECTORY)
+        self.make_children(root, 2)
+        urls = ["/api/trash/", "/api/search/?q=file", "/api/all-directories/", "/api/tree/?depth=3"]
+        before = [self.count_queries(url)[0] for url in urls]
+
+        self.make_children(root, 25, start=2)
+        Node.objects.filter(name__startswith="file-1").update(is_trashed=True)
+        after = [self.count_queries(url)[0] for url in urls]
+
+        self.assertEqual(before, after)
+
+    def test_tree(self):
+        root = Node.objects.create(name="root", node_type=Node.NodeTypes.DIRECTORY)
+        self.make_children(root, 3)
+        Node.objects.create(name="inner", node_type=Node.NodeTypes.DIRECTORY, parent=Node.objects.get(name="dir-1"))
+
+        _, data = self.count_queries("/api/tree/?depth=2")
+        self.assertEqual([d["name"] for d in data[0]["children"]], ["dir-0", "dir-1", "dir-2"])
+        self.assertEqual([d["has_children"] for d in data[0]["children"]], [False, True, False])
+        self.assertIsNone(data[0]["children"][1]["children"])
+
+        _, data = self.count_queries(f"/api/tree/?parent_id={root.id}&prefix=DIR-1")
+        self.assertEqual([d["name"] for d in data], ["dir-1"])
+
+    def test_ancestors(self):
+        parent = Node.objects.create(name="d-0", node_type=Node.NodeTypes.DIRECTORY)
+        for i in range(1, 12):
+            parent = Node.objects.create(name=f"d-{i}", node_type=Node.NodeTypes.DIRECTORY, parent=parent)
+            shallow = shallow if i > 1 else parent
+        deep = Node.objects.create(name="f.txt", node_type=Node.NodeTypes.FILE, parent=parent)
+
+        shallow_queries, _ = self.count_queries(f"/api/ancestors/{shallow.id}/")
+        deep_queries, crumbs = self.count_queries(f"/api/ancestors/{deep.id}/")
+        self.assertEqual(shallow_queries, deep_queries)
+        self.assertEqual([c["name"] for c in crumbs], [f"d-{i}" for i in range(12)] + ["f.txt"])
+
+        res = self.client.get(f"/api/dirs-detail/{parent.id}/?ancestors=1").json()
+        self.assertEqual([c["name"] for c in res["ancestors"]], [f"d-{i}" for i in range(11)])
+
+
+class KeysetPaginationTests(APITestCase):
+    """
+        Following next_cursor walks every row once, in
+        the requested order, ties broken on the id.
+    """
+
+    def walk(self, url, **params):
+        ids, cursor = [], None
+        while True:
+            res = self.client.get(url, {**params, "limit": 2, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(res.status_code, 200, res.content)
+            ids += [row["id"] for row in res.json()["data"]]
+            if not (cursor := res.json()["next_cursor"]):
+                return ids
+
+    # ids in keyset order: NULLs first ascending, last descending
+    def expected(self, qs, field, descending):
+        rows = sorted(qs.values_list(field, "id"), key=lambda row: (row[0] is not None, 0 if row[0] is None else row[0], row[1]))
+        return [pk for _, pk in (rows[::-1] if descending else rows)]
+
+    def setUp(self):
+        self.parent = Node.objects.create(name="p", node_type=Node.NodeTypes.DIRECTORY)
+        for name, size in (("a", 5), ("b", 5), ("c", 1), ("d", 5), ("e", 1)):
+            Node.objects.create(name=name, node_type=Node.NodeTypes.FILE, parent=self.parent, size=size)
+        for name in ("a", "f"):
+            Node.objects.create(name=name, node_type=Node.NodeTypes.DIRECTORY, parent=self.parent)
+        # SAME MTIME FOR HALF OF THEM
+        tied = Node.objects.filter(parent=self.parent).order_by("id")[:4]
+        Node.objects.filter(id__in=[n.id for n in tied]).update(modified_at=timezone.now())
+
+    def test_listing_every_sort_and_order(self):
+        children = Node.objects.filter(parent=self.parent)
+        for sort, field in (("name", "name"), ("size", "size"), ("mtime", "modified_at"), ("type", "node_type")):
+            for order in ("asc", "desc"):
+                walked = self.walk("/api/dirs/", parent_id=self.parent.id, sort=sort, order=order)
+                self.assertEqual(walked, self.expected(children, field, order == "desc"), (sort, order))
+
+    def test_trash_every_sort_and_order(self):
+        # ONE DELETE GIVES THE WHOLE SUBTREE THE SAME trashed_at
+        self.client.delete(f"/api/dirs/{self.parent.id}/")
+        trashed = Node.objects.filter(is_trashed=True)
+        for sort, field in (("trashed_at", "trashed_at"), ("name", "name"), ("size", "size"), ("type", "node_type")):
+            for order in ("asc", "desc"):
+                walked = self.walk("/api/trash/", sort=sort, order=order)
+                self.assertEqual(walked, self.expected(trashed, field, order == "desc"), (sort, order))
+
+    def test_search_rank_order(self):
+        for i in range(5):
+            self.client.post("/api/files/", {"name": f"report-{i}.txt", "content": "report " * (i % 2 + 1)}, format="json")
+        for direction in ("asc", "desc"):
+            params = {"q": "report", "order": "rank", "direction": direction}
+            whole = [row["id"] for row in self.client.get("/api/search/", {**params, "limit": 500}).json()["data"]]
+            self.assertEqual(len(whole), 5)
+            self.assertEqual(self.walk("/api/search/", **params), whole, direction)
+
+    def test_null_sort_values(self):
+        Node.objects.filter(name__in=["a", "c"], node_type=Node.NodeTypes.FILE).update(is_trashed=True, trashed_at=timezone.now())
+        qs = Node.objects.filter(parent=self.parent)
+        for descending in (False, True):
+            ids, cursor = [], None
+            while True:
+                rows, cursor = keyset_paginate(qs, "trashed_at", descending, cursor, 2)
+                ids += [row.id for row in rows]
+                if not cursor:
+                    break
+            self.assertEqual(ids, self.expected(qs, "trashed_at", descending), descending)
+
+    def test_invalid_cursors(self):
+        def cursor(*values):
+            return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+        name_cursor = self.client.get("/api/dirs/", {"parent_id": self.parent.id, "sort": "name", "limit": 2}).json()["next_cursor"]
+        bad = ["garbage", base64.urlsafe_b64encode(b"not json").decode(), name_cursor, cursor("size", 5, "3"),
+               cursor("size", {"a": 1}, 3), cursor("size", "abc", 3)]
+        for value in bad:
+            res = self.client.get("/api/dirs/", {"parent_id": self.parent.id, "sort": "size", "cursor": value})
+            self.assertEqual(res.status_code, 400, value)
+        self.assertEqual(self.client.get("/api/trash/", {"cursor": cursor("trashed_at", "yesterday", 3)}).status_code, 400)
+        self.assertEqual(self.client.get("/api/search/", {"q": "a", "cursor": cursor("rank", "x", 3)}).status_code, 400)
+
+
+class BulkQueryCountTests(APITestCase):
+    """
+        Bulk operations must cost the same number of
+        queries no matter how many files are selected.
+    """
+
+    def bulk_queries(self, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post("/api/bulk/", payload, format="json")
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(all(row["ok"] for row in res.json()["data"]))
+        return len(ctx.captured_queries)
+
+    def test_move_and_trash(self):
+        src = Node.objects.create(name="src", node_type=Node.NodeTypes.DIRECTORY)
+        dest = Node.objects.create(name="dest", node_type=Node.NodeTypes.DIRECTORY)
+        files = [
+            Node.objects.create(name=f"file-{i}.txt", node_type=Node.NodeTypes.FILE, parent=src, size=10).id
+            for i in range(60)
+        ]
+        Node.objects.recompute_totals(src)
+
+        small = [self.bulk_queries({"op": op, "ids": files[:3], "parent_id": dest.id}) for op in ("move", "trash")]
+        big = [self.bulk_queries({"op": op, "ids": files[3:], "parent_id": dest.id}) for op in ("move", "trash")]
+
+        self.assertEqual(small, big)
+        self.assertFalse(Node.objects.filter(parent=src).exists())
+        self.assertEqual(Node.objects.filter(parent=dest, is_trashed=True).count(), 60)
+
+    def test_nested_selection_follows_its_directory(self):
+        src = Node.objects.create(name="src", node_type=Node.NodeTypes.DIRECTORY)
+        inner = Node.objects.create(name="inner.txt", node_type=Node.NodeTypes.FILE, parent=src)
+        dest = Node.objects.create(name="dest", node_type=Node.NodeTypes.DIRECTORY)
+        Node.objects.create(name="src", node_type=Node.NodeTypes.DIRECTORY, parent=dest)
+
+        res = self.client.post("/api/bulk/", {"op": "move", "ids": [src.id, inner.id], "parent_id": dest.id}, format="json").json()
+        self.assertEqual([row["ok"] for row in res["data"]], [False, False])
+        self.assertEqual(res["data"][1]["message"], res["data"][0]["message"])
+        self.assertEqual(Node.objects.get(id=inner.id).parent_id, src.id)
+
+    def test_directory_delete_checks_the_subtree_in_one_query(self):
+        def denied_delete(count):
+            top = Node.objects.create(name=f"top-{count}", node_type=Node.NodeTypes.DIRECTORY)
+            for i in range(count):
+                Node.objects.create(name=f"file-{i}.txt", node_type=Node.NodeTypes.FILE, parent=top)
+            Node.objects.create(name="locked.txt", node_type=Node.NodeTypes.FILE, parent=top, permissions=Node.Permissions.READ)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.delete(f"/api/dirs/{top.id}/")
+            self.assertEqual((res.status_code, res.json()["items"]), (403, ["locked.txt"]))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(denied_delete(3), denied_delete(60))
+
+
+class RestoreTotalsTests(APITestCase):
+    """
+        A restore adds a subtree to the totals
+        above it exactly once.
+    """
+
+    def test_restore_under_trashed_parent(self):
+        top = self.client.post("/api/dirs/", {"name": "top", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        sub = self.client.post("/api/dirs/", {"name": "sub", "node_type": "DIRECTORY", "parent_id": top["id"]}, format="json").json()["data"]
+        file = self.client.post("/api/files/", {"name": "a.txt", "parent_id": sub["id"], "content": "12345"}, format="json").json()["data"]
+        self.client.delete(f"/api/files/{file['id']}/")
+        self.client.delete(f"/api/dirs/{sub['id']}/")
+
+        self.assertEqual(self.client.post(f"/api/trash/{file['id']}/restore/").status_code, 409)
+        res = self.client.post("/api/bulk/", {"op": "restore", "ids": [file["id"]]}, format="json").json()
+        self.assertFalse(res["data"][0]["ok"])
+
+        self.client.post(f"/api/trash/{sub['id']}/restore/")
+        node = Node.objects.get(id=top["id"])
+        self.assertEqual((node.size, node.file_count, node.dir_count), (5, 1, 1))
+
+
+class PurgeTests(APITestCase):
+    """
+        Purges go deepest first in bounded chunks
+        and leave nothing of the subtree behind.
+    """
+
+    def make(self, name, parent=None, content=None):
+        if content is None:
+            payload = {"name": name, "node_type": "DIRECTORY", "parent_id": parent["id"] if parent else None}
+            return self.client.post("/api/dirs/", payload, format="json").json()["data"]
+        payload = {"name": name, "parent_id": parent["id"] if parent else None, "content": content}
+        return self.client.post("/api/files/", payload, format="json").json()["data"]
+
+    def test_chunks_and_empty_trash(self):
+        old = self.make("old")
+        deep = self.make("deep", old)
+        for name, parent in (("x.txt", deep), ("y.txt", deep), ("z.txt", old)):
+            self.make(name, parent, content=name)
+        kept = self.make("kept")
+        live = self.make("live.txt", kept, content="still here")
+        loose = self.make("loose.txt", content="loose")
+        for url in (f"/api/dirs/{old['id']}/", f"/api/dirs/{kept['id']}/", f"/api/files/{loose['id']}/"):
+            self.client.delete(url)
+
+        subtree = Node.objects.subtree(Node.objects.get(id=old["id"]))
+        self.assertEqual(list(purging.purge(subtree, chunk_size=2)), [2, 4, 5])
+        self.assertFalse(subtree.exists())
+        self.assertEqual(Change.objects.filter(kind=Change.Kinds.PURGE).count(), 5)
+        self.assertEqual(list(Blob.objects.order_by("size").values_list("size", flat=True)), [5, 10])
+
+        # AN ENTRY WITH A LIVE ITEM INSIDE IS SKIPPED, NOT PURGED
+        Node.objects.filter(id=live["id"]).update(is_trashed=False)
+        res = self.client.delete("/api/trash/empty/").json()
+        self.assertEqual((res["purged_count"], res["skipped_count"]), (1, 1))
+        self.assertEqual(set(Node.objects.values_list("id", flat=True)), {kept["id"], live["id"]})
+
+
+class CopyTests(APITestCase):
+    """
+        A copy gets fresh paths, totals, blob
+        references and search rows at every level.
+    """
+
+    def make(self, name, parent=None, content=None):
+        if content is None:
+            payload = {"name": name, "node_type": "DIRECTORY", "parent_id": parent["id"] if parent else None}
+            return self.client.post("/api/dirs/", payload, format="json").json()["data"]
+        payload = {"name": name, "parent_id": parent["id"] if parent else None, "content": content}
+        return self.client.post("/api/files/", payload, format="json").json()["data"]
+
+    def setUp(self):
+        self.src = self.make("src")
+        self.make("a.txt", self.src, content="alpha body")
+        self.sub = self.make("sub", self.src)
+        self.make("b.txt", self.sub, content="beta body")
+        deep = self.make("deep", self.sub)
+        self.make("c.txt", deep, content="gamma body")
+        self.top = self.make("top")
+        self.dest = self.make("dest", self.top)
+
+    def test_multi_level_copy(self):
+        res = self.client.post(f"/api/copy/{self.src['id']}/", {"parent_id": self.dest["id"]}, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.json()["copied_count"], 6)
+
+        # EVERY CLONE SITS UNDER ITS CLONED PARENT WITH ITS OWN PATH
+        copy = Node.objects.get(id=res.json()["data"]["id"])
+        self.assertEqual((copy.parent_id, copy.full_path, copy.depth), (self.dest["id"], "/top/dest/src", 2))
+        clones = Node.objects.subtree(copy).exclude(id=copy.id)
+        self.assertEqual(
+            sorted(clones.values_list("full_path", flat=True)),
+            ["/top/dest/src/a.txt", "/top/dest/src/sub", "/top/dest/src/sub/b.txt", "/top/dest/src/sub/deep", "/top/dest/src/sub/deep/c.txt"],
+        )
+        for node in clones.select_related("parent"):
+            self.assertEqual(node.path, Node.build_path(node.parent, node.id))
+            self.assertEqual(node.depth, node.parent.depth + 1)
+            self.assertEqual(node.path_hash, Node.hash_path(node.full_path))
+
+        # TOTALS ON THE COPY AND EVERY NEW ANCESTOR
+        size = len("alpha body") + len("beta body") + len("gamma body")
+        self.assertEqual((copy.size, copy.file_count, copy.dir_count), (size, 3, 2))
+        for pk, dirs in ((self.dest["id"], 3), (self.top["id"], 4)):
+            node = Node.objects.get(id=pk)
+            self.assertEqual((node.size, node.file_count, node.dir_count), (size, 3, dirs))
+
+        # BODIES ARE SHARED, THE INDEX HAS A ROW FOR EACH CLONE
+        self.assertEqual(storage.recount(), 0)
+        self.assertEqual(Node.objects.get(full_path="/src/a.txt").blob_id, Node.objects.get(full_path="/top/dest/src/a.txt").blob_id)
+        found = {row["id"] for row in self.client.get("/api/search/", {"q": "gamma", "in": "content"}).json()["data"]}
+        self.assertEqual(found, set(Node.objects.filter(name="c.txt").values_list("id", flat=True)))
+        self.assertEqual(len(found), 2)
+
+    def test_copy_names(self):
+        names = [self.client.post(f"/api/copy/{self.src['id']}/", {}, format="json").json()["data"]["name"] for _ in range(3)]
+        self.assertEqual(names, ["src (copy)", "src (copy 2)", "src (copy 3)"])
+
+        file = Node.objects.get(full_path="/src/a.txt")
+        res = self.client.post(f"/api/copy/{file.id}/", {}, format="json").json()
+        self.assertEqual((res["data"]["name"], res["copied_count"]), ("a (copy).txt", 1))
+
+        res = self.client.post(f"/api/copy/{file.id}/", {"name": "a.txt"}, format="json")
+        self.assertEqual(res.status_code, 409)
+
+    def test_refused(self):
+        res = self.client.post(f"/api/copy/{self.src['id']}/", {"parent_id": self.sub["id"]}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+        Node.objects.filter(full_path="/src/sub/b.txt").update(permissions=Node.Permissions.WRITE)
+        res = self.client.post(f"/api/copy/{self.src['id']}/", {}, format="json")
+        self.assertEqual((res.status_code, res.json()["items"]), (403, ["b.txt"]))
+
+        Node.objects.filter(id=self.src["id"]).update(permissions=Node.Permissions.WRITE)
+        res = self.client.post(f"/api/copy/{self.src['id']}/", {}, format="json")
+        self.assertEqual((res.status_code, res.json()["message"]), (403, "Permission denied: READ"))
+        self.assertEqual(Node.objects.count(), 8)
+
+
+class StorageCompressionTests(APITestCase):
+    """
+        Chunks come back byte for byte whatever codec
+        stored them, and are only packed when it pays.
+    """
+
+    def body(self, size, seed=0):
+        rng = random.Random(seed)
+        data = b"".join(f"line {i} {rng.randint(0, 99)}\n".encode() for i in range(size // 8))
+        return data[:size]
+
+    def codecs(self, blob):
+        return set(BlobChunk.objects.filter(blob=blob).values_list("codec", flat=True))
+
+    def test_round_trip_per_codec(self):
+        data = self.body(2 * storage.CHUNK_SIZE + 1000)
+        for lzma_min, codec in ((0, BlobChunk.Codecs.ZLIB), (1, BlobChunk.Codecs.LZMA)):
+            with self.settings(STORAGE_LZMA_MIN_BYTES=lzma_min):
+                blob = storage.write_stream([data[:1000], data[1000:]])
+            self.assertEqual(self.codecs(blob), {codec})
+            self.assertEqual(b"".join(storage.iter_blob(blob.id)), data)
+            self.assertLess(blob.stored_size, blob.size)
+            storage.release([blob.id])
+
+    def test_ranges_across_chunk_boundaries(self):
+        data = self.body(3 * storage.CHUNK_SIZE - 100)
+        blob = storage.write_stream([data])
+        self.assertEqual(self.codecs(blob), {BlobChunk.Codecs.ZLIB})
+        edge = storage.CHUNK_SIZE
+        for start, end in ((edge - 10, edge + 10), (edge - 1, 2 * edge + 1), (0, edge), (edge, len(data)), (len(data) - 5, len(data))):
+            self.assertEqual(b"".join(storage.iter_blob(blob.id, start, end)), data[start:end], (start, end))
+
+    def test_raw_fallback(self):
+        small = storage.write_stream([b"a" * 100])
+        noise = storage.write_stream([random.Random(1).randbytes(4096)])
+        with self.settings(STORAGE_COMPRESSION=False):
+            off = storage.write_stream([self.body(4096, seed=2)])
+        for blob in (small, noise, off):
+            self.assertEqual(self.codecs(blob), {BlobChunk.Codecs.RAW})
+            self.assertEqual(blob.stored_size, blob.size)
+        self.assertEqual(b"".join(storage.iter_blob(noise.id)), random.Random(1).randbytes(4096))
+
+    def test_compress_blobs_command(self):
+        data = self.body(storage.CHUNK_SIZE + 5000)
+        with self.settings(STORAGE_COMPRESSION=False):
+            blob = storage.write_stream([data])
+        self.assertEqual(self.codecs(blob), {BlobChunk.Codecs.RAW})
+
+        call_command("compress_blobs", batch=1, stdout=StringIO())
+        blob.refresh_from_db()
+        stored = sum(len(chunk) for chunk in BlobChunk.objects.filter(blob=blob).values_list("data", flat=True))
+        self.assertEqual(self.codecs(blob), {BlobChunk.Codecs.ZLIB})
+        self.assertEqual((blob.stored_size, blob.size), (stored, len(data)))
+        self.assertEqual(b"".join(storage.iter_blob(blob.id)), data)
+
+
+class BlobRefcountTests(APITestCase):
+    """
+        Identical bodies share one blob, whose refcount
+        always matches the nodes and revisions using it.
+    """
+
+    def assertCounted(self):
+        # recount() RETURNS HOW MANY BLOBS HAD DRIFTED
+        self.assertEqual(storage.recount(), 0)
+
+    def refcount(self, node_id):
+        return Blob.objects.get(nodes__id=node_id).refcount
+
+    @override_settings(REVISIONS_MAX_PER_FILE=2)
+    def test_refcounts_through_the_lifecycle(self):
+        a = self.client.post("/api/files/", {"name": "a.txt", "content": "shared body"}, format="json").json()["data"]
+        b = self.client.post("/api/files/", {"name": "b.txt", "content": "shared body"}, format="json").json()["data"]
+        shared = Blob.objects.get()
+        self.assertEqual(shared.digest, hashlib.sha256(b"shared body").hexdigest())
+        # EACH FILE HOLDS IT ONCE, AND ONCE MORE FOR ITS FIRST REVISION
+        self.assertEqual(self.refcount(a["id"]), 4)
+        self.assertCounted()
+
+        copy = self.client.post(f"/api/copy/{a['id']}/", {}, format="json").json()["data"]
+        self.assertEqual(Node.objects.get(id=copy["id"]).blob_id, shared.id)
+        self.assertEqual(self.refcount(a["id"]), 5)
+        self.assertCounted()
+
+        # EDITS MOVE a TO NEW BODIES, ITS HISTORY KEEPS THE OLD ONES UNTIL PRUNED
+        for k in range(4):
+            self.client.patch(f"/api/files/{a['id']}/", {"content": f"edit {k} " * 200}, format="json")
+            self.assertCounted()
+        self.assertEqual(Node.objects.get(id=a["id"]).revisions.count(), 2)
+        self.assertEqual(Blob.objects.get(id=shared.id).refcount, 3)
+
+        # PURGES GIVE THE REFERENCES BACK, THE LAST ONE FREES THE BLOB
+        for node in (b, copy):
+            self.client.delete(f"/api/files/{node['id']}/")
+            self.client.delete(f"/api/trash/{node['id']}/purge/")
+            self.assertCounted()
+        self.assertFalse(Blob.objects.filter(id=shared.id).exists())
+
+        self.client.delete(f"/api/files/{a['id']}/")
+        self.client.delete(f"/api/trash/{a['id']}/purge/")
+        self.assertFalse(Blob.objects.exists())
+
+    def test_dedup_blobs_repairs_drift(self):
+        file = self.client.post("/api/files/", {"name": "a.txt", "content": "kept"}, format="json").json()["data"]
+        Blob.objects.update(refcount=F("refcount") + 5)
+        orphan = storage.write_stream([b"nobody points here"])
+
+        call_command("dedup_blobs", "--dry-run", stdout=StringIO())
+        self.assertTrue(Blob.objects.filter(id=orphan.id).exists())
+        self.assertEqual(self.refcount(file["id"]), 7)
+
+        call_command("dedup_blobs", stdout=StringIO())
+        self.assertFalse(Blob.objects.filter(id=orphan.id).exists())
+        self.assertCounted()
+        self.assertEqual(self.client.get(f"/api/files/{file['id']}/").json()["data"]["content"], "kept")
+
+
+# the listing cache needs a backend every process shares
+SHARED_CACHE = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": os.path.join(tempfile.gettempdir(), "file-system-tests-cache")}
+
+
+@override_settings(CACHES={"default": SHARED_CACHE}, LISTING_CACHE_TIMEOUT=300)
+class ListingCacheTests(APITestCase):
+    """
+        Cached listings are served without touching
+        the children and never outlive a change.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def listing(self, parent):
+        res = self.client.get(f"/api/dirs/?parent_id={parent.id}")
+        self.assertEqual(res.status_code, 200)
+        return res["X-Cache"], [row["name"] for row in res.json()["data"]]
+
+    def test_hits_and_invalidation(self):
+        root = Node.objects.create(name="root", node_type=Node.NodeTypes.DIRECTORY)
+        sub = self.client.post("/api/dirs/", {"name": "sub", "node_type": "DIRECTORY", "parent_id": root.id}, format="json").json()["data"]
+
+        self.assertEqual(self.listing(root), ("MISS", ["sub"]))
+        self.assertEqual(self.listing(root), ("HIT", ["sub"]))
+
+        # A FILE DEEP DOWN CHANGES THE TOTALS SHOWN ONE LEVEL UP
+        self.client.post("/api/files/", {"name": "a.txt", "parent_id": sub["id"], "content": "abc"}, format="json")
+        res = self.client.get(f"/api/dirs/?parent_id={root.id}")
+        self.assertEqual((res["X-Cache"], res.json()["data"][0]["size"]), ("MISS", 3))
+
+        self.client.patch(f"/api/dirs/{sub['id']}/", {"name": "renamed"}, format="json")
+        self.assertEqual(self.listing(root), ("MISS", ["renamed"]))
+        self.client.delete(f"/api/dirs/{sub['id']}/")
+        self.assertEqual(self.listing(root), ("MISS", []))
+        self.client.post(f"/api/trash/{sub['id']}/restore/")
+        self.assertEqual(self.listing(root), ("MISS", ["renamed"]))
+
+        stats = self.client.get("/api/dirs/cache/").json()["data"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 5))
+
+    def test_invalidated_from_another_process(self):
+        root = Node.objects.create(name="root", node_type=Node.NodeTypes.DIRECTORY)
+        self.assertEqual(self.listing(root), ("MISS", []))
+        self.assertEqual(self.listing(root), ("HIT", []))
+
+        # WHAT THE `run_jobs` WORKER DOES AFTER A JOB
+        script = f"import django; django.setup(); from system import listings; listings.invalidate([{root.id}])"
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "core.settings", "CACHE_BACKEND": SHARED_CACHE["BACKEND"], "CACHE_LOCATION": SHARED_CACHE["LOCATION"]}
+        subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, check=True)
+        self.assertEqual(self.listing(root), ("MISS", []))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_off_on_a_per_process_cache(self):
+        root = Node.objects.create(name="root", node_type=Node.NodeTypes.DIRECTORY)
+        self.assertEqual(self.listing(root), ("MISS", []))
+        self.assertEqual(self.listing(root), ("MISS", []))
+
+
+class FileContentTests(APITestCase):
+    """
+        Raw bodies stream out whole or as one byte
+        range, and stream in whatever their size.
+    """
+
+    def fetch(self, file, header):
+        res = self.client.get(f"/api/files/{file['id']}/content/", headers={"Range": header})
+        body = b"".join(res.streaming_content) if res.streaming else res.content
+        return res.status_code, body, res.get("Content-Range")
+
+    def test_byte_ranges(self):
+        text = "".join(f"{i:03d}" for i in range(100))
+        body = text.encode()
+        file = self.client.post("/api/files/", {"name": "digits.txt", "content": text}, format="json").json()["data"]
+
+        self.assertEqual(self.fetch(file, "bytes=10-19"), (206, body[10:20], "bytes 10-19/300"))
+        self.assertEqual(self.fetch(file, "bytes=-50"), (206, body[-50:], "bytes 250-299/300"))
+        self.assertEqual(self.fetch(file, "bytes=290-"), (206, body[290:], "bytes 290-299/300"))
+        self.assertEqual(self.fetch(file, "bytes=250-1000"), (206, body[250:], "bytes 250-299/300"))
+        self.assertEqual(self.fetch(file, "bytes=300-"), (416, b"", "bytes */300"))
+        self.assertEqual(self.fetch(file, "bytes=0-1,5-6"), (200, body, None))
+        self.assertEqual(self.client.get(f"/api/files/{file['id']}/content/", headers={"Range": "bytes=10-19"})["Content-Length"], "10")
+
+        empty = self.client.post("/api/files/", {"name": "empty.txt", "content": ""}, format="json").json()["data"]
+        self.assertEqual(self.fetch(empty, "bytes=0-"), (416, b"", "bytes */0"))
+
+    def test_streaming_upload(self):
+        top = self.client.post("/api/dirs/", {"name": "top", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        sub = self.client.post("/api/dirs/", {"name": "sub", "node_type": "DIRECTORY", "parent_id": top["id"]}, format="json").json()["data"]
+        file = self.client.post("/api/files/", {"name": "a.bin", "content": "abc", "parent_id": sub["id"]}, format="json").json()["data"]
+
+        data = random.Random(0).randbytes(2 * storage.CHUNK_SIZE + 123)
+        res = self.client.put(f"/api/files/{file['id']}/content/", data, content_type="application/octet-stream")
+        self.assertEqual((res.status_code, res.json()["data"]["size"]), (200, len(data)))
+
+        node = Node.objects.get(id=file["id"])
+        self.assertEqual(BlobChunk.objects.filter(blob_id=node.blob_id).count(), 3)
+        self.assertEqual(self.fetch(file, "bytes=0-")[1], data)
+        for pk in (top["id"], sub["id"]):
+            self.assertEqual(Node.objects.get(id=pk).size, len(data))
+
+
+class ConditionalRequestTests(APITestCase):
+    """
+        ETags let clients revalidate without a body
+        and refuse edits based on a stale copy.
+    """
+
+    def test_file_etag(self):
+        file = self.client.post("/api/files/", {"name": "a.txt", "content": "hello"}, format="json").json()["data"]
+        url = f"/api/files/{file['id']}/"
+        etag = self.client.get(url)["ETag"]
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        res = self.client.patch(url, {"name": "b.txt"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.patch(url, {"name": "c.txt"}, format="json", HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url)["ETag"], res["ETag"])
+
+
+class PartialEditTests(APITestCase):
+    """
+        Range edits and unified diffs apply to
+        the base body they were made against.
+    """
+
+    def test_edits_and_diff(self):
+        file = self.client.post("/api/files/", {"name": "a.txt", "content": "one\ntwo\nthree\n"}, format="json").json()["data"]
+        url = f"/api/files/{file['id']}/"
+        base = self.client.get(url).json()["data"]["content_hash"]
+
+        res = self.client.patch(url, {"edits": [{"start": 4, "end": 7, "text": "TWO"}], "base": base}, format="json")
+        self.assertEqual((res.json()["data"]["content"], res.json()["data"]["size"]), ("one\nTWO\nthree\n", 14))
+
+        # THE OLD BASE IS GONE
+        stale = self.client.patch(url, {"edits": [{"start": 0, "end": 0, "text": "x"}], "base": base}, format="json")
+        self.assertEqual(stale.status_code, 409)
+
+        diff = "--- a\n+++ b\n@@ -2,2 +2,2 @@\n TWO\n-three\n+3\n"
+        res = self.client.patch(url, {"diff": diff, "base": res.json()["data"]["content_hash"]}, format="json")
+        self.assertEqual(res.json()["data"]["content"], "one\nTWO\n3\n")
+
+
+class FileRevisionTests(APITestCase):
+    """
+        Every body a file had can be read back
+        and restored from its history.
+    """
+
+    def test_history_and_revert(self):
+        bodies = ["".join(f"line {i}\n" for i in range(500))]
+        file = self.client.post("/api/files/", {"name": "a.txt", "content": bodies[0]}, format="json").json()["data"]
+        url = f"/api/files/{file['id']}/"
+        for k in range(3):
+            bodies.append(bodies[-1].replace(f"line {k}\n", f"LINE {k}\n"))
+            self.client.patch(url, {"content": bodies[-1]}, format="json")
+
+        history = self.client.get(url + "revisions/").json()["data"]
+        self.assertEqual([(r["number"], r["is_snapshot"]) for r in history], [(4, False), (3, False), (2, False), (1, True)])
+        for number, body in enumerate(bodies, start=1):
+            res = self.client.get(url + f"revisions/{number}/")
+            self.assertEqual(b"".join(res.streaming_content).decode(), body)
+            self.assertEqual(res["Content-Length"], str(len(body)))
+
+        # ONLY THE revert/ URL WRITES
+        self.assertEqual(self.client.post(url + "revisions/2/").status_code, 405)
+        self.assertEqual(self.client.get(url + "revisions/2/revert/").status_code, 405)
+        self.assertEqual(self.client.post(url + "revisions/2/revert/").status_code, 200)
+        self.assertEqual(self.client.get(url).json()["data"]["content"], bodies[1])
+        self.assertEqual(self.client.get(url + "revisions/").json()["data"][0]["number"], 5)
+
+
+class PathLengthTests(APITestCase):
+    """
+        Nothing is created or moved where its
+        materialized path wouldn't fit the column.
+    """
+
+    def make(self, name, parent=None, content=None):
+        if content is None:
+            payload = {"name": name, "node_type": "DIRECTORY", "parent_id": parent["id"] if parent else None}
+            return self.client.post("/api/dirs/", payload, format="json")
+        payload = {"name": name, "parent_id": parent["id"] if parent else None, "content": content}
+        return self.client.post("/api/files/", payload, format="json")
+
+    def test_refused_past_the_limit(self):
+        a = self.make("a").json()["data"]
+        b = self.make("b", a).json()["data"]
+        c = self.make("c", b).json()["data"]
+        other = self.make("inner", self.make("other").json()["data"]).json()["data"]
+        loose = self.make("loose.txt", content="x").json()["data"]
+        before = {node.id: node.path for node in Node.objects.all()}
+
+        # THE DEEPEST PATH NOW SITS RIGHT AT THE LIMIT
+        with mock.patch.object(Node, "PATH_MAX_LENGTH", len(Node.objects.get(id=c["id"]).path)):
+            responses = [
+                self.make("d", c),
+                self.make("d.txt", c, content="x"),
+                self.client.patch(f"/api/dirs/{b['id']}/", {"parent_id": other["id"]}, format="json"),
+                self.client.patch(f"/api/files/{loose['id']}/", {"parent_id": c["id"]}, format="json"),
+                self.client.post("/api/bulk/", {"op": "move", "ids": [b["id"]], "parent_id": other["id"]}, format="json"),
+                self.client.post(f"/api/copy/{loose['id']}/", {"parent_id": c["id"]}, format="json"),
+            ]
+            self.assertEqual([res.status_code for res in responses], [400] * 6)
+            self.assertEqual({node.id: node.path for node in Node.objects.all()}, before)
+
+            # MOVES THAT DON'T GROW THE PATHS STILL GO THROUGH
+            res = self.client.patch(f"/api/dirs/{c['id']}/", {"parent_id": a["id"]}, format="json")
+            self.assertEqual(res.status_code, 200)
+
+
+class PathAddressingTests(APITestCase):
+    """
+        Full paths follow renames and moves of
+        everything above the node.
+    """
+
+    def resolve(self, path, **params):
+        return self.client.get("/api/resolve/", {"path": path, **params})
+
+    def test_resolve_rename_move_copy(self):
+        projects = self.client.post("/api/dirs/", {"name": "projects", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        acme = self.client.post("/api/dirs/", {"name": "acme", "node_type": "DIRECTORY", "parent_id": projects["id"]}, format="json").json()["data"]
+        file = self.client.post("/api/files/", {"path": "/projects/acme/config.yaml", "content": "a: 1"}, format="json").json()["data"]
+        self.assertEqual(file["full_path"], "/projects/acme/config.yaml")
+
+        self.assertEqual(self.resolve("projects//acme/config.yaml/").json()["data"]["id"], file["id"])
+        self.assertEqual(b"".join(self.client.get("/api/files/content/", {"path": "/projects/acme/config.yaml"}).streaming_content), b"a: 1")
+
+        # RENAME AND MOVE OF ANCESTORS
+        self.client.patch(f"/api/dirs/{projects['id']}/", {"name": "work"}, format="json")
+        self.assertEqual(self.resolve("/projects/acme/config.yaml").status_code, 404)
+        self.assertEqual(self.resolve("/work/acme/config.yaml").json()["data"]["id"], file["id"])
+
+        self.client.post("/api/bulk/", {"op": "move", "ids": [acme["id"]], "parent_id": None}, format="json")
+        res = self.client.patch("/api/files/", {"name": "app.yaml"}, format="json", QUERY_STRING="path=/acme/config.yaml")
+        self.assertEqual(res.json()["data"]["full_path"], "/acme/app.yaml")
+
+        self.client.post(f"/api/copy/{acme['id']}/", {"name": "acme-2"}, format="json")
+        self.assertEqual(self.resolve("/acme-2/app.yaml").status_code, 200)
+
+        # A DIRECTORY OF THE SAME NAME
+        self.client.post("/api/dirs/", {"name": "app.yaml", "node_type": "DIRECTORY", "parent_id": acme["id"]}, format="json")
+        self.assertEqual(self.resolve("/acme/app.yaml").status_code, 409)
+        self.assertEqual(self.resolve("/acme/app.yaml", type="file").json()["data"]["id"], file["id"])
+
+        # NAMES ARE ONE PATH SEGMENT, A NESTED PATH CAN'T BE FAKED
+        res = self.client.post("/api/files/", {"name": "acme/app.yaml", "content": "x"}, format="json")
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(self.client.patch(f"/api/files/{file['id']}/", {"name": ".."}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(f"/api/copy/{acme['id']}/", {"name": "a/b"}, format="json").status_code, 400)
+
+        # ONES TAKEN BEFORE ARE REPORTED, NOT A SERVER ERROR
+        Node.objects.create(name="acme/app.yaml", node_type=Node.NodeTypes.FILE)
+        self.assertEqual(self.client.get("/api/files/", {"path": "/acme/app.yaml"}).status_code, 409)
+        self.assertEqual(self.resolve("/acme/app.yaml", type="file").status_code, 409)
+
+
+class LiveNameTests(APITestCase):
+    """
+        The database itself refuses a second live node
+        of the same name and type in a directory.
+    """
+
+    def test_unique_live_name(self):
+        docs = Node.objects.create(name="docs", node_type=Node.NodeTypes.DIRECTORY)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Node.objects.create(name="docs", node_type=Node.NodeTypes.DIRECTORY)
+        Node.objects.create(name="docs", node_type=Node.NodeTypes.FILE)
+
+        first = Node.objects.create(name="a.txt", node_type=Node.NodeTypes.FILE, parent=docs)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Node.objects.create(name="a.txt", node_type=Node.NodeTypes.FILE, parent=docs)
+
+        # A TRASHED ONE FREES ITS NAME
+        Node.objects.filter(id=first.id).update(is_trashed=True, trashed_at=timezone.now())
+        Node.objects.create(name="a.txt", node_type=Node.NodeTypes.FILE, parent=docs)
+        self.assertIsNone(Node.objects.get(id=first.id).live_name)
+
+
+class ChangeFeedTests(APITestCase):
+    """
+        Every write shows up after the client's
+        cursor, and only what it asks for.
+    """
+
+    def changes(self, **params):
+        return self.client.get("/api/changes/", params).json()
+
+    def test_changes_since_cursor(self):
+        start = self.changes()["cursor"]
+        docs = self.client.post("/api/dirs/", {"name": "docs", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        other = self.client.post("/api/dirs/", {"name": "other", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        file = self.client.post("/api/files/", {"name": "a.txt", "content": "a", "parent_id": docs["id"]}, format="json").json()["data"]
+        self.client.patch(f"/api/files/{file['id']}/", {"parent_id": other["id"]}, format="json")
+        self.client.delete(f"/api/dirs/{other['id']}/")
+        self.client.delete(f"/api/trash/{other['id']}/purge/")
+
+        feed = self.changes(since=start)
+        kinds = [(c["kind"], c["node_id"]) for c in feed["data"]]
+        self.assertEqual(kinds[:5], [("CREATE", docs["id"]), ("CREATE", other["id"]), ("CREATE", file["id"]), ("MOVE", file["id"]), ("TRASH", other["id"])])
+        self.assertEqual(sorted(kinds[5:]), sorted([("PURGE", other["id"]), ("PURGE", file["id"])]))
+        self.assertEqual(self.changes(since=feed["cursor"])["data"], [])
+
+        # ONLY WHAT WAS EVER UNDER docs, THE CURSOR STOPS AT THE LAST ONE RETURNED
+        feed = self.changes(since=start, under=docs["id"], limit=2)
+        self.assertEqual([c["kind"] for c in feed["data"]], ["CREATE", "CREATE"])
+        self.assertTrue(feed["has_more"])
+        feed = self.changes(since=feed["cursor"], under=docs["id"])
+        self.assertEqual([c["kind"] for c in feed["data"]], ["MOVE"])
+        self.assertEqual(feed["cursor"], feed["data"][-1]["seq"])
+        self.assertEqual(self.changes(since=feed["cursor"], under=docs["id"])["cursor"], feed["cursor"])
+
+    def test_lower_id_committed_late(self):
+        start = self.changes()["cursor"]
+        first = self.client.post("/api/dirs/", {"name": "first", "node_type": "DIRECTORY"}, format="json").json()["data"]
+
+        # ITS ID IS PUSHED UP, AS IF A TRANSACTION STILL OPEN HELD THE LOWER ONES
+        held = Change.objects.get(node_id=first["id"]).id
+        Change.objects.filter(id=held).update(id=held + 10)
+        feed = self.changes(since=start)
+        self.assertEqual([c["node_id"] for c in feed["data"]], [first["id"]])
+
+        # THAT TRANSACTION COMMITS A LOWER ID AFTER THE CLIENT READ
+        second = self.client.post("/api/dirs/", {"name": "second", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        Change.objects.filter(node_id=second["id"]).update(id=held + 5)
+        feed = self.changes(since=feed["cursor"])
+        self.assertEqual([c["node_id"] for c in feed["data"]], [second["id"]])
+
+
+
+class SearchIndexTests(APITestCase):
+    """
+        Content search covers the head of a body,
+        cut by UTF-8 bytes on a character boundary.
+    """
+
+    @override_settings(SEARCH_INDEX_MAX_BYTES=64)
+    def test_index_cap_in_bytes(self):
+        body = "alpha " + "é" * 40 + " omega"
+        file = self.client.post("/api/files/", {"name": "big.txt", "content": body}, format="json").json()["data"]
+
+        def found(q):
+            return [row["id"] for row in self.client.get("/api/search/", {"q": q, "in": "content"}).json()["data"]]
+
+        self.assertEqual((found("alpha"), found("omega")), ([file["id"]], []))
+        self.assertEqual(search.indexed_text(body), "alpha " + "é" * 29)
+        self.assertEqual(search.indexed_text("é" * 40).encode("utf-8"), "é".encode("utf-8") * 32)
+
+
+class AsyncReadTests(APITestCase):
+    """
+        The ASGI read views answer like the DRF
+        views they stand in for.
+    """
+
+    @override_settings(LISTING_CACHE_TIMEOUT=0)
+    def test_same_payloads(self):
+        docs = self.client.post("/api/dirs/", {"name": "docs", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        file = self.client.post("/api/files/", {"name": "notes.txt", "parent_id": docs["id"], "content": "hello async"}, format="json").json()["data"]
+        self.client.post("/api/dirs/", {"name": "locked", "node_type": "DIRECTORY", "permissions": 0}, format="json")
+
+        factory = AsyncRequestFactory()
+        cases = [
+            (async_views.directory_list, "/api/dirs/", {"parent_id": docs["id"]}, {}),
+            (async_views.directory_list, "/api/dirs/", {"sort": "size", "limit": 1}, {}),
+            (async_views.directory_detail, f"/api/dirs-detail/{docs['id']}/", {"ancestors": 1}, {"pk": docs["id"]}),
+            (async_views.file_detail, f"/api/files/{file['id']}/", {}, {"pk": file["id"]}),
+            (async_views.file_detail, "/api/files/", {"path": "/docs/notes.txt"}, {}),
+            (async_views.file_detail, "/api/files/0/", {}, {"pk": 0}),
+            (async_views.search_list, "/api/search/", {"q": "notes"}, {}),
+        ]
+        for view, url, params, kwargs in cases:
+            expected = self.client.get(url, params)
+            res = async_to_sync(view)(factory.get(url, params), **kwargs)
+            self.assertEqual((res.status_code, json.loads(res.content)), (expected.status_code, expected.json()), url)
+            self.assertEqual(res.get("ETag"), expected.get("ETag"), url)
+
+        # CONDITIONAL GET AND THE OTHER METHODS, HANDED TO THE DRF VIEW
+        url = f"/api/files/{file['id']}/"
+        etag = self.client.get(url)["ETag"]
+        res = async_to_sync(async_views.file_detail)(factory.get(url, headers={"If-None-Match": etag}), pk=file["id"])
+        self.assertEqual(res.status_code, 304)
+        res = async_to_sync(async_views.file_detail)(factory.patch(url, {"content": "changed"}, content_type="application/json"), pk=file["id"])
+        res.render()
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.client.get(url).json()["data"]["content"], "changed")
+
+
+@override_settings(JOB_WORKERS=0)
+class BackgroundJobTests(APITestCase):
+    """
+        Jobs left to the worker, run here synchronously,
+        end in the same state as the inline operations.
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def run_job(self, res):
+        self.assertEqual(res.status_code, 202)
+        self.assertEqual(jobs.run_pending(), [res.json()["job"]["id"]])
+        return Job.objects.get(id=res.json()["job"]["id"])
+
+    @override_settings(JOB_CHUNK_SIZE=2)
+    def test_trash_and_purge_in_chunks(self):
+        top = self.client.post("/api/dirs/", {"name": "top", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        src = self.client.post("/api/dirs/", {"name": "src", "node_type": "DIRECTORY", "parent_id": top["id"]}, format="json").json()["data"]
+        inner = self.client.post("/api/dirs/", {"name": "inner", "node_type": "DIRECTORY", "parent_id": src["id"]}, format="json").json()["data"]
+        for i, parent in enumerate([src, src, src, inner]):
+            self.client.post("/api/files/", {"name": f"{i}.txt", "parent_id": parent["id"], "content": "abc"}, format="json")
+
+        job = self.run_job(self.client.delete(f"/api/dirs/{src['id']}/?async=1"))
+        self.assertEqual((job.state, job.result, job.done, job.total), (Job.States.DONE, {"trashed_count": 6}, 6, 6))
+        self.assertFalse(Node.objects.subtree(Node.objects.get(id=src["id"])).filter(is_trashed=False).exists())
+        node = Node.objects.get(id=top["id"])
+        self.assertEqual((node.size, node.file_count, node.dir_count), (0, 0, 0))
+
+        job = self.run_job(self.client.delete(f"/api/trash/{src['id']}/purge/?async=1"))
+        self.assertEqual((job.state, job.result, job.done, job.total), (Job.States.DONE, {"purged_count": 6}, 6, 6))
+        self.assertEqual(list(Node.objects.values_list("id", flat=True)), [top["id"]])
+        self.assertFalse(Blob.objects.exists())
+
+    def test_restore_into_new_parent(self):
+        src = self.client.post("/api/dirs/", {"name": "src", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        dest = self.client.post("/api/dirs/", {"name": "dest", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        self.client.post("/api/files/", {"name": "a.txt", "parent_id": src["id"], "content": "12345"}, format="json")
+        self.client.delete(f"/api/dirs/{src['id']}/")
+
+        job = self.run_job(self.client.post(f"/api/trash/{src['id']}/restore/?async=1", {"parent_id": dest["id"]}, format="json"))
+        self.assertEqual((job.state, job.result, job.done, job.total), (Job.States.DONE, {"restored_count": 2}, 2, 2))
+
+        src_node = Node.objects.get(id=src["id"])
+        self.assertEqual(src_node.parent_id, dest["id"])
+        self.assertFalse(Node.objects.subtree(src_node).filter(is_trashed=True).exists())
+        dest_node = Node.objects.get(id=dest["id"])
+        self.assertEqual((dest_node.size, dest_node.file_count, dest_node.dir_count), (5, 1, 1))
+
+    def test_purge_of_restored_item_fails(self):
+        src = self.client.post("/api/dirs/", {"name": "src", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        self.client.post("/api/files/", {"name": "a.txt", "parent_id": src["id"], "content": "12345"}, format="json")
+        self.client.delete(f"/api/dirs/{src['id']}/")
+
+        res = self.client.delete(f"/api/trash/{src['id']}/purge/?async=1")
+        self.client.post(f"/api/trash/{src['id']}/restore/")
+        job = self.run_job(res)
+        self.assertEqual((job.state, job.error), (Job.States.FAILED, "The item is no longer in the trash."))
+        self.assertEqual(Node.objects.filter(is_trashed=False).count(), 2)
+
+    def test_stale_running_job_reclaimed(self):
+        src = self.client.post("/api/dirs/", {"name": "src", "node_type": "DIRECTORY"}, format="json").json()["data"]
+        self.client.post("/api/files/", {"name": "a.txt", "parent_id": src["id"], "content": "12345"}, format="json")
+        self.client.delete(f"/api/dirs/{src['id']}/")
+
+        # A WORKER DIED HALFWAY, ANOTHER ONE IS STILL GOING
+        long_ago = timezone.now() - timedelta(seconds=settings.JOB_STALE_AFTER + 1)
+        stale = Job.objects.create(kind=Job.Kinds.PURGE, node_id=src["id"], state=Job.States.RUNNING, started_at=long_ago, heartbeat_at=long_ago)
+        alive = Job.objects.create(kind=Job.Kinds.PURGE, node_id=src["id"], state=Job.States.RUNNING, started_at=long_ago, heartbeat_at=timezone.now())
+
+        self.assertEqual(jobs.run_pending(), [stale.id])
+        stale.refresh_from_db()
+        self.assertEqual((stale.state, stale.result), (Job.States.DONE, {"purged_count": 2}))
+        self.assertEqual(Job.objects.get(id=alive.id).state, Job.States.RUNNING)
+
+
+@override_settings(JOB_WORKERS=0, TRASH_RETENTION_DAYS=30, TRASH_MAX_BYTES=10, TRASH_SWEEP_INTERVAL=3600)
+class RetentionSweepTests(APITestCase):
+    """
+        The sweep purges expired entries, then the oldest
+        ones until the trash fits, once per interval.
+    """
+
+    def test_sweep_job(self):
+        now = timezone.now()
+        for name, content, age in (("expired.txt", "12345", 40), ("a.txt", "123456", 2), ("b.txt", "abcdef", 1), ("live.txt", "x", None)):
+            file = self.client.post("/api/files/", {"name": name, "content": content}, format="json").json()["data"]
+            if age is not None:
+                Node.objects.filter(id=file["id"]).update(is_trashed=True, trashed_at=now - timedelta(days=age))
+
+        job = jobs.schedule_sweep()
+        self.assertIsNone(jobs.schedule_sweep())
+        self.assertEqual(jobs.run_pending(), [job.id])
+
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.done), (Job.States.DONE, 2))
+        metrics = {k: job.result[k] for k in ("rows", "expired_rows", "capped_rows", "skipped_entries", "bytes")}
+        self.assertEqual(metrics, {"rows": 2, "expired_rows": 1, "capped_rows": 1, "skipped_entries": 0, "bytes": 11})
+        self.assertEqual(set(Node.objects.values_list("name", flat=True)), {"b.txt", "live.txt"})
@@ -0,0 +1,59 @@
+"""
+Lazy directory tree for the destination pickers.
+
+The picker opens one directory at a time: its child directories,
+a page at a time in name order and optionally filtered by a name
+prefix, plus up to `depth` levels below them. Each level is one
+query on the parent index, with `has_children` computed in the
+same query by an EXISTS on the children, so a node that isn't
+expanded still shows whether it can be. Levels below the first
+are loaded only while they fit in MAX_NODES in total; a level
+left out keeps `children` as None and is fetched when opened.
+"""
+from django.db.models import Exists, OuterRef
+from . models import Node
+from . utils import keyset_paginate
+
+MAX_DEPTH = 5
+MAX_NODES = 2000
+
+
+def directories():
+    return Node.objects.readable().filter(is_trashed=False, node_type=Node.NodeTypes.DIRECTORY)
+
+
+# directories annotated with whether they
+# contain any directory the picker would show
+def with_has_children(qs):
+    return qs.annotate(has_children=Exists(directories().filter(parent_id=OuterRef("id"))))
+
+
+# one page of the children of `parent` (None for the root)
+# with `depth` - 1 levels under them, returns (rows, next_cursor);
+# every row gets `subdirs`, the loaded children or None
+def expand(parent, depth=1, prefix=None, cursor=None, limit=100, fields=()):
+    qs = with_has_children(directories().only(*fields))
+    first = qs.filter(parent_id=parent.id) if parent else qs.filter(parent__isnull=True)
+    if prefix:
+        first = first.filter(name__istartswith=prefix)
+    rows, next_cursor = keyset_paginate(first, "name", False, cursor, limit)
+
+    level, budget = rows, MAX_NODES
+    for row in rows:
+        row.subdirs = None
+    for _ in range(min(depth, MAX_DEPTH) - 1):
+        parents = {row.id: row for row in level if row.has_children}
+        if not parents:
+            break
+        below = list(qs.filter(parent_id__in=list(parents)).order_by("name", "id")[:budget + 1])
+        if len(below) > budget:
+            break  # LEVEL TOO BIG, OPENED LAZILY INSTEAD
+
+        for row in level:
+            row.subdirs = []
+        for row in below:
+            row.subdirs = None
+            parents[row.parent_id].subdirs.append(row)
+        level, budget = below, budget - len(below)
+
+    return rows, next_cursor
@@ -1,25 +1,64 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# UNDER ASGI THE HOT READS ARE SERVED BY COROUTINES,
+# THE OTHER METHODS OF THOSE URLS STAY ON THE DRF VIEWS
+if settings.ASGI:
+    from . import async_views
+    directory_list = async_views.directory_list
+    directory_detail = async_views.directory_detail
+    file_detail = async_views.file_detail
+    search_list = async_views.search_list
+else:
+    directory_list = views.DirectoryView.as_view()
+    directory_detail = views.DirectoryDetailView.as_view()
+    file_detail = views.FileView.as_view()
+    search_list = views.SearchView.as_view()
+
 urlpatterns = [
     # DIRECTORIES
-    path("dirs/", views.DirectoryView.as_view()),
+    path("dirs/", directory_list),
     path("dirs/<int:pk>/", views.DirectoryView.as_view()),
+    path("dirs/cache/", views.ListingCacheView.as_view()),
     path("all-directories/", views.AllDirectoriesView.as_view()),
-    path("dirs-detail/<int:pk>/", views.DirectoryDetailView.as_view()),
+    path("tree/", views.TreeView.as_view()),
+    path("dirs-detail/<int:pk>/", directory_detail),
+    path("ancestors/<int:pk>/", views.AncestorsView.as_view()),
+    path("resolve/", views.ResolveView.as_view()),
 
     # FILES
-    path("files/", views.FileView.as_view()),
-    path("files/<int:pk>/", views.FileView.as_view()),
+    path("files/", file_detail),
+    path("files/<int:pk>/", file_detail),
+    path("files/<int:pk>/content/", views.FileContentView.as_view()),
+    path("files/content/", views.FileContentView.as_view()),
+    path("files/<int:pk>/revisions/", views.FileRevisionView.as_view()),
+    path("files/<int:pk>/revisions/<int:number>/", views.FileRevisionView.as_view()),
+    path("files/<int:pk>/revisions/<int:number>/revert/", views.FileRevisionRevertView.as_view()),
 
     # TRASH CAN
     path("trash/", views.TrashView.as_view()),
     path("trash/<int:pk>/restore/", views.TrashView.as_view()),
     path("trash/<int:pk>/purge/", views.TrashView.as_view()),
+    path("trash/empty/", views.EmptyTrashView.as_view()),
 
     # SEARCH
-    path("search/", views.SearchView.as_view()),
+    path("search/", search_list),
 
     # PERMISSIONS
     path("perms/<int:pk>/", views.PermissionsView.as_view()),
+
+    # BULK OPERATIONS
+    path("bulk/", views.BulkView.as_view()),
+    path("copy/<int:pk>/", views.CopyView.as_view()),
+
+    # STORAGE
+    path("storage/", views.StorageStatsView.as_view()),
+
+    # BACKGROUND JOBS
+    path("jobs/<int:pk>/", views.JobView.as_view()),
+
+    # CHANGE FEED
+    path("changes/", views.ChangesView.as_view()),
+    path("changes/stream/", views.change_stream),
 ]
@@ -1,3 +1,10 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from django.core.exceptions import ValidationError
+from django.utils.http import parse_etags, quote_etag
+from django.db.models import F, Q
 from . models import Node
 
 FLAG_MAP = {
@@ -16,4 +23,146 @@ def to_bits(items):
         if name not in FLAG_MAP:
             raise ValueError(f"Unknown permission '{name}'. Use READ, WRITE, DELETE, ADMIN.")
         bits |= FLAG_MAP[name]
-    return bits
\ No newline at end of file
+    return bits
+
+
+"""
+Keyset pagination helpers.
+
+A cursor is an opaque token holding the sort field and the
+(sort value, id) pair of the last row of the previous page.
+The next page filters past that pair instead of using OFFSET,
+so page N costs the same as page 1. NULL sort values are
+ordered first ascending and last descending on every backend.
+"""
+def encode_cursor(field: str, row) -> str:
+    value = getattr(row, field)
+    if isinstance(value, datetime):
+        value = value.isoformat()  # full precision, DjangoJSONEncoder drops microseconds
+    raw = json.dumps([field, value, row.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(field: str, cursor: str):
+    try:
+        cur_field, value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cur_field != field or not isinstance(last_id, int):
+        raise ValueError("Cursor does not match the requested sort")
+    return value, last_id
+
+def keyset_order(qs, field: str, descending: bool, cursor: str | None):
+    op = "lt" if descending else "gt"
+    if cursor:
+        value, last_id = decode_cursor(field, cursor)
+        if value is None:
+            after = Q(**{f"{field}__isnull": True, f"id__{op}": last_id})
+            if not descending:
+                after |= Q(**{f"{field}__isnull": False})
+        else:
+            after = Q(**{f"{field}__{op}": value}) | Q(**{field: value, f"id__{op}": last_id})
+            if descending:
+                after |= Q(**{f"{field}__isnull": True})
+        # A TAMPERED VALUE FAILS THE FIELD'S OWN CONVERSION
+        try:
+            qs = qs.filter(after)
+        except (TypeError, ValueError, ValidationError):
+            raise ValueError("Invalid cursor")
+
+    if descending:
+        ordering = [F(field).desc(nulls_last=True), F("id").desc()]
+    else:
+        ordering = [F(field).asc(nulls_first=True), F("id").asc()]
+    return qs.order_by(*ordering)
+
+def keyset_page(rows, field: str, limit: int):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(field, rows[-1])
+    return rows, next_cursor
+
+def keyset_paginate(qs, field: str, descending: bool, cursor: str | None, limit: int):
+    rows = list(keyset_order(qs, field, descending, cursor)[: limit + 1])
+    return keyset_page(rows, field, limit)
+
+async def akeyset_paginate(qs, field: str, descending: bool, cursor: str | None, limit: int):
+    rows = [row async for row in keyset_order(qs, field, descending, cursor)[: limit + 1]]
+    return keyset_page(rows, field, limit)
+
+def parse_limit(raw, default: int = 100, maximum: int = 500) -> int:
+    try:
+        return max(1, min(int(raw if raw is not None else default), maximum))
+    except ValueError:
+        return default
+
+
+# "/projects//acme/" -> "/projects/acme", the form
+# full paths are stored in, None for the root
+def normalize_path(raw) -> str | None:
+    parts = [part for part in str(raw or "").split("/") if part]
+    return "/" + "/".join(parts) if parts else None
+
+
+# why `name` can't be used for a node, None if it can: a "/"
+# would give it the full path of a node one level deeper
+def invalid_name(name) -> str | None:
+    if str(name or "").strip() in ("", ".", ".."):
+        return 'Name can\'t be empty, "." or "..".'
+    if "/" in str(name):
+        return 'Name can\'t contain "/".'
+    return None
+
+
+"""
+HTTP Range support for a single byte range, like
+"bytes=0-499", "bytes=500-" or the suffix form "bytes=-500".
+Returns the half-open [start, end) slice or None for a header
+that isn't a single byte range (served as a full response).
+"""
+def parse_range(header: str | None, size: int):
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            start, end = max(0, size - int(last)), size
+        else:
+            start = int(first)
+            end = min(size, int(last) + 1) if last else size
+    except ValueError:
+        return None
+    if start >= end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+"""
+Entity tags for conditional requests.
+Node tags hash the columns a response shows, modified_at and
+content_hash included, so they change with any edit, rename,
+move, permission or totals change without reading the body.
+If-None-Match compares weakly (a 304 on match), If-Match
+strongly, "*" matching any existing resource.
+"""
+ETAG_FIELDS = ("id", "name", "node_type", "parent_id", "size", "file_count", "dir_count", "permissions",
+               "created_at", "modified_at", "is_trashed", "trashed_at", "content_hash", "full_path")
+
+def make_etag(*parts) -> str:
+    return quote_etag(hashlib.sha1(repr(parts).encode("utf-8")).hexdigest())
+
+def node_etag(node) -> str:
+    return make_etag(*(getattr(node, field) for field in ETAG_FIELDS))
+
+def not_modified(request, etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" in etags or etag.removeprefix("W/") in {e.removeprefix("W/") for e in etags}
+
+def precondition_failed(request, etag: str) -> bool:
+    header = request.headers.get("If-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" not in etags and etag not in etags
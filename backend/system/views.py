@@ -1,12 +1,101 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from django.shortcuts import get_object_or_404
-from . models import Node
-from . serializers import NodeSerializer
-from . utils import flags_from_bitmask, FLAG_MAP, to_bits
+from . models import Change, Job, Node, PathTooLong
+from . import changes, copying, editing, jobs, listings, purging, revisions, search, storage, tree
+from . serializers import AncestorSerializer, ChangeSerializer, FileRevisionSerializer, JobSerializer, NodeSerializer, NodeListSerializer, TreeNodeSerializer
+from . utils import flags_from_bitmask, FLAG_MAP, to_bits, invalid_name, keyset_paginate, normalize_path, parse_limit, parse_range
+from . utils import make_etag, node_etag, not_modified, precondition_failed
 from django.utils import timezone
-from django.db.models import Q
+from datetime import timedelta
+from django.utils.http import content_disposition_header
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+import mimetypes
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, F, Q, TextField, Value
+from django.db.models.functions import MD5, Cast, Concat
+
+
+# WHITELISTING USER'S INPUT
+# FOR SECURITY REASONS
+LISTING_SORTS = {
+    "name": "name",
+    "size": "size",
+    "mtime": "modified_at",
+    "type": "node_type",
+}
+SEARCH_SORTS = {"rank": "rank", **LISTING_SORTS}
+
+
+# readable live children of a directory (the root for None),
+# only the fields a listing page shows
+def listing_queryset(parent_id):
+    qs = Node.objects.readable().filter(is_trashed=False)
+    if parent_id in (None, ""):
+        qs = qs.filter(parent__isnull=True)
+    else:
+        qs = qs.filter(parent_id=parent_id)
+    return qs.only(*NodeListSerializer.Meta.fields)
+
+
+# readable nodes matching `q` in the full-text index,
+# narrowed like SearchView's params ask
+def search_queryset(q, scope, include_trash=False, node_type=None, parent_id=None):
+    qs = Node.objects.readable()
+    if not include_trash:
+        qs = qs.filter(is_trashed=False)
+    if node_type in (Node.NodeTypes.FILE, Node.NodeTypes.DIRECTORY):
+        qs = qs.filter(node_type=node_type)
+    if parent_id is not None:
+        qs = qs.filter(parent_id=parent_id)
+    return search.search(qs, q, scope).only(*NodeListSerializer.Meta.fields)
+
+
+# breadcrumb above the node, root first, in one query
+def ancestors_of(node):
+    qs = Node.objects.chain(node).only(*AncestorSerializer.Meta.fields)
+    return AncestorSerializer(qs, many=True).data
+
+
+# ?ancestors=1 on a detail view: the breadcrumb, with the
+# etag extended so renames above the node invalidate it
+def with_ancestors(request, node, etag):
+    if request.query_params.get("ancestors") not in ("1", "true", "True"):
+        return None, etag
+    crumbs = ancestors_of(node)
+    return crumbs, make_etag(etag, [(c["id"], c["name"], c["permissions"]) for c in crumbs])
+
+
+class AmbiguousPath(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Several items of this type have this path."
+
+
+# the live node of `node_type` at a full path, 404 without one;
+# names taken before "/" was refused may still make it ambiguous
+def node_at_path(full_path, node_type):
+    matches = list(Node.objects.at_path(full_path).filter(node_type=node_type)[:2])
+    if not matches:
+        raise Http404("No Node matches the given query.")
+    if len(matches) > 1:
+        raise AmbiguousPath()
+    return matches[0]
+
+
+# live file by pk or, without one, by the full
+# path in ?path= through the indexed path hash
+def get_file(request, pk):
+    if pk is not None:
+        return get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+    return node_at_path(normalize_path(request.query_params.get("path")) or "", Node.NodeTypes.FILE)
+
 
 class DirectoryView(APIView):
     """
@@ -21,37 +110,50 @@ class DirectoryView(APIView):
         parent_id = None if parent_id == 'undefined' else parent_id
         sort = request.query_params.get("sort", "name")
         order = request.query_params.get("order", 'desc')
+        cursor = request.query_params.get("cursor")
+        limit = parse_limit(request.query_params.get("limit"))
 
-        # WHITELISTING USER'S INPUT
-        # FOR SECURITY REASONS
-        sort_map = {
-            "name": "name",
-            "size": "size",
-            "mtime": "modified_at",
-            "type": "node_type",
-        }
-        sort_field = sort_map.get(sort, "name")
+        # WHITELISTED SORT
+        sort_field = LISTING_SORTS.get(sort, "name")
 
-        if parent_id not in (None, ""):
+        parent = None
+        if dir_path := normalize_path(request.query_params.get("path")):
+            parent = node_at_path(dir_path, Node.NodeTypes.DIRECTORY)
+            parent_id = parent.id
+        elif parent_id not in (None, ""):
             parent = get_object_or_404(Node, id=parent_id, node_type=Node.NodeTypes.DIRECTORY, is_trashed=False)
-            if not (parent.permissions & Node.Permissions.READ):
-                return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
-        
-        # BUILDING QUERY
-        if order == "desc":
-            sort_field = f"-{sort_field}"
-        qs = Node.objects.filter(is_trashed=False)
-        if parent_id in(None, ""):
-            qs = qs.filter(parent__isnull=True)
-        else:
-            qs = qs.filter(parent_id=parent_id)
+        if parent and not (parent.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
 
-        # OPTIMIZED SMALL PAYLOAD ONLY IMPORTANT FIELDS
-        qs = qs.only("id", "name", "node_type", "parent_id", "size", "permissions", "created_at", "modified_at").order_by(sort_field)
+        # SAME PAGE SERVED FROM THE CACHE WHILE THE DIRECTORY IS UNCHANGED,
+        # A CLIENT ALREADY HOLDING IT GETS A 304 WITHOUT ANY CHILD QUERY
+        cache_params = (sort_field, order == "desc", cursor, limit)
+        page, version = listings.get(parent.id if parent else None, cache_params)
+        etag = listings.etag(parent.id if parent else None, version, cache_params) if version else None
+        if etag and not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        if page is not None:
+            return Response({'ok': True, **page}, status=status.HTTP_200_OK, headers={"X-Cache": "HIT", "ETag": etag})
+        
+        # ONLY READABLE CHILDREN, SMALL PAYLOAD
+        # AND ONE PAGE AFTER THE CURSOR
+        qs = listing_queryset(parent_id)
+        try:
+            rows, next_cursor = keyset_paginate(qs, sort_field, order == "desc", cursor, limit)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # SERIALIZER AND RESPONSE
-        ser = NodeSerializer(qs, many=True)
-        return Response({'ok': True, 'data': ser.data}, status=status.HTTP_200_OK)
+        # SERIALIZER, CACHE AND RESPONSE
+        ser = NodeListSerializer(rows, many=True)
+        page = {'data': ser.data, 'next_cursor': next_cursor}
+        listings.put(parent.id if parent else None, version, cache_params, page)
+
+        # WITHOUT THE CACHE THE TAG COMES FROM THE PAGE ITSELF
+        if etag is None:
+            etag = make_etag(page)
+            if not_modified(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        return Response({'ok': True, **page}, status=status.HTTP_200_OK, headers={"X-Cache": "MISS", "ETag": etag})
     
 
     # endpoint to create
@@ -101,12 +203,20 @@ class DirectoryView(APIView):
             "node_type": Node.NodeTypes.DIRECTORY,
             "parent": (parent.id if parent else None),
             "permissions": permissions,
-            "content": None,
-            "size": 0,
         }
         ser = NodeSerializer(data=payload)
         ser.is_valid(raise_exception=True)
-        ser.save()
+        try:
+            with transaction.atomic():
+                node = ser.save()
+                Node.objects.add_totals(node.ancestor_ids, node.totals)
+                search.index_node(node)
+                listings.touch([node])
+                changes.record(Change.Kinds.CREATE, [node])
+        except IntegrityError:
+            return Response({'message': 'Folder with this name already exists here.'}, status=status.HTTP_400_BAD_REQUEST)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'ok': True, 'data': ser.data}, status=status.HTTP_201_CREATED)
     
 
@@ -132,14 +242,11 @@ class DirectoryView(APIView):
                 return Response({'message': 'Invalid parent'}, status=status.HTTP_404_NOT_FOUND)
             if not (parent.permissions & Node.Permissions.WRITE):
                 return Response({"message": "Permission denied: WRITE on parent."}, status=status.HTTP_403_FORBIDDEN)
-            cur = parent
-            while cur:
-                if cur.id == dir.id:
-                    return Response({'message': 'Cannot move a directory into its own subtree.'}, status=status.HTTP_400_BAD_REQUEST)
-                cur = cur.parent
+            if parent.is_inside(dir):
+                return Response({'message': 'Cannot move a directory into its own subtree.'}, status=status.HTTP_400_BAD_REQUEST)
             
         if name and not parent_id:
-            duplicate = Node.objects.filter(parent_id=(dir.parent.id if dir.parent else None), name=name, node_type=Node.NodeTypes.DIRECTORY, is_trashed=False).exclude(id=dir.id).exists()
+            duplicate = Node.objects.filter(parent_id=dir.parent_id, name=name, node_type=Node.NodeTypes.DIRECTORY, is_trashed=False).exclude(id=dir.id).exists()
             if duplicate:
                 return Response({'message': 'The folder with this name already exists'}, status=status.HTTP_409_CONFLICT)
             
@@ -162,7 +269,22 @@ class DirectoryView(APIView):
 
         ser = NodeSerializer(instance=dir, data=payload, partial=True)
         ser.is_valid(raise_exception=True)
-        ser.save()
+        old_ancestors, old_path = dir.ancestor_ids, dir.path
+        try:
+            with transaction.atomic():
+                ser.save()
+                Node.objects.shift_totals(old_ancestors, dir.totals, dir.ancestor_ids, dir.totals)
+                if name is not None:
+                    search.index_node(dir)
+                listings.invalidate(old_ancestors + dir.ancestor_ids)
+                if dir.path != old_path:
+                    changes.record(Change.Kinds.MOVE, [dir], subtree=True, old_paths={dir.id: old_path})
+                else:
+                    changes.record(Change.Kinds.UPDATE, [dir], subtree=True)
+        except IntegrityError:
+            return Response({'message': 'The folder with this name already exists'}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({'ok': True, 'data': ser.data}, status=status.HTTP_200_OK)
     
 
@@ -180,26 +302,26 @@ class DirectoryView(APIView):
 
         # GATHERING ALL CHILDREN
         # AND ADDITIONAL CHECKS
-        ids = [dir.id]
-        frontier = [dir.id]
-        while frontier:
-            children = list(Node.objects.filter(parent_id__in=frontier, is_trashed=False).values_list("id", flat=True))
-            if not children:
-                break
-            ids.extend(children)
-            frontier = children
-
-        nodes = Node.objects.filter(id__in=ids)
-        unauthorized = [n.name for n in nodes if not (n.permissions & Node.Permissions.DELETE)]
+        subtree = Node.objects.subtree(dir).filter(is_trashed=False)
+        unauthorized = list(subtree.lacking_permissions(Node.Permissions.DELETE).values_list("name", flat=True))
 
         if unauthorized:
             return Response({"message": "Permission denied to delete some items.", "items": unauthorized}, status=status.HTTP_403_FORBIDDEN)
 
+        # BIG TREES CAN BE LEFT TO A BACKGROUND JOB
+        if request.query_params.get("async") in ("1", "true", "True"):
+            job = jobs.submit(Job.Kinds.TRASH, dir)
+            return Response({"ok": True, "job": JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
         # SOFT DELETE ALL AT ONCE AND RESPONSE
         now = timezone.now()
-        Node.objects.filter(id__in=ids).update(is_trashed=True, trashed_at=now)
+        with transaction.atomic():
+            trashed_count = subtree.update(is_trashed=True, trashed_at=now)
+            Node.objects.add_totals(dir.ancestor_ids, dir.totals, sign=-1)
+            listings.touch([dir])
+            changes.record(Change.Kinds.TRASH, [dir], subtree=True)
 
-        return Response({"ok": True, "trashed_count": len(ids)}, status=status.HTTP_200_OK)
+        return Response({"ok": True, "trashed_count": trashed_count}, status=status.HTTP_200_OK)
     
 
 
@@ -210,13 +332,21 @@ class FileView(APIView):
 
     # get specific details
     # about specific file by pk
-    def get(self, request, pk):
-        file = get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+    def get(self, request, pk=None):
+        file = get_file(request, pk)
 
         if not (file.permissions & Node.Permissions.READ):
             return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
 
-        return Response({"ok": True, "data": NodeSerializer(file).data}, status=status.HTTP_200_OK)
+        # UNCHANGED FILE, THE BODY ISN'T EVEN READ
+        crumbs, etag = with_ancestors(request, file, node_etag(file))
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        payload = {"ok": True, "data": NodeSerializer(file).data}
+        if crumbs is not None:
+            payload["ancestors"] = crumbs
+        return Response(payload, status=status.HTTP_200_OK, headers={"ETag": etag})
 
 
     # create a file
@@ -230,6 +360,18 @@ class FileView(APIView):
         content = data.get("content", "")
         permissions = data.get("permissions")
 
+        # A FULL PATH NAMES THE PARENT AND THE FILE AT ONCE
+        if data.get("path") and not name:
+            dir_path, _, name = (normalize_path(data["path"]) or "").rpartition("/")
+            parent_id = None
+            if dir_path:
+                parent_dirs = list(Node.objects.at_path(dir_path).filter(node_type=Node.NodeTypes.DIRECTORY)[:2])
+                if not parent_dirs:
+                    return Response({"message": "Parent not found or trashed"}, status=status.HTTP_404_NOT_FOUND)
+                if len(parent_dirs) > 1:
+                    return Response({"message": AmbiguousPath.default_detail}, status=status.HTTP_409_CONFLICT)
+                parent_id = parent_dirs[0].id
+
         # CHECKS
         if not name:
             return Response({"message": "Name is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -262,31 +404,60 @@ class FileView(APIView):
             "node_type": Node.NodeTypes.FILE,
             "parent": (parent.id if parent else None),
             "permissions": permissions,
-            "content": content or "",
-            "size": len(content or ""),
         }
 
         ser = NodeSerializer(data=payload)
         ser.is_valid(raise_exception=True)
-        ser.save()
+        try:
+            with transaction.atomic():
+                blob = storage.write_content(content)
+                file = ser.save(blob=blob, content_hash=blob.digest, size=blob.size)
+                revisions.record(file)
+                Node.objects.add_totals(file.ancestor_ids, file.totals)
+                search.index_node(file, content)
+                listings.touch([file])
+                changes.record(Change.Kinds.CREATE, [file])
+        except IntegrityError:
+            return Response({"message": "File with this name already exists here."}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"ok": True, "data": ser.data}, status=status.HTTP_201_CREATED)
 
 
     # editing info about
     # file and its location
-    def patch(self, request, pk):
+    def patch(self, request, pk=None):
         # INITIAL DATA GET
         data = request.data
         name = (data.get("name") or "") or None
         parent_id = data.get("parent_id")  # if none than it moves to the root
         content = data.get("content", None)  # optional
+        edits = data.get("edits", None)  # optional, byte ranges replaced
+        diff = data.get("diff", None)  # optional, unified diff
+        base = data.get("base", None)  # content_hash the edits/diff apply to
 
-        file = get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+        file = get_file(request, pk)
 
-        # CHECKS
+        # CHECKS, AN If-Match TAG MUST STILL BE THE CURRENT ONE
         if not (file.permissions & Node.Permissions.WRITE):
             return Response({"message": "Permission denied: WRITE on file"}, status=status.HTTP_403_FORBIDDEN)
 
+        if precondition_failed(request, node_etag(file)):
+            return Response({"message": "The file was changed meanwhile."}, status=status.HTTP_412_PRECONDITION_FAILED, headers={"ETag": node_etag(file)})
+
+        # PARTIAL CONTENT UPDATES, ONLY AGAINST THE CURRENT BODY
+        if edits is not None or diff is not None:
+            if [content, edits, diff].count(None) != 2:
+                return Response({"message": "Send only one of content, edits or diff."}, status=status.HTTP_400_BAD_REQUEST)
+            if not base:
+                return Response({"message": "base (the content_hash the changes apply to) is required."}, status=status.HTTP_400_BAD_REQUEST)
+            if base != file.content_hash:
+                return Response({"message": "The content changed since the base version.", "content_hash": file.content_hash}, status=status.HTTP_409_CONFLICT)
+            try:
+                edits = editing.parse_ranges(edits, file.size) if edits is not None else editing.parse_diff(diff, file)
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         parent = file.parent
         if parent_id is not None:
             if parent_id in ("", None):
@@ -311,33 +482,276 @@ class FileView(APIView):
             payload["name"] = name
         if parent_id is not None:
             payload["parent"] = (parent.id if parent else None)
-        if content is not None:
-            payload["content"] = content
-            payload["size"] = len(content or "")
 
-        if not payload:
-            return Response({"ok": True, "data": NodeSerializer(file).data}, status=status.HTTP_200_OK)
+        if not payload and content is None and edits is None:
+            return Response({"ok": True, "data": NodeSerializer(file).data}, status=status.HTTP_200_OK, headers={"ETag": node_etag(file)})
 
         ser = NodeSerializer(instance=file, data=payload, partial=True)
         ser.is_valid(raise_exception=True)
-        ser.save()
-        return Response({"ok": True, "data": ser.data}, status=status.HTTP_200_OK)
+        old_blob_id = file.blob_id
+        old_ancestors, old_totals, old_path = file.ancestor_ids, file.totals, file.path
+        try:
+            with transaction.atomic():
+                if content is not None or edits is not None:
+                    blob = storage.write_content(content) if content is not None else editing.apply(file, edits)
+                    ser.save(blob=blob, content_hash=blob.digest, size=blob.size)
+                    revisions.record(file, old_blob_id)
+                    storage.release([old_blob_id])
+                else:
+                    ser.save()
+                Node.objects.shift_totals(old_ancestors, old_totals, file.ancestor_ids, file.totals)
+                if name is not None or content is not None or edits is not None:
+                    search.index_node(file, content if content is not None else storage.read_content(file, limit=settings.SEARCH_INDEX_MAX_BYTES))
+                listings.invalidate(old_ancestors + file.ancestor_ids)
+                if file.path != old_path:
+                    changes.record(Change.Kinds.MOVE, [file], old_paths={file.id: old_path})
+                if name is not None or content is not None or edits is not None:
+                    changes.record(Change.Kinds.UPDATE, [file])
+        except IntegrityError:
+            return Response({"message": "A file with this name already exists in the destination."}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"ok": True, "data": ser.data}, status=status.HTTP_200_OK, headers={"ETag": node_etag(file)})
 
 
     # endpoint to move
     # file into trash
-    def delete(self, request, pk):
-        file = get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+    def delete(self, request, pk=None):
+        file = get_file(request, pk)
 
         if not (file.permissions & Node.Permissions.DELETE):
             return Response({"message": "Permission denied: DELETE"}, status=status.HTTP_403_FORBIDDEN)
 
         now = timezone.now()
-        Node.objects.filter(id=file.id).update(is_trashed=True, trashed_at=now)
+        with transaction.atomic():
+            Node.objects.filter(id=file.id).update(is_trashed=True, trashed_at=now)
+            Node.objects.add_totals(file.ancestor_ids, file.totals, sign=-1)
+            listings.touch([file])
+            changes.record(Change.Kinds.TRASH, [file])
         return Response({"ok": True}, status=status.HTTP_200_OK)
     
 
 
+class FileContentView(APIView):
+    """
+        CBV for raw file bodies, streamed in
+        and out without loading them in memory
+    """
+
+    # download of the body,
+    # whole or a single byte range
+    def get(self, request, pk=None):
+        file = get_file(request, pk)
+
+        if not (file.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        # THE DIGEST IDENTIFIES THE BODY
+        etag = make_etag(file.content_hash)
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        try:
+            byte_range = parse_range(request.headers.get("Range"), file.size)
+        except ValueError:
+            res = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            res["Content-Range"] = f"bytes */{file.size}"
+            return res
+
+        start, end = byte_range or (0, file.size)
+        chunks = storage.iter_blob(file.blob_id, start, end) if file.blob_id else iter(())
+        content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+
+        res = StreamingHttpResponse(chunks, content_type=content_type)
+        res["Content-Length"] = str(end - start)
+        res["Accept-Ranges"] = "bytes"
+        res["ETag"] = etag
+        res["Content-Disposition"] = content_disposition_header(request.query_params.get("download") == "1", file.name)
+        if byte_range:
+            res.status_code = status.HTTP_206_PARTIAL_CONTENT
+            res["Content-Range"] = f"bytes {start}-{end - 1}/{file.size}"
+        return res
+
+
+    # upload of the raw request body
+    # replacing the current one
+    def put(self, request, pk=None):
+        file = get_file(request, pk)
+
+        if not (file.permissions & Node.Permissions.WRITE):
+            return Response({"message": "Permission denied: WRITE on file"}, status=status.HTTP_403_FORBIDDEN)
+
+        if precondition_failed(request, make_etag(file.content_hash)):
+            return Response({"message": "The file was changed meanwhile."}, status=status.HTTP_412_PRECONDITION_FAILED, headers={"ETag": make_etag(file.content_hash)})
+
+        # BODY IS READ CHUNK BY CHUNK, NEVER AS A WHOLE
+        old_blob_id, old_totals = file.blob_id, file.totals
+        with transaction.atomic():
+            writer = storage.BlobWriter()
+            if request.stream:
+                while chunk := request.stream.read(storage.CHUNK_SIZE):
+                    writer.write(chunk)
+            blob = writer.close()
+
+            file.blob = blob
+            file.content_hash = blob.digest
+            file.size = blob.size
+            file.save(update_fields=["blob", "content_hash", "size", "modified_at"])
+            revisions.record(file, old_blob_id)
+            Node.objects.shift_totals(file.ancestor_ids, old_totals, file.ancestor_ids, file.totals)
+            storage.release([old_blob_id])
+            search.index_node(file, storage.read_content(file, limit=settings.SEARCH_INDEX_MAX_BYTES))
+            listings.touch([file])
+            changes.record(Change.Kinds.UPDATE, [file])
+
+        return Response({"ok": True, "data": NodeListSerializer(file).data}, status=status.HTTP_200_OK, headers={"ETag": make_etag(file.content_hash)})
+
+
+
+class FileRevisionView(APIView):
+    """
+        CBV for the history of a file body:
+        listing and download of revisions
+    """
+
+    # list of the revisions, newest first, or
+    # the raw body of revision `number`
+    def get(self, request, pk, number=None):
+        file = get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+
+        if not (file.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        if number is None:
+            rows = file.revisions.defer("delta").order_by("-number")
+            return Response({"ok": True, "data": FileRevisionSerializer(rows, many=True).data}, status=status.HTTP_200_OK)
+
+        revision = get_object_or_404(file.revisions, number=number)
+        etag = make_etag(revision.content_hash)
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        res = StreamingHttpResponse(revisions.iter_read(revision), content_type=mimetypes.guess_type(file.name)[0] or "application/octet-stream")
+        res["Content-Length"] = str(revision.size)
+        res["ETag"] = etag
+        res["Content-Disposition"] = content_disposition_header(request.query_params.get("download") == "1", file.name)
+        return res
+
+
+
+class FileRevisionRevertView(APIView):
+    """
+        CBV for the revert of a file to one
+        of its revisions, POST only
+    """
+
+    # makes revision `number` the current body,
+    # recorded as a new revision on top of the history
+    def post(self, request, pk, number):
+        file = get_object_or_404(Node, id=pk, is_trashed=False, node_type=Node.NodeTypes.FILE)
+
+        if not (file.permissions & Node.Permissions.WRITE):
+            return Response({"message": "Permission denied: WRITE on file"}, status=status.HTTP_403_FORBIDDEN)
+
+        revision = get_object_or_404(file.revisions, number=number)
+        if revision.content_hash == file.content_hash:
+            return Response({"ok": True, "data": NodeListSerializer(file).data}, status=status.HTTP_200_OK)
+
+        old_blob_id, old_totals = file.blob_id, file.totals
+        with transaction.atomic():
+            blob = revisions.to_blob(revision)
+            file.blob = blob
+            file.content_hash = blob.digest
+            file.size = blob.size
+            file.save(update_fields=["blob", "content_hash", "size", "modified_at"])
+            revisions.record(file, old_blob_id)
+            Node.objects.shift_totals(file.ancestor_ids, old_totals, file.ancestor_ids, file.totals)
+            storage.release([old_blob_id])
+            search.index_node(file, storage.read_content(file, limit=settings.SEARCH_INDEX_MAX_BYTES))
+            listings.touch([file])
+            changes.record(Change.Kinds.UPDATE, [file])
+
+        return Response({"ok": True, "data": NodeListSerializer(file).data}, status=status.HTTP_200_OK)
+
+
+
+class CopyView(APIView):
+    """
+        CBV for server-side copy of a file
+        or of a whole directory tree
+    """
+
+    # copy of the node with its live subtree, by default
+    # next to the source, or under parent_id ("" for root)
+    def post(self, request, pk):
+        # INITIAL DATA GET
+        src = get_object_or_404(Node, id=pk, is_trashed=False)
+        dest_parent_id = request.data.get("parent_id")
+        name = (request.data.get("name") or "").strip() or None
+        if name is not None and (message := invalid_name(name)):
+            return Response({"message": message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # CHECKS ON THE SOURCE, THE WHOLE SUBTREE MUST BE READABLE
+        if not (src.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        if src.node_type == Node.NodeTypes.DIRECTORY:
+            unreadable = list(Node.objects.subtree(src).filter(is_trashed=False).lacking_permissions(Node.Permissions.READ).values_list("name", flat=True))
+            if unreadable:
+                return Response({"message": "Permission denied to read some items.", "items": unreadable}, status=status.HTTP_403_FORBIDDEN)
+
+        # CHECKS ON THE DESTINATION
+        if dest_parent_id is None:
+            dest = src.parent
+        elif dest_parent_id == "":
+            dest = None
+        else:
+            dest = Node.objects.filter(id=dest_parent_id, is_trashed=False, node_type=Node.NodeTypes.DIRECTORY).first()
+            if not dest:
+                return Response({"message": "Destination parent not found or not a directory."}, status=status.HTTP_404_NOT_FOUND)
+
+        if dest and not (dest.permissions & Node.Permissions.WRITE):
+            return Response({"message": "Permission denied: WRITE on destination directory."}, status=status.HTTP_403_FORBIDDEN)
+        if dest and dest.is_inside(src):
+            return Response({"message": "Cannot copy a directory into its own subtree."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # NAME OF THE COPY, EXPLICIT ONE MUST BE FREE
+        siblings = Node.objects.filter(parent_id=(dest.id if dest else None), node_type=src.node_type, is_trashed=False)
+        if name is not None:
+            if siblings.filter(name=name).exists():
+                return Response({"message": "An item with this name already exists at destination."}, status=status.HTTP_409_CONFLICT)
+        else:
+            name = self.free_name(src, siblings)
+
+        # COPY AND RESPONSE
+        try:
+            with transaction.atomic():
+                copy, copied_count = copying.copy_subtree(src, dest, name)
+                listings.touch([copy])
+                changes.record(Change.Kinds.CREATE, [copy], subtree=True)
+        except IntegrityError:
+            return Response({"message": "An item with this name already exists at destination."}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"ok": True, "data": NodeSerializer(copy).data, "copied_count": copied_count}, status=status.HTTP_201_CREATED)
+
+
+    # name of the source if it's free, otherwise
+    # "name (copy).ext", "name (copy 2).ext", ...
+    @staticmethod
+    def free_name(src, siblings):
+        stem, dot, ext = src.name, "", ""
+        if src.node_type == Node.NodeTypes.FILE and "." in src.name.strip("."):
+            stem, dot, ext = src.name.rpartition(".")
+        taken = set(siblings.filter(name__startswith=stem).values_list("name", flat=True))
+
+        candidates = [src.name, f"{stem} (copy){dot}{ext}"]
+        candidates += (f"{stem} (copy {i}){dot}{ext}" for i in range(2, len(taken) + 2))
+        return next(c for c in candidates if c not in taken)
+
+
+
 class TrashView(APIView):
     """
         CBV for Trash Operations
@@ -349,6 +763,8 @@ class TrashView(APIView):
         # INITIAL DATA GET
         sort = request.query_params.get("sort", "trashed_at")
         order = request.query_params.get("order", "desc")
+        cursor = request.query_params.get("cursor")
+        limit = parse_limit(request.query_params.get("limit"))
 
         # SORT OF PARAMS FOR SECURITY
         sort_map = {
@@ -359,13 +775,14 @@ class TrashView(APIView):
         }
         sort_field = sort_map.get(sort, "trashed_at")
 
-        if order == "desc":
-            sort_field = f"-{sort_field}"
-
         # QUERY AND RESPONSE
-        qs = Node.objects.filter(is_trashed=True).only("id", "name", "node_type", "parent_id", "size", "permissions", "created_at", "modified_at", "trashed_at").order_by(sort_field)
+        qs = Node.objects.filter(is_trashed=True, trashed_at__isnull=False).only(*NodeListSerializer.Meta.fields)
+        try:
+            rows, next_cursor = keyset_paginate(qs, sort_field, order == "desc", cursor, limit)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"ok": True, "data": NodeSerializer(qs, many=True).data}, status=status.HTTP_200_OK)
+        return Response({"ok": True, "data": NodeListSerializer(rows, many=True).data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
 
 
     # restoring of specific item
@@ -378,6 +795,10 @@ class TrashView(APIView):
         # LOGIC FOR RESTORING PATH
         if dest_parent_id is None:
             dest_parent = node.parent  # restoring back where it was
+            # A LIVE NODE UNDER A TRASHED DIRECTORY WOULD BE COUNTED TWICE
+            # IN THE TOTALS ABOVE IT ONCE THAT DIRECTORY COMES BACK
+            if dest_parent and dest_parent.is_trashed:
+                return Response({"message": "The original directory is in trash, restore it first or pick another destination."}, status=status.HTTP_409_CONFLICT)
         elif dest_parent_id in ("", None):
             dest_parent = None  # restore to root
         else:
@@ -394,29 +815,33 @@ class TrashView(APIView):
         if Node.objects.filter(parent_id=target_parent_id, name=node.name, node_type=node.node_type, is_trashed=False).exclude(id=node.id).exists():
             return Response({"message": "An item with this name already exists at destination."}, status=status.HTTP_409_CONFLICT)
 
+        if node.node_type == Node.NodeTypes.DIRECTORY and request.query_params.get("async") in ("1", "true", "True"):
+            job = jobs.submit(Job.Kinds.RESTORE, node, parent_id=target_parent_id)
+            return Response({"ok": True, "job": JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
         # RESTORE PROCESS AND LOGIC
-        if node.node_type == Node.NodeTypes.FILE:
-            node.parent = dest_parent
-            node.is_trashed = False
-            node.trashed_at = None
-            node.save()
-        else:
-            # FOR DIRECTORIES WE RESOTRE ALSO ALL OF ITS CHILDREN
-            node.parent = dest_parent
-            node.is_trashed = False
-            node.trashed_at = None
-            node.save()
-
-            ids = [node.id]
-            frontier = [node.id]
-            while frontier:
-                children = list(Node.objects.filter(parent_id__in=frontier).values_list("id", flat=True))
-                if not children:
-                    break
-                ids.extend(children)
-                frontier = children
-
-            Node.objects.filter(id__in=ids, is_trashed=True).update(is_trashed=False, trashed_at=None)
+        # A NAME TAKEN MEANWHILE ROLLS BACK THE WHOLE RESTORE
+        try:
+            with transaction.atomic():
+                old_path = node.path
+                node.parent = dest_parent
+                node.is_trashed = False
+                node.trashed_at = None
+                node.save()
+
+                # FOR DIRECTORIES WE RESOTRE ALSO ALL OF ITS CHILDREN
+                # AND RECOUNT THEIR TOTALS, THE SUBTREE MAY HAVE CHANGED IN TRASH
+                if node.node_type == Node.NodeTypes.DIRECTORY:
+                    Node.objects.subtree(node).filter(is_trashed=True).update(is_trashed=False, trashed_at=None)
+                    Node.objects.recompute_totals(node)
+                    node.refresh_from_db(fields=Node.TOTAL_FIELDS)
+                Node.objects.add_totals(node.ancestor_ids, node.totals)
+                listings.touch([node], subtree=True)
+                changes.record(Change.Kinds.RESTORE, [node], subtree=True, old_paths={node.id: old_path} if node.path != old_path else None)
+        except IntegrityError:
+            return Response({"message": "An item with this name already exists at destination."}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         # RESPONSE
         return Response({"ok": True, "data": NodeSerializer(node).data}, status=status.HTTP_200_OK)
@@ -431,30 +856,54 @@ class TrashView(APIView):
             return Response({"message": "Permission denied: DELETE on item."}, status=status.HTTP_403_FORBIDDEN)
 
         if node.node_type == Node.NodeTypes.FILE:
-            node.delete()
+            purging.purge_all(Node.objects.filter(id=node.id))
             return Response({"ok": True}, status=status.HTTP_200_OK)
 
-        ids = [node.id]
-        frontier = [node.id]
-        while frontier:
-            children = list(Node.objects.filter(parent_id__in=frontier).values_list("id", flat=True))
-            if not children:
-                break
-            ids.extend(children)
-            frontier = children
+        subtree = Node.objects.subtree(node)
 
-        if Node.objects.filter(id__in=ids, is_trashed=False).exists():
+        if subtree.filter(is_trashed=False).exists():
             return Response({"message": "Cannot purge: some descendants are not in trash."}, status=status.HTTP_400_BAD_REQUEST)
 
-        lacking_ids = [
-            n.id for n in Node.objects.filter(id__in=ids).only("id", "permissions").iterator()
-            if not (n.permissions & Node.Permissions.DELETE)
-        ]
+        lacking_ids = list(subtree.lacking_permissions(Node.Permissions.DELETE).values_list("id", flat=True))
         if lacking_ids:
             return Response({"message": "Permission denied to purge some items.", "items": lacking_ids}, status=status.HTTP_403_FORBIDDEN)
 
-        Node.objects.filter(id__in=ids).delete()
-        return Response({"ok": True, "purged_count": len(ids)}, status=status.HTTP_200_OK)
+        if request.query_params.get("async") in ("1", "true", "True"):
+            job = jobs.submit(Job.Kinds.PURGE, node)
+            return Response({"ok": True, "job": JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
+        # BOUNDED CHUNKS, DEEPEST FIRST, NO CASCADE COLLECTOR
+        purged_count = purging.purge_all(subtree)
+        return Response({"ok": True, "purged_count": purged_count}, status=status.HTTP_200_OK)
+
+
+
+class EmptyTrashView(APIView):
+    """
+        CBV emptying the trash of everything
+        put there more than N days ago
+    """
+
+    # ?older_than=N days, 0 (default) empties the whole
+    # trash, entries with live or protected items are kept
+    def delete(self, request):
+        try:
+            days = int(request.query_params.get("older_than", 0))
+        except (TypeError, ValueError):
+            return Response({"message": "older_than must be a number of days."}, status=status.HTTP_400_BAD_REQUEST)
+        if days < 0:
+            return Response({"message": "older_than must be a number of days."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if request.query_params.get("async") in ("1", "true", "True"):
+            job = jobs.submit(Job.Kinds.EMPTY_TRASH, None, cutoff=cutoff.isoformat())
+            return Response({"ok": True, "job": JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
+        purged_count = skipped_count = 0
+        for purged_count, skipped_count in purging.empty_trash(cutoff):
+            pass
+        return Response({"ok": True, "purged_count": purged_count, "skipped_count": skipped_count}, status=status.HTTP_200_OK)
     
 
 
@@ -473,62 +922,27 @@ class SearchView(APIView):
         node_type = request.query_params.get("type")
         parent_id = request.query_params.get("parent_id")
         parent_id = None if parent_id == 'undefined' else parent_id
-        try:
-            limit = max(1, min(int(request.query_params.get("limit", 100)), 500))
-        except ValueError:
-            limit = 100
+        limit = parse_limit(request.query_params.get("limit"))
+        cursor = request.query_params.get("cursor")
 
-        order = request.query_params.get("order", "name")
+        order = request.query_params.get("order", "rank")
         direction = request.query_params.get("direction", "asc")
 
         # IF NOT PARAMS FOUND RETURNS EMPTY DATA
         if not q:
-            return Response({"ok": True, "data": []}, status=status.HTTP_200_OK)
+            return Response({"ok": True, "data": [], "next_cursor": None}, status=status.HTTP_200_OK)
 
-        # BASE QUERYSET
-        qs = Node.objects.all()
-        if not include_trash:
-            qs = qs.filter(is_trashed=False)
+        # READ PERMISSION CHECKED BY THE DATABASE,
+        # SEARCH CONDITION MATCHED IN THE FULL-TEXT INDEX
+        qs = search_queryset(q, scope, include_trash, node_type, parent_id)
+        sort_field = SEARCH_SORTS.get(order, "rank")
 
-        if node_type in (Node.NodeTypes.FILE, Node.NodeTypes.DIRECTORY):
-            qs = qs.filter(node_type=node_type)
-
-        if parent_id is not None:
-            qs = qs.filter(parent_id=parent_id)
-
-        # SEARCH CONDITION
-        name_cond = Q(name__icontains=q)
-        content_cond = Q(node_type=Node.NodeTypes.FILE, content__icontains=q)
-
-        if scope == "name":
-            qs = qs.filter(name_cond)
-        elif scope == "content":
-            qs = qs.filter(content_cond)
-        else:
-            qs = qs.filter(name_cond | content_cond)
-
-        # WHITELISTING
-        sort_map = {
-            "name": "name",
-            "mtime": "modified_at",
-            "size": "size",
-            "type": "node_type",
-        }
-        sort_field = sort_map.get(order, "name")
-        if direction == "desc":
-            sort_field = f"-{sort_field}"
-
-        qs = qs.only("id", "name", "node_type", "parent_id", "size", "permissions", "created_at", "modified_at", "is_trashed").order_by(sort_field)[: limit * 2]
-
-        # PERMISSIONS READ AND FINALLY RESPONSE
-        results = []
-        for n in qs:
-            if n.permissions & Node.Permissions.READ:
-                results.append(n)
-                if len(results) >= limit:
-                    break
+        try:
+            rows, next_cursor = keyset_paginate(qs, sort_field, direction == "desc", cursor, limit)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({"ok": True, "data": NodeSerializer(results, many=True).data}, status=status.HTTP_200_OK)
+        return Response({"ok": True, "data": NodeListSerializer(rows, many=True).data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
     
 
 
@@ -591,7 +1005,10 @@ class PermissionsView(APIView):
             return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         node.permissions = mask
-        node.save(update_fields=["permissions"])
+        with transaction.atomic():
+            node.save(update_fields=["permissions"])
+            listings.touch([node])
+            changes.record(Change.Kinds.PERMISSIONS, [node])
 
         # PAYLOAD AND RESPONSE
         payload = {
@@ -604,20 +1021,408 @@ class PermissionsView(APIView):
     
 
 
+class BulkView(APIView):
+    """
+        CBV applying one operation to many nodes at once,
+        permissions and name conflicts are checked set-wise
+        and every write happens in a single transaction
+    """
+
+    MAX_ITEMS = 10_000
+
+    # subtree LIKEs per query
+    BATCH = 200
+
+    # endpoint for move, trash, restore and
+    # permission changes of a selection of nodes
+    def post(self, request):
+        # INITIAL DATA GET
+        data = request.data or {}
+        op = data.get("op")
+        ids = data.get("ids")
+
+        handlers = {
+            "move": self.move,
+            "trash": self.trash,
+            "restore": self.restore,
+            "permissions": self.permissions,
+        }
+        if op not in handlers:
+            return Response({"message": "op must be one of: move, trash, restore, permissions."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not isinstance(ids, list) or not ids:
+            return Response({"message": "ids must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.MAX_ITEMS:
+            return Response({"message": f"At most {self.MAX_ITEMS} items per request."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            return Response({"message": "ids must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # ONE QUERY FOR THE WHOLE SELECTION
+        found = Node.objects.in_bulk(ids)
+        nodes = [found[pk] for pk in ids if pk in found]
+        errors = {pk: "Not found." for pk in ids if pk not in found}
+
+        # ALL OR NOTHING FOR THE ITEMS THAT PASSED THE CHECKS
+        try:
+            with transaction.atomic():
+                failure = handlers[op](data, nodes, errors)
+        except IntegrityError:
+            return Response({"message": "Some names were taken meanwhile, nothing was changed."}, status=status.HTTP_409_CONFLICT)
+        except PathTooLong as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if failure is not None:
+            return failure
+
+        # PER ITEM RESULTS IN THE ORDER OF THE REQUEST
+        results = [{"id": pk, "ok": False, "message": errors[pk]} if pk in errors else {"id": pk, "ok": True} for pk in ids]
+        return Response({"ok": True, "data": results, "done": len(ids) - len(errors)}, status=status.HTTP_200_OK)
+
+
+    # move of the selection
+    # into one live directory
+    def move(self, data, nodes, errors):
+        if "parent_id" not in data:
+            return Response({"message": "parent_id is required to move items."}, status=status.HTTP_400_BAD_REQUEST)
+        dest, failure = self.destination(data.get("parent_id"))
+        if failure is not None:
+            return failure
+
+        candidates = []
+        for node in nodes:
+            if node.is_trashed:
+                errors[node.id] = "Item is in trash."
+            elif not (node.permissions & Node.Permissions.WRITE):
+                errors[node.id] = "Permission denied: WRITE"
+            elif dest and dest.is_inside(node):
+                errors[node.id] = "Cannot move a directory into its own subtree."
+            else:
+                candidates.append(node)
+
+        dest_id = dest.id if dest else None
+        moving = [n for n in self.outermost(candidates) if n.parent_id != dest_id]
+        moving = self.without_conflicts(moving, {n.id: dest_id for n in moving}, errors, "An item with this name already exists in the destination.")
+        self.inherit_errors(candidates, errors)
+
+        before = [(n.ancestor_ids, n.totals) for n in moving]
+        old_paths = {n.id: n.path for n in moving}
+        self.relocate(moving, dest)
+        Node.objects.add_totals_many(
+            [(ids, totals, -1) for ids, totals in before] + [(n.ancestor_ids, n.totals, 1) for n in moving]
+        )
+        listings.invalidate({pk for ids, _ in before for pk in ids} | {pk for n in moving for pk in n.ancestor_ids})
+        changes.record(Change.Kinds.MOVE, moving, subtree=True, old_paths=old_paths)
+
+
+    # soft delete of the selection,
+    # directories with their live subtree
+    def trash(self, data, nodes, errors):
+        live = []
+        for node in nodes:
+            if node.is_trashed:
+                errors[node.id] = "Already in trash."
+            elif not (node.permissions & Node.Permissions.DELETE):
+                errors[node.id] = "Permission denied: DELETE"
+            else:
+                live.append(node)
+
+        # DIRECTORIES WITH ANY LIVE DESCENDANT LACKING DELETE ARE REFUSED
+        dirs = {n.id: n for n in live if n.node_type == Node.NodeTypes.DIRECTORY}
+        for batch in self.batches(list(dirs.values())):
+            lacking = Node.objects.subtrees(batch).filter(is_trashed=False).lacking_permissions(Node.Permissions.DELETE)
+            for path in lacking.values_list("path", flat=True):
+                for pk in path.strip("/").split("/"):
+                    if int(pk) in dirs:
+                        errors[int(pk)] = "Permission denied to delete some items inside."
+
+        top = self.outermost([n for n in live if n.id not in errors])
+        now = timezone.now()
+        self.update_subtrees(top, dict(is_trashed=False), is_trashed=True, trashed_at=now)
+        Node.objects.add_totals_many([(n.ancestor_ids, n.totals, -1) for n in top])
+        listings.touch(top)
+        changes.record(Change.Kinds.TRASH, top, subtree=True)
+
+
+    # restore of the selection to where it was
+    # or into one live directory given as parent_id
+    def restore(self, data, nodes, errors):
+        dest_parent_id = data.get("parent_id")
+        dest = None
+        if dest_parent_id is not None:
+            dest, failure = self.destination(dest_parent_id)
+            if failure is not None:
+                return failure
+
+        trashed = []
+        for node in nodes:
+            if not node.is_trashed:
+                errors[node.id] = "Item is not in trash."
+            else:
+                trashed.append(node)
+        top = self.outermost(trashed)
+
+        # ORIGINAL PARENTS ARE CHECKED ALL AT ONCE
+        if dest_parent_id is None:
+            parents = Node.objects.in_bulk({n.parent_id for n in top if n.parent_id})
+            for node in top:
+                parent = parents.get(node.parent_id)
+                if parent and parent.is_trashed:
+                    errors[node.id] = "The original directory is in trash, restore it first or pick another destination."
+                elif parent and not (parent.permissions & Node.Permissions.WRITE):
+                    errors[node.id] = "Permission denied: WRITE on destination directory."
+
+        top = [n for n in top if n.id not in errors]
+        targets = {n.id: (dest.id if dest else None) if dest_parent_id is not None else n.parent_id for n in top}
+        top = self.without_conflicts(top, targets, errors, "An item with this name already exists at destination.")
+        self.inherit_errors(trashed, errors)
+
+        # MOVED WHILE STILL TRASHED SO NAMES ONLY COUNT AT THE DESTINATION
+        old_paths = {n.id: n.path for n in top if n.parent_id != targets[n.id]}
+        self.relocate([n for n in top if n.parent_id != targets[n.id]], dest)
+        self.update_subtrees(top, dict(is_trashed=True), is_trashed=False, trashed_at=None)
+
+        # RESTORED DIRECTORIES ARE RECOUNTED, THEIR SUBTREE MAY HAVE CHANGED IN TRASH
+        restored_dirs = [n for n in top if n.node_type == Node.NodeTypes.DIRECTORY]
+        for node in restored_dirs:
+            Node.objects.recompute_totals(node)
+        fresh = Node.objects.in_bulk([n.id for n in restored_dirs])
+        for node in restored_dirs:
+            node.size, node.file_count, node.dir_count = fresh[node.id].size, fresh[node.id].file_count, fresh[node.id].dir_count
+        Node.objects.add_totals_many([(n.ancestor_ids, n.totals, 1) for n in top])
+        listings.touch(top, subtree=True)
+        changes.record(Change.Kinds.RESTORE, top, subtree=True, old_paths=old_paths)
+
+
+    # permission bitmask of the selection set,
+    # or flags added/removed, like PermissionsView.patch
+    def permissions(self, data, nodes, errors):
+        new_mask = data.get("permissions", None)
+        add_flags = data.get("add", None)
+        remove_flags = data.get("remove", None)
+
+        if new_mask is None and add_flags is None and remove_flags is None:
+            return Response({"message": "Provide 'permissions' bitmask OR 'add'/'remove' flag lists."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if new_mask is not None:
+            try:
+                new_mask = int(new_mask)
+            except (TypeError, ValueError):
+                return Response({"message": "permissions must be an integer (0..15)."}, status=status.HTTP_400_BAD_REQUEST)
+            if new_mask < 0 or new_mask > 15:
+                return Response({"message": "permissions must be in range 0..15."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            add = to_bits(add_flags) if add_flags is not None else 0
+            remove = to_bits(remove_flags) if remove_flags is not None else 0
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        allowed = []
+        for node in nodes:
+            if not (node.permissions & Node.Permissions.ADMIN):
+                errors[node.id] = "Permission denied: ADMIN required."
+            else:
+                allowed.append(node.id)
+
+        # SAME MASK ARITHMETIC AS THE SINGLE ENDPOINT, DONE BY THE DATABASE
+        keep = 15 & ~remove
+        if new_mask is not None:
+            value = (new_mask | add) & keep
+        else:
+            value = F("permissions").bitor(add).bitand(keep)
+        for start in range(0, len(allowed), 500):
+            Node.objects.filter(id__in=allowed[start:start + 500]).update(permissions=value)
+        listings.touch([n for n in nodes if n.id not in errors])
+        changes.record(Change.Kinds.PERMISSIONS, [n for n in nodes if n.id not in errors])
+
+
+    # live destination directory with WRITE,
+    # "" or None meaning the root
+    def destination(self, parent_id):
+        if parent_id in ("", None):
+            return None, None
+        dest = Node.objects.filter(id=parent_id, is_trashed=False, node_type=Node.NodeTypes.DIRECTORY).first()
+        if not dest:
+            return None, Response({"message": "Destination parent not found or not a directory."}, status=status.HTTP_404_NOT_FOUND)
+        if not (dest.permissions & Node.Permissions.WRITE):
+            return None, Response({"message": "Permission denied: WRITE on destination directory."}, status=status.HTTP_403_FORBIDDEN)
+        return dest, None
+
+
+    # drops nodes lying inside another selected
+    # directory, they travel along with it
+    @staticmethod
+    def outermost(nodes):
+        dir_ids = {n.id for n in nodes if n.node_type == Node.NodeTypes.DIRECTORY}
+        return [n for n in nodes if dir_ids.isdisjoint(n.ancestor_ids)]
+
+
+    # nodes outermost() dropped share the fate of the selected
+    # directory covering them, its error is theirs as well
+    @staticmethod
+    def inherit_errors(nodes, errors):
+        failed = {n.id for n in nodes if n.node_type == Node.NodeTypes.DIRECTORY and n.id in errors}
+        for node in nodes:
+            covering = next((pk for pk in node.ancestor_ids if pk in failed), None)
+            if covering is not None and node.id not in errors:
+                errors[node.id] = errors[covering]
+
+
+    @classmethod
+    def batches(cls, items):
+        return [items[start:start + cls.BATCH] for start in range(0, len(items), cls.BATCH)]
+
+
+    # keeps the nodes whose name is free in their target
+    # parent (by node id), live siblings are fetched one query
+    # per batch of parents and the selection can't collide with itself
+    def without_conflicts(self, nodes, targets, errors, message):
+        by_parent = {}
+        for node in nodes:
+            by_parent.setdefault(targets[node.id], set()).add(node.name)
+
+        taken = set()
+        parents = list(by_parent.items())
+        for batch in self.batches(parents):
+            match = Q(pk__in=[])
+            for parent_id, names in batch:
+                match |= Q(parent_id=parent_id, name__in=names) if parent_id else Q(parent__isnull=True, name__in=names)
+            live = Node.objects.filter(match, is_trashed=False).values_list("id", "parent_id", "name", "node_type")
+            taken.update((parent_id, name, node_type) for pk, parent_id, name, node_type in live)
+
+        kept = []
+        for node in nodes:
+            key = (targets[node.id], node.name, node.node_type)
+            if key in taken:
+                errors[node.id] = message
+            else:
+                taken.add(key)
+                kept.append(node)
+        return kept
+
+
+    # update() of the nodes and, for directories,
+    # of every descendant matching `where`
+    def update_subtrees(self, nodes, where, **values):
+        files = [n.id for n in nodes if n.node_type == Node.NodeTypes.FILE]
+        for start in range(0, len(files), 500):
+            Node.objects.filter(id__in=files[start:start + 500]).update(**values)
+        for batch in self.batches([n for n in nodes if n.node_type == Node.NodeTypes.DIRECTORY]):
+            Node.objects.subtrees(batch).filter(**where).update(**values)
+
+
+    # reparents the nodes under `dest`, files in one UPDATE
+    # per batch, directories through save() that rewrites
+    # the paths of their subtree
+    def relocate(self, nodes, dest):
+        base = dest.path if dest else "/"
+        depth = dest.depth + 1 if dest else 0
+        now = timezone.now()
+
+        full_path = Concat(Value(f"{dest.full_path if dest else ''}/"), "name", output_field=TextField())
+        files = [n for n in nodes if n.node_type == Node.NodeTypes.FILE]
+        for node in files:
+            Node.check_path_length(len(f"{base}{node.id}/"))
+        for start in range(0, len(files), 500):
+            Node.objects.filter(id__in=[n.id for n in files[start:start + 500]]).update(
+                parent=dest, depth=depth, modified_at=now,
+                path=Concat(Value(base), Cast("id", output_field=CharField()), Value("/"), output_field=CharField()),
+                full_path=full_path, path_hash=MD5(full_path),
+            )
+        for node in files:
+            node.parent, node.path, node.depth = dest, f"{base}{node.id}/", depth
+            node.full_path = Node.build_full_path(dest, node.name)
+            node.path_hash = Node.hash_path(node.full_path)
+
+        for node in nodes:
+            if node.node_type == Node.NodeTypes.DIRECTORY:
+                node.parent = dest
+                node.save(update_fields=["parent", "modified_at"])
+
+
+
+class JobView(APIView):
+    """
+        CBV for the state and progress
+        of a background job
+    """
+
+    def get(self, request, pk):
+        job = get_object_or_404(Job, id=pk)
+        return Response({"ok": True, "data": JobSerializer(job).data}, status=status.HTTP_200_OK)
+
+
+
+class StorageStatsView(APIView):
+    """
+        CBV for logical vs stored bytes of file
+        bodies, after dedup and compression
+    """
+
+    def get(self, request):
+        return Response({"ok": True, "data": storage.stats()}, status=status.HTTP_200_OK)
+
+
+
+class ListingCacheView(APIView):
+    """
+        CBV for the hit rate
+        of the listing cache
+    """
+
+    def get(self, request):
+        data = {"enabled": listings.is_enabled(), **listings.stats()}
+        return Response({"ok": True, "data": data}, status=status.HTTP_200_OK)
+
+
+
+class TreeView(APIView):
+    """
+        Lazy directory tree for move/select destinations:
+        a page of a directory's children, `depth` levels deep.
+    """
+
+    def get(self, request):
+        parent_id = request.query_params.get("parent_id")
+        prefix = (request.query_params.get("prefix") or "").strip()
+        cursor = request.query_params.get("cursor")
+        limit = parse_limit(request.query_params.get("limit"))
+        try:
+            depth = max(1, min(int(request.query_params.get("depth", 1)), tree.MAX_DEPTH))
+        except ValueError:
+            return Response({"message": "depth must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+        parent = None
+        if parent_id not in (None, "", "undefined"):
+            parent = get_object_or_404(Node, id=parent_id, node_type=Node.NodeTypes.DIRECTORY, is_trashed=False)
+            if not (parent.permissions & Node.Permissions.READ):
+                return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            rows, next_cursor = tree.expand(parent, depth, prefix, cursor, limit, fields=NodeListSerializer.Meta.fields)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        ser = TreeNodeSerializer(rows, many=True)
+        return Response({"ok": True, "data": ser.data, "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+
+
+
 class AllDirectoriesView(APIView):
     """
-    Returns all available (non-trashed) directories.
-    Used for move/select destination lists.
+    Returns all available (non-trashed, readable) directories.
+    Superseded by TreeView, kept for existing clients.
     """
 
     def get(self, request):
         qs = (
-            Node.objects.filter(is_trashed=False, node_type=Node.NodeTypes.DIRECTORY)
-            .only("id", "name", "parent_id", "permissions", "created_at")
+            Node.objects.readable().filter(is_trashed=False, node_type=Node.NodeTypes.DIRECTORY)
+            .only(*NodeListSerializer.Meta.fields)
             .order_by("name")
         )
 
-        ser = NodeSerializer(qs, many=True)
+        ser = NodeListSerializer(qs, many=True)
         return Response({"ok": True, "data": ser.data}, status=status.HTTP_200_OK)
     
 
@@ -638,4 +1443,153 @@ class DirectoryDetailView(APIView):
         if not (directory.permissions & Node.Permissions.READ):
             return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
 
-        return Response({"ok": True, "data": NodeSerializer(directory).data}, status=status.HTTP_200_OK)
+        crumbs, etag = with_ancestors(request, directory, node_etag(directory))
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        payload = {"ok": True, "data": NodeSerializer(directory).data}
+        if crumbs is not None:
+            payload["ancestors"] = crumbs
+        return Response(payload, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+
+
+class ResolveView(APIView):
+    """
+        Node at a full path like "/projects/acme/config.yaml",
+        found with one lookup on the indexed path hash.
+    """
+
+    def get(self, request):
+        full_path = normalize_path(request.query_params.get("path"))
+        if not full_path:
+            return Response({"message": "path is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A FILE AND A DIRECTORY MAY SHARE A PATH
+        qs = Node.objects.at_path(full_path).only(*NodeListSerializer.Meta.fields)
+        node_type = request.query_params.get("type")
+        if node_type:
+            qs = qs.filter(node_type=node_type.upper())
+        nodes = list(qs[:2])
+        if not nodes:
+            return Response({"message": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        if len(nodes) > 1 and nodes[0].node_type == nodes[1].node_type:
+            return Response({"message": AmbiguousPath.default_detail}, status=status.HTTP_409_CONFLICT)
+        if len(nodes) > 1:
+            return Response({"message": "Both a file and a directory have this path, pass type=FILE or type=DIRECTORY."}, status=status.HTTP_409_CONFLICT)
+
+        node = nodes[0]
+        if not (node.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"ok": True, "data": NodeListSerializer(node).data}, status=status.HTTP_200_OK)
+
+
+
+class AncestorsView(APIView):
+    """
+        Breadcrumb of a file or directory: every directory
+        from the root down, then the node itself.
+    """
+
+    def get(self, request, pk):
+        node = get_object_or_404(Node, id=pk, is_trashed=False)
+
+        if not (node.permissions & Node.Permissions.READ):
+            return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        crumbs = [*ancestors_of(node), AncestorSerializer(node).data]
+        etag = make_etag([(c["id"], c["name"], c["parent"], c["permissions"]) for c in crumbs])
+        if not_modified(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return Response({"ok": True, "data": crumbs}, status=status.HTTP_200_OK, headers={"ETag": etag})
+
+
+
+class ChangesView(APIView):
+    """
+        Changes since a cursor, for clients keeping
+        a copy of the tree instead of polling listings.
+    """
+
+    def get(self, request):
+        raw_since = request.query_params.get("since")
+        limit = parse_limit(request.query_params.get("limit"), maximum=changes.MAX_LIMIT)
+        under_id = request.query_params.get("under")
+
+        # WITHOUT A CURSOR ONLY WHERE THE LOG IS NOW, TO START FROM
+        if raw_since in (None, ""):
+            return Response({"ok": True, "data": [], "cursor": changes.latest(), "has_more": False}, status=status.HTTP_200_OK)
+        try:
+            since = int(raw_since)
+        except ValueError:
+            return Response({"message": "since must be an integer cursor."}, status=status.HTTP_400_BAD_REQUEST)
+
+        under = None
+        if under_id not in (None, ""):
+            under = get_object_or_404(Node, id=under_id, node_type=Node.NodeTypes.DIRECTORY)
+            if not (under.permissions & Node.Permissions.READ):
+                return Response({"message": "Permission denied: READ"}, status=status.HTTP_403_FORBIDDEN)
+
+        # ENTRIES AFTER THE CURSOR ALREADY DROPPED, THE CLIENT HAS TO RELOAD
+        if not changes.is_available(since):
+            return Response({"message": "Cursor too old, reload and start from the returned cursor.", "cursor": changes.latest()}, status=status.HTTP_410_GONE)
+
+        # THE CURSOR ONLY MOVES TO THE LAST ENTRY RETURNED
+        rows = changes.after(since, limit + 1, under)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = rows[-1].seq if rows else since
+        return Response({"ok": True, "data": ChangeSerializer(rows, many=True).data, "cursor": cursor, "has_more": has_more}, status=status.HTTP_200_OK)
+
+
+
+# Server-Sent Events stream of the change log, each entry an
+# event with its id as the SSE id, so a reconnecting browser
+# resumes from Last-Event-ID. Needs the ASGI app: under WSGI
+# an endless response would hold a worker thread for good.
+async def change_stream(request):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"message": "Event streams need the ASGI server (core.asgi)."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    raw_since = request.headers.get("Last-Event-ID") or request.GET.get("since")
+    try:
+        under_id = int(request.GET["under"]) if request.GET.get("under") else None
+        cursor = int(raw_since) if raw_since else await sync_to_async(changes.latest)()
+    except ValueError:
+        return JsonResponse({"message": "since and under must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    under = None
+    if under_id is not None:
+        under = await Node.objects.filter(id=under_id, node_type=Node.NodeTypes.DIRECTORY).afirst()
+        if under is None or not (under.permissions & Node.Permissions.READ):
+            return JsonResponse({"message": "Directory not found or not readable."}, status=status.HTTP_404_NOT_FOUND)
+
+    async def events():
+        nonlocal cursor
+        # A CURSOR OLDER THAN THE LOG, THE CLIENT RELOADS AND GOES ON FROM HERE
+        if not await sync_to_async(changes.is_available)(cursor):
+            cursor = await sync_to_async(changes.latest)()
+            yield f"event: reset\ndata: {json.dumps({'cursor': cursor})}\n\n"
+
+        quiet = 0.0
+        while True:
+            rows = [row async for row in changes.entries(cursor, under)[:changes.MAX_LIMIT]]
+            for row in ChangeSerializer(rows, many=True).data:
+                yield f"id: {row['seq']}\nevent: change\ndata: {json.dumps(row)}\n\n"
+            if rows:
+                cursor, quiet = rows[-1].seq, 0.0
+                continue
+
+            # NOTHING NEW, WAIT AND KEEP THE CONNECTION ALIVE
+            await asyncio.sleep(settings.CHANGES_STREAM_POLL)
+            quiet += settings.CHANGES_STREAM_POLL
+            if quiet >= settings.CHANGES_STREAM_HEARTBEAT:
+                quiet = 0.0
+                yield ": keep-alive\n\n"
+
+    res = StreamingHttpResponse(events(), content_type="text/event-stream")
+    res["Cache-Control"] = "no-cache"
+    res["X-Accel-Buffering"] = "no"
+    return res
+
@@ -1,6 +1,7 @@
 'use client';
 
 import { useState } from "react";
+import Link from "next/link";
 import { useParams, useRouter } from "next/navigation";
 import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query";
 import { toast } from "react-toastify";
@@ -11,7 +12,7 @@ import ModalButton from "@/components/ui/btns/ModalButton";
 import SubmitButton from "@/components/ui/btns/SubmitButton";
 import FolderEditForm from "@/components/forms/FolderEditForm";
 
-import { deleteFolder, getFolder } from "@/endpoints/dirs";
+import { deleteFolder, getAncestors, getFolder } from "@/endpoints/dirs";
 import { toggleFunction } from "@/utils/lib_funcs";
 import Loader from "@/components/ui/loaders/Loader";
 import Modal from "@/components/modals/Modal";
@@ -35,6 +36,13 @@ export default function Home() {
         enabled: !!folderId,
     });
 
+    // BREADCRUMB, THE WHOLE CHAIN IN ONE REQUEST
+    const { data: crumbs } = useQuery({
+        queryKey: ["ancestors", folderId],
+        queryFn: () => getAncestors(folderId!),
+        enabled: !!folderId,
+    });
+
     // DELETE MUTATION
     const delMutation = useMutation({
         mutationFn: async (id: number) => deleteFolder(id),
@@ -81,6 +89,7 @@ export default function Home() {
                             folder={folderData}
                             onUpdated={() => {
                                 qc.invalidateQueries({ queryKey: ["directory", folderId] });
+                                qc.invalidateQueries({ queryKey: ["ancestors", folderId] });
                                 toast.success("Folder updated successfully");
                                 handleEditToggle();
                             }}
@@ -92,7 +101,20 @@ export default function Home() {
             )}
 
             {/* ACTIONS BAR */}
-            <div className="w-full flex flex-row justify-end gap-2 p-4">
+            <div className="w-full flex flex-row justify-end items-center gap-2 p-4">
+                <nav className="mr-auto flex flex-row flex-wrap items-center gap-1 text-sm text-gray-600">
+                    <Link href="/" className="hover:underline">Root</Link>
+                    {crumbs?.map((crumb, i) => (
+                        <span key={crumb.id} className="flex items-center gap-1">
+                            <span>/</span>
+                            {i === crumbs.length - 1 ? (
+                                <span className="font-semibold text-gray-800">{crumb.name}</span>
+                            ) : (
+                                <Link href={`/dirs/${crumb.id}`} className="hover:underline">{crumb.name}</Link>
+                            )}
+                        </span>
+                    ))}
+                </nav>
                 <ModalButton
                     label="Add To Folder"
                     onClick={() => toggleFunction(setIsCreateModeOpen)}
@@ -6,8 +6,8 @@ import PermissionSelector from "../formsUtils/PermissionSelector";
 import SubmitButton from "../ui/btns/SubmitButton";
 import TextInput from "../ui/inputs/TextInput";
 import { toast } from "react-toastify";
-import { useMutation, useQueryClient } from "@tanstack/react-query";
-import type { NodeType } from "@/types/common";
+import { useMutation, useQueryClient, InfiniteData } from "@tanstack/react-query";
+import type { NodeType, Page } from "@/types/common";
 import { createFile } from "@/endpoints/files";
 
 interface Props {
@@ -27,9 +27,10 @@ const FileCreateForm: React.FC<Props> = ({ parentFolderId = undefined, onCreated
             return createFile(name, content, parentId, permissions);
         },
         onSuccess: (newNode: NodeType) => {
-            qc.setQueryData<NodeType[]>(["directory", parentFolderId || 'root'], (old) => {
-                if (!old) return [newNode];
-                return [newNode, ...old];
+            qc.setQueryData<InfiniteData<Page<NodeType>>>(["directory", parentFolderId || 'root'], (old) => {
+                if (!old || old.pages.length === 0) return old;
+                const [first, ...rest] = old.pages;
+                return { ...old, pages: [{ ...first, data: [newNode, ...first.data] }, ...rest] };
             });
 
             toast.success("File created");
@@ -1,14 +1,15 @@
 'use client';
 
 import React, { useEffect, useState } from "react";
-import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query";
+import { useMutation, useQueryClient } from "@tanstack/react-query";
 import { toast } from "react-toastify";
 import TextInput from "../ui/inputs/TextInput";
 import SubmitButton from "../ui/btns/SubmitButton";
+import DirectoryPicker from "../formsUtils/DirectoryPicker";
 import PermissionSelector from "../formsUtils/PermissionSelector";
 import { SERVER_DEFAULT_MASK } from "@/constants/backend";
-import { getAllDirectories } from "@/endpoints/dirs";
 import { updateFile } from "@/endpoints/files";
+import { textEdit } from "@/utils/lib_funcs";
 import type { NodeType } from "@/types/common";
 
 interface Props {
@@ -24,14 +25,18 @@ const FileEditForm: React.FC<Props> = ({ file, onUpdated }) => {
     const [parentId, setParentId] = useState<number | null>(file.parent || null);
     const [permMask, setPermMask] = useState<number>(file.permissions ?? SERVER_DEFAULT_MASK);
 
-    const { data: dirs, isFetching: loadingDirs } = useQuery({
-        queryKey: ["all-dirs"],
-        queryFn: getAllDirectories,
-    });
+    // ONLY THE CHANGED RANGE IS SENT, UNLESS THE BODY WASN'T VALID TEXT
+    // (BYTE OFFSETS OF ITS DECODED FORM WOULDN'T MATCH THE STORED ONE)
+    const contentChange = (next: string) => {
+        const original = file.content ?? "";
+        if (!file.content_hash || original.includes("\uFFFD")) return { content: next };
+        const edit = textEdit(original, next);
+        return edit ? { edits: [edit], base: file.content_hash } : {};
+    };
 
     const mutation = useMutation({
         mutationFn: async (vars: { name: string; parentId: number | null; content: string }) =>
-            updateFile(file.id, { name: vars.name, parentId: vars.parentId, content: vars.content }),
+            updateFile(file.id, { name: vars.name, parentId: vars.parentId, ...contentChange(vars.content) }),
         onSuccess: (updated: NodeType) => {
             // update cache if file is currently visible in parent listing
             const targetParent = updated.parent ?? "root";
@@ -89,19 +94,11 @@ const FileEditForm: React.FC<Props> = ({ file, onUpdated }) => {
             {/* PARENT SELECT */}
             <div className="flex flex-col gap-2">
                 <label className="text-sm font-medium text-gray-700">Parent Folder</label>
-                <select
-                    value={parentId ?? ""}
-                    onChange={(e) => setParentId(e.target.value ? Number(e.target.value) : null)}
-                    disabled={isPending || loadingDirs}
-                    className="border rounded-lg p-2 text-sm"
-                >
-                    <option value="">(Root)</option>
-                    {dirs?.map((d) => (
-                        <option key={d.id} value={d.id}>
-                            {d.name}
-                        </option>
-                    ))}
-                </select>
+                <DirectoryPicker
+                    value={parentId}
+                    onChange={setParentId}
+                    disabled={isPending}
+                />
             </div>
 
             {/* PERMISSIONS */}
@@ -6,9 +6,9 @@ import PermissionSelector from "../formsUtils/PermissionSelector";
 import SubmitButton from "../ui/btns/SubmitButton";
 import TextInput from "../ui/inputs/TextInput";
 import { toast } from "react-toastify";
-import { useMutation, useQueryClient } from "@tanstack/react-query";
+import { useMutation, useQueryClient, InfiniteData } from "@tanstack/react-query";
 import { createFolder } from "@/endpoints/dirs";
-import type { NodeType } from "@/types/common";
+import type { NodeType, Page } from "@/types/common";
 
 interface Props {
     parentFolderId?: number;
@@ -26,9 +26,10 @@ const FolderCreateForm: React.FC<Props> = ({ parentFolderId = undefined, onCreat
             return createFolder(name, parentId, permissions);
         },
         onSuccess: (newNode: NodeType) => {
-            qc.setQueryData<NodeType[]>(["directory", parentFolderId || 'root'], (old) => {
-                if (!old) return [newNode];
-                return [newNode, ...old];
+            qc.setQueryData<InfiniteData<Page<NodeType>>>(["directory", parentFolderId || 'root'], (old) => {
+                if (!old || old.pages.length === 0) return old;
+                const [first, ...rest] = old.pages;
+                return { ...old, pages: [{ ...first, data: [newNode, ...first.data] }, ...rest] };
             });
 
             toast.success("Folder created");
@@ -1,12 +1,12 @@
 'use client';
 
 import React, { useState } from "react";
-import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
+import { useMutation, useQueryClient } from "@tanstack/react-query";
 import { toast } from "react-toastify";
 
 import { SERVER_DEFAULT_MASK } from "@/constants/backend";
-import { getAllDirectories } from "@/endpoints/dirs";
 import { updateDirectory } from "@/endpoints/dirs";
+import DirectoryPicker from "../formsUtils/DirectoryPicker";
 import PermissionSelector from "../formsUtils/PermissionSelector";
 import SubmitButton from "../ui/btns/SubmitButton";
 import TextInput from "../ui/inputs/TextInput";
@@ -24,11 +24,6 @@ const FolderEditForm: React.FC<Props> = ({ folder, onUpdated }) => {
     const [parentId, setParentId] = useState<number | null>(folder.parent || null);
     const [permMask, setPermMask] = useState<number>(folder.permissions ?? SERVER_DEFAULT_MASK);
 
-    const { data: dirs, isFetching: loadingDirs } = useQuery({
-        queryKey: ["all-dirs"],
-        queryFn: getAllDirectories,
-    });
-
     const mutation = useMutation({
         mutationFn: async (vars: { name: string; parentId: number | null }) =>
             updateDirectory(folder.id, { name: vars.name, parentId: vars.parentId }),
@@ -73,21 +68,12 @@ const FolderEditForm: React.FC<Props> = ({ folder, onUpdated }) => {
             {/* PARENT FOLDER SELECT */}
             <div className="flex flex-col gap-2">
                 <label className="text-sm font-medium text-gray-700">Parent Folder</label>
-                <select
-                    value={parentId ?? ""}
-                    onChange={(e) => setParentId(e.target.value ? Number(e.target.value) : null)}
-                    disabled={isPending || loadingDirs}
-                    className="border rounded-lg p-2 text-sm"
-                >
-                    <option value="">(Root)</option>
-                    {dirs
-                        ?.filter((d) => d.id !== folder.id)
-                        .map((d) => (
-                            <option key={d.id} value={d.id}>
-                                {d.name}
-                            </option>
-                        ))}
-                </select>
+                <DirectoryPicker
+                    value={parentId}
+                    onChange={setParentId}
+                    excludeId={folder.id}
+                    disabled={isPending}
+                />
             </div>
 
             {/* PERMISSIONS */}
@@ -0,0 +1,67 @@
+'use client';
+
+import React, { useState } from "react";
+import { useInfiniteQuery } from "@tanstack/react-query";
+import { getDirTree } from "@/endpoints/dirs";
+import DirTreeNodeItem from "../ui/recursion/DirTreeNodeItem";
+
+interface Props {
+    value: number | null;
+    onChange: (id: number | null) => void;
+    excludeId?: number; // a directory can't be moved into itself
+    disabled?: boolean;
+}
+
+/**
+ * Destination picker loading the directory tree lazily.
+ * - Root level a page at a time, filtered by a name prefix
+ * - Deeper levels fetched when a directory is opened
+ */
+const DirectoryPicker: React.FC<Props> = ({ value, onChange, excludeId, disabled = false }) => {
+    const [prefix, setPrefix] = useState("");
+
+    const { data, isFetching, hasNextPage, fetchNextPage } = useInfiniteQuery({
+        queryKey: ["dir-tree", "root", prefix],
+        queryFn: ({ pageParam }) => getDirTree(null, { prefix, cursor: pageParam, depth: 2 }),
+        initialPageParam: null as string | null,
+        getNextPageParam: (last) => last.nextCursor,
+    });
+    const roots = data?.pages.flatMap((p) => p.data) ?? [];
+
+    return (
+        <div className={`flex flex-col gap-2 border rounded-lg p-2 ${disabled ? "pointer-events-none opacity-60" : ""}`}>
+            <input
+                value={prefix}
+                onChange={(e) => setPrefix(e.target.value)}
+                placeholder="Filter folders…"
+                className="border rounded p-1 text-sm"
+            />
+            <div className="max-h-60 overflow-y-auto">
+                <button
+                    type="button"
+                    onClick={() => onChange(null)}
+                    className={`w-full text-left rounded px-1 py-0.5 text-sm ${value === null ? "bg-blue-100" : "hover:bg-gray-100"}`}
+                >
+                    (Root)
+                </button>
+                {roots.map((node) => (
+                    <DirTreeNodeItem
+                        key={node.id}
+                        node={node}
+                        selectedId={value}
+                        excludeId={excludeId}
+                        onSelect={onChange}
+                    />
+                ))}
+                {isFetching && <p className="text-xs text-gray-400 px-1">Loading…</p>}
+                {hasNextPage && !isFetching && (
+                    <button type="button" onClick={() => fetchNextPage()} className="text-xs text-blue-600 px-1">
+                        Load more
+                    </button>
+                )}
+            </div>
+        </div>
+    );
+};
+
+export default DirectoryPicker;
@@ -1,8 +1,8 @@
 'use client';
 
-import { useEffect, useState } from "react";
+import { useEffect, useMemo, useState } from "react";
 import { getDirContent } from "@/endpoints/dirs";
-import { useQuery } from "@tanstack/react-query";
+import { useInfiniteQuery } from "@tanstack/react-query";
 import Loader from "../ui/loaders/Loader";
 import ListComponent from "../ui/list/ListComponent";
 import { FILE_HOVER, FILE_ICON, FOLDER_HOVER, FOLDER_ICON } from "@/constants/svgUrls";
@@ -24,13 +24,17 @@ const DirectoryViewFrame: React.FC<Props> = ({ folderId }) => {
     const [sort, setSort] = useState<SortKey>("type");
     const [order, setOrder] = useState<SortOrder>("desc");
 
-    // Query
+    // Query, one page at a time
     useEffect(() => { query.refetch(); }, [sort, order]);
-    const query = useQuery({
+    const query = useInfiniteQuery({
         queryKey: ["directory", folderId ?? 'root'],
-        queryFn: () => getDirContent(folderId, { sort, order }),
+        queryFn: ({ pageParam }) => getDirContent(folderId, { sort, order, cursor: pageParam }),
+        initialPageParam: null as string | null,
+        getNextPageParam: (lastPage) => lastPage.nextCursor,
     });
-    const { isPending, isFetching, isSuccess, isError, error, data } = query;
+    const { isPending, isFetching, isFetchingNextPage, isSuccess, isError, error, hasNextPage, fetchNextPage } = query;
+    const data = useMemo(() => query.data?.pages.flatMap((p) => p.data), [query.data]);
+    const isReloading = isFetching && !isFetchingNextPage;
 
     return (
         <div className="flex flex-col items-center align-middle p-4 gap-3 h-screen w-screen">
@@ -59,10 +63,10 @@ const DirectoryViewFrame: React.FC<Props> = ({ folderId }) => {
             </div>
 
             {/* Loading */}
-            {(isPending || isFetching) && <Loader />}
+            {(isPending || isReloading) && <Loader />}
 
             {/* Content */}
-            {!isFetching && isSuccess && data && data.length > 0 && (
+            {!isReloading && isSuccess && data && data.length > 0 && (
                 <div className="w-full flex flex-col gap-2">
                     {data.map((node) => (
                         <ListComponent
@@ -79,11 +83,22 @@ const DirectoryViewFrame: React.FC<Props> = ({ folderId }) => {
                             }}
                         />
                     ))}
+
+                    {/* Next page */}
+                    {hasNextPage && (
+                        <button
+                            onClick={() => fetchNextPage()}
+                            disabled={isFetchingNextPage}
+                            className="self-center px-3 py-2 text-sm rounded-lg border hover:bg-gray-50"
+                        >
+                            {isFetchingNextPage ? "Loading…" : "Load more"}
+                        </button>
+                    )}
                 </div>
             )}
 
             {/* Empty */}
-            {!isFetching && isSuccess && data && data.length === 0 && <EmptyDirectory />}
+            {!isReloading && isSuccess && data && data.length === 0 && <EmptyDirectory />}
 
             {/* Error */}
             {isError && <ErrorResponse error={error} />}
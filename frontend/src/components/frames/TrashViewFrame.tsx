@@ -1,33 +1,60 @@
 'use client';
 
 import { useMemo, useState } from "react";
-import { useMutation, useQuery, useQueryClient } from "@tanstack/react-query";
-import { getTrashList, restoreTrashItem, purgeTrashItem } from "@/endpoints/trash";
+import { useInfiniteQuery, useMutation, useQueryClient, type InfiniteData } from "@tanstack/react-query";
+import { getTrashPage, restoreTrashItem, purgeTrashItem } from "@/endpoints/trash";
 import Loader from "../ui/loaders/Loader";
 import ListComponent from "../ui/list/ListComponent";
 import EmptyDirectory from "../responses/EmptyDirectory";
 import ErrorResponse from "../responses/ErrorResponse";
 import { FILE_HOVER, FILE_ICON, FOLDER_HOVER, FOLDER_ICON } from "@/constants/svgUrls";
 import { toast } from "react-toastify";
-import type { NodeType, TreeNode } from "@/types/common";
+import type { NodeType, Page, TreeNode } from "@/types/common";
 import { getParentId, TRASH_KEY } from "@/utils/lib_funcs";
 import TrashTreeNode from "../ui/recursion/TrashTreeNode";
 
 
+// drops `id` and everything under it from the loaded pages
+const withoutSubtree = (old: InfiniteData<Page<NodeType>> | undefined, id: number) => {
+    if (!old) return old;
+    const items = old.pages.flatMap((p) => p.data);
+    const toRemove = new Set<number>([id]);
+    let added = true;
+    while (added) {
+        added = false;
+        for (const item of items) {
+            const pid = getParentId(item);
+            if (!toRemove.has(item.id) && pid !== null && toRemove.has(pid)) {
+                toRemove.add(item.id);
+                added = true;
+            }
+        }
+    }
+    return {
+        ...old,
+        pages: old.pages.map((p) => ({ ...p, data: p.data.filter((n) => !toRemove.has(n.id)) })),
+    };
+};
+
 
 const TrashViewFrame: React.FC = () => {
     const qc = useQueryClient();
     const [actingId, setActingId] = useState<number | null>(null);
 
 
-    // LOAD TRASH LIST
-    const { data, isPending, isFetching, isSuccess, isError, error } = useQuery({
+    // LOAD TRASH PAGES
+    const query = useInfiniteQuery({
         queryKey: TRASH_KEY,
-        queryFn: () => getTrashList("trashed_at", "desc"),
+        queryFn: ({ pageParam }) => getTrashPage("trashed_at", "desc", pageParam),
+        initialPageParam: null as string | null,
+        getNextPageParam: (lastPage) => lastPage.nextCursor,
     });
+    const { isPending, isFetching, isFetchingNextPage, isSuccess, isError, error, hasNextPage, fetchNextPage } = query;
+    const data = useMemo(() => query.data?.pages.flatMap((p) => p.data), [query.data]);
+    const isReloading = isFetching && !isFetchingNextPage;
 
 
-    // TREE BUILDING
+    // TREE BUILDING, OVER THE PAGES LOADED SO FAR
     const tree = useMemo(() => {
         if (!data || data.length === 0) return [] as TreeNode[];
 
@@ -54,23 +81,7 @@ const TrashViewFrame: React.FC = () => {
     const restoreMut = useMutation({
         mutationFn: async (id: number) => restoreTrashItem(id),
         onSuccess: (restored: NodeType) => {
-            qc.setQueryData<NodeType[]>(TRASH_KEY, (old) => {
-                if (!Array.isArray(old)) return old;
-                const rootId = restored.id;
-                const toRemove = new Set<number>([rootId]);
-                let added = true;
-                while (added) {
-                    added = false;
-                    for (const item of old) {
-                        const pid = getParentId(item);
-                        if (!toRemove.has(item.id) && pid !== null && toRemove.has(pid)) {
-                            toRemove.add(item.id);
-                            added = true;
-                        }
-                    }
-                }
-                return old.filter((n) => !toRemove.has(n.id));
-            });
+            qc.setQueryData<InfiniteData<Page<NodeType>>>(TRASH_KEY, (old) => withoutSubtree(old, restored.id));
 
             toast.success(`Restored “${restored.name}”`);
             setActingId(null);
@@ -89,22 +100,7 @@ const TrashViewFrame: React.FC = () => {
     const purgeMut = useMutation({
         mutationFn: async (id: number) => purgeTrashItem(id),
         onSuccess: (_purgedCount: number, id: number) => {
-            qc.setQueryData<NodeType[]>(TRASH_KEY, (old) => {
-                if (!Array.isArray(old)) return old;
-                const toRemove = new Set<number>([id]);
-                let added = true;
-                while (added) {
-                    added = false;
-                    for (const item of old) {
-                        const pid = getParentId(item);
-                        if (!toRemove.has(item.id) && pid !== null && toRemove.has(pid)) {
-                            toRemove.add(item.id);
-                            added = true;
-                        }
-                    }
-                }
-                return old.filter((n) => !toRemove.has(n.id));
-            });
+            qc.setQueryData<InfiniteData<Page<NodeType>>>(TRASH_KEY, (old) => withoutSubtree(old, id));
 
             toast.success("Purged item(s)");
             setActingId(null);
@@ -148,19 +144,28 @@ const TrashViewFrame: React.FC = () => {
                     purgePending={purgeMut.isPending}
                 />
             ))}
+            {hasNextPage && (
+                <button
+                    onClick={() => fetchNextPage()}
+                    disabled={isFetchingNextPage}
+                    className="self-center px-3 py-2 text-sm rounded-lg border hover:bg-gray-50"
+                >
+                    {isFetchingNextPage ? "Loading…" : "Load more"}
+                </button>
+            )}
         </div>
     );
 
 
     return (
         <div className="flex flex-col items-center align-middle p-4 gap-2 h-screen w-screen">
-            {(isPending || isFetching) && <Loader />}
+            {(isPending || isReloading) && <Loader />}
 
             {/* TREE */}
-            {!isFetching && isSuccess && data && data.length > 0 && renderTree()}
+            {!isReloading && isSuccess && data && data.length > 0 && renderTree()}
 
             {/* EMPTY */}
-            {!isFetching && isSuccess && data && data.length === 0 && <EmptyDirectory />}
+            {!isReloading && isSuccess && data && data.length === 0 && <EmptyDirectory />}
 
             {/* ERROR */}
             {isError && <ErrorResponse error={error} />}
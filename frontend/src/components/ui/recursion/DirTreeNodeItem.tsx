@@ -0,0 +1,77 @@
+'use client';
+
+import React, { useState } from "react";
+import { useInfiniteQuery } from "@tanstack/react-query";
+import { DirTreeNode } from "@/types/common";
+import { getDirTree } from "@/endpoints/dirs";
+
+type Props = {
+  node: DirTreeNode;
+  depth?: number;
+  selectedId: number | null;
+  excludeId?: number;
+  onSelect: (id: number) => void;
+};
+
+const DirTreeNodeItem: React.FC<Props> = ({ node, depth = 0, selectedId, excludeId, onSelect }) => {
+  const [open, setOpen] = useState(false);
+
+  // CHILDREN NOT SENT WITH THE PARENT ARE LOADED A PAGE AT A TIME WHEN IT OPENS
+  const { data: loaded, isFetching, hasNextPage, fetchNextPage } = useInfiniteQuery({
+    queryKey: ["dir-tree", node.id],
+    queryFn: ({ pageParam }) => getDirTree(node.id, { cursor: pageParam }),
+    initialPageParam: null as string | null,
+    getNextPageParam: (last) => last.nextCursor,
+    enabled: open && node.has_children && node.children === null,
+  });
+  const children = node.children ?? loaded?.pages.flatMap((p) => p.data) ?? [];
+
+  if (node.id === excludeId) return null;
+
+  return (
+    <div>
+      <div
+        style={{ paddingLeft: depth * 16 }}
+        className={`flex items-center gap-1 rounded px-1 py-0.5 text-sm ${selectedId === node.id ? "bg-blue-100" : "hover:bg-gray-100"}`}
+      >
+        <button
+          type="button"
+          onClick={() => setOpen((p) => !p)}
+          className={`w-5 text-gray-500 ${node.has_children ? "" : "invisible"}`}
+        >
+          {open ? "▾" : "▸"}
+        </button>
+        <button type="button" onClick={() => onSelect(node.id)} className="flex-1 text-left truncate">
+          {node.name}
+        </button>
+      </div>
+
+      {/* CHILDREN */}
+      {open && isFetching && <p style={{ paddingLeft: (depth + 1) * 16 + 24 }} className="text-xs text-gray-400">Loading…</p>}
+      {open
+        ? children.map((child) => (
+          <DirTreeNodeItem
+            key={child.id}
+            node={child}
+            depth={depth + 1}
+            selectedId={selectedId}
+            excludeId={excludeId}
+            onSelect={onSelect}
+          />
+        ))
+        : null}
+      {open && hasNextPage && !isFetching && (
+        <button
+          type="button"
+          onClick={() => fetchNextPage()}
+          style={{ paddingLeft: (depth + 1) * 16 + 24 }}
+          className="text-xs text-blue-600"
+        >
+          Load more
+        </button>
+      )}
+    </div>
+  );
+};
+
+export default DirTreeNodeItem;
@@ -1,20 +1,23 @@
 'use client';
 
 import { BASE_URL, SortKey, SortOrder } from "@/constants/backend"
-import { NodeType } from "@/types/common";
+import { AncestorType, DirTreeNode, NodeType, Page } from "@/types/common";
 
 
 /*
-    Fetch directory contents with optional sorting.
+    Fetch one page of directory contents with optional sorting.
+    Pass the `nextCursor` of the previous page to continue.
 */
 export const getDirContent = async (
     pk?: number,
-    opts?: { sort?: SortKey; order?: SortOrder }
-): Promise<NodeType[]> => {
+    opts?: { sort?: SortKey; order?: SortOrder; cursor?: string | null; limit?: number }
+): Promise<Page<NodeType>> => {
     const params = new URLSearchParams();
     if (pk !== undefined) params.set("parent_id", String(pk));
     if (opts?.sort) params.set("sort", opts.sort);
     if (opts?.order) params.set("order", opts.order);
+    if (opts?.cursor) params.set("cursor", opts.cursor);
+    if (opts?.limit) params.set("limit", String(opts.limit));
 
     const res = await fetch(`${BASE_URL}/api/dirs/?${params.toString()}`, { method: "GET" });
 
@@ -30,8 +33,8 @@ export const getDirContent = async (
         throw new Error(msg);
     }
 
-    const json = (await res.json()) as { ok: boolean; data: NodeType[] };
-    return json.data;
+    const json = (await res.json()) as { ok: boolean; data: NodeType[]; next_cursor: string | null };
+    return { data: json.data, nextCursor: json.next_cursor };
 };
 
 
@@ -157,7 +160,45 @@ export async function updateDirectory(
 
 
 /*
-    Fetch all non-trashed directories (for move or select destination)
+    Fetch one page of the directory tree under `parentId`
+    (root when omitted), `depth` levels deep, for destination pickers.
+*/
+export const getDirTree = async (
+    parentId?: number | null,
+    opts?: { depth?: number; prefix?: string; cursor?: string | null; limit?: number }
+): Promise<Page<DirTreeNode>> => {
+    const params = new URLSearchParams();
+    if (parentId) params.set("parent_id", String(parentId));
+    if (opts?.depth) params.set("depth", String(opts.depth));
+    if (opts?.prefix) params.set("prefix", opts.prefix);
+    if (opts?.cursor) params.set("cursor", opts.cursor);
+    if (opts?.limit) params.set("limit", String(opts.limit));
+
+    const res = await fetch(`${BASE_URL}/api/tree/?${params.toString()}`, {
+        method: "GET",
+    });
+
+    if (!res.ok) {
+        let msg = `Failed to load directories (${res.status})`;
+        try {
+            const j = await res.json();
+            if (j?.message) msg = j.message;
+        } catch {
+            const t = await res.text();
+            if (t) msg = t;
+        }
+        throw new Error(msg);
+    }
+
+    const json = (await res.json()) as { ok: boolean; data: DirTreeNode[]; next_cursor: string | null };
+    return { data: json.data, nextCursor: json.next_cursor };
+};
+
+
+
+/*
+    Fetch all non-trashed directories (for move or select destination).
+    Prefer getDirTree, this one returns every directory at once.
 */
 export async function getAllDirectories(): Promise<NodeType[]> {
     const res = await fetch(`${BASE_URL}/api/all-directories/`, {
@@ -208,4 +249,35 @@ export const getFolder = async (id: number): Promise<NodeType> => {
 
     const json = await res.json() as { ok: boolean; data: NodeType };
     return json.data;
-};
\ No newline at end of file
+};
+
+
+
+/*
+    Breadcrumb of a file or directory in one request:
+    every directory from the root down, then the node itself.
+*/
+export const getAncestors = async (id: number): Promise<AncestorType[]> => {
+    if (!id) {
+        throw new Error("Node ID is required");
+    }
+
+    const res = await fetch(`${BASE_URL}/api/ancestors/${id}/`, {
+        method: "GET",
+    });
+
+    if (!res.ok) {
+        let message = `Failed to fetch path (${res.status})`;
+        try {
+            const errJson = await res.json();
+            if (errJson?.message) message = errJson.message;
+        } catch {
+            const text = await res.text();
+            if (text) message = text;
+        }
+        throw new Error(message);
+    }
+
+    const json = await res.json() as { ok: boolean; data: AncestorType[] };
+    return json.data;
+};
@@ -118,11 +118,18 @@ export async function deleteFile(pk: number): Promise<boolean> {
     - Pass `name` to rename.
     - Pass `parentId` to move (use `null` to move to root).
     - Pass `content` to overwrite content (size is recalculated server-side per your code).
+    - Pass `edits` with the `base` content_hash instead to send only the changed byte ranges.
     Only provided fields are sent.
  */
 export async function updateFile(
     pk: number,
-    opts: { name?: string | null; parentId?: number | null; content?: string | null }
+    opts: {
+        name?: string | null;
+        parentId?: number | null;
+        content?: string | null;
+        edits?: { start: number; end: number; text: string }[];
+        base?: string;
+    }
 ): Promise<NodeType> {
     if (!pk || pk <= 0) throw new Error("Invalid file id");
 
@@ -130,6 +137,10 @@ export async function updateFile(
     if (opts.name !== undefined) body.name = opts.name;
     if (opts.parentId !== undefined) body.parent_id = opts.parentId;
     if (opts.content !== undefined) body.content = opts.content ?? "";
+    if (opts.edits !== undefined) {
+        body.edits = opts.edits;
+        body.base = opts.base;
+    }
 
     const res = await fetch(`${BASE_URL}/api/files/${pk}/`, {
         method: "PATCH",
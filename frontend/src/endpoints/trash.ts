@@ -1,16 +1,20 @@
 'use client';
 
 import { BASE_URL } from "@/constants/backend";
-import type { NodeType } from "@/types/common";
+import type { NodeType, Page } from "@/types/common";
 
 /** ---------------------------------------
-    Get Trash Items
+    Get One Page Of Trash Items
  * --------------------------------------*/
-export async function getTrashList(
+export async function getTrashPage(
     sort: "trashed_at" | "name" | "type" | "size" = "trashed_at",
-    order: "asc" | "desc" = "desc"
-): Promise<NodeType[]> {
+    order: "asc" | "desc" = "desc",
+    cursor?: string | null,
+    limit?: number
+): Promise<Page<NodeType>> {
     const qs = new URLSearchParams({ sort, order });
+    if (cursor) qs.set("cursor", cursor);
+    if (limit) qs.set("limit", String(limit));
     const res = await fetch(`${BASE_URL}/api/trash/?${qs.toString()}`, { method: "GET" });
 
     if (!res.ok) {
@@ -25,8 +29,8 @@ export async function getTrashList(
         throw new Error(msg);
     }
 
-    const json = (await res.json()) as { ok: boolean; data: NodeType[] };
-    return json.data;
+    const json = (await res.json()) as { ok: boolean; data: NodeType[]; next_cursor: string | null };
+    return { data: json.data, nextCursor: json.next_cursor };
 }
 
 /** ---------------------------------------
@@ -5,18 +5,40 @@ export type NodeType = {
     name: string;
     node_type: 'FILE' | 'DIRECTORY';
     parent: number | null;
-    size?: number;
+    size?: number; // bytes, for directories the total of the live subtree
+    file_count?: number;
+    dir_count?: number;
     permissions: number; // bitmask
     created_at: string;
     modified_at: string;
     is_trashed: boolean;
     trashed_at: string | null;
+    content_hash?: string; // sha256 of the body, the base of partial edits
+    full_path?: string; // like "/projects/acme/config.yaml"
     content?: string | null;
 };
 
 
 
+export type AncestorType = Pick<NodeType, 'id' | 'name' | 'node_type' | 'parent' | 'permissions'>;
+
+
+
+export type DirTreeNode = NodeType & {
+    has_children: boolean;
+    children: DirTreeNode[] | null; // null => not loaded yet
+};
+
+
+
 export type TreeNode = NodeType & {
     children: TreeNode[];
     __orphan?: boolean;
+};
+
+
+
+export type Page<T> = {
+    data: T[];
+    nextCursor: string | null;
 };
\ No newline at end of file
@@ -8,4 +8,24 @@ export const toggleFunction = (setVal: React.Dispatch<React.SetStateAction<boole
 export const getParentId = (n: any): number | null =>
     (n.parent_id ?? n.parent ?? null) as number | null;
 
-export const TRASH_KEY = ["trash", { sort: "trashed_at", order: "desc" }];
\ No newline at end of file
+export const TRASH_KEY = ["trash", { sort: "trashed_at", order: "desc" }];
+
+/*
+    Smallest single byte-range edit turning `before` into `after`
+    (common prefix and suffix kept), offsets in UTF-8 bytes as the
+    backend expects them. Null when nothing changed.
+ */
+export const textEdit = (before: string, after: string): { start: number; end: number; text: string } | null => {
+    if (before === after) return null;
+    const enc = new TextEncoder();
+    const a = Array.from(before), b = Array.from(after);
+
+    let head = 0;
+    while (head < a.length && head < b.length && a[head] === b[head]) head++;
+    let tail = 0;
+    while (tail < a.length - head && tail < b.length - head && a[a.length - 1 - tail] === b[b.length - 1 - tail]) tail++;
+
+    const start = enc.encode(a.slice(0, head).join("")).length;
+    const end = start + enc.encode(a.slice(head, a.length - tail).join("")).length;
+    return { start, end, text: b.slice(head, b.length - tail).join("") };
+};